@@ -0,0 +1,58 @@
+"""性能基准
+
+- generate: 生成确定性的模拟论坛数据（用户、贴吧、帖子、评论、点赞），规模 10k / 1m / 10m
+- run: 对 db.* 的公开函数和 main.Api 的方法逐个计时，输出延迟分位数和每次调用的查询数
+- contention: 多线程同时点赞同一个帖子、评论，测吞吐、延迟和冲突重试，并校验计数
+- wire: 列表以字典列表和列式紧凑格式（codec.py）序列化的耗时与字节数
+- compare: 对比两次结果，标出变慢或查询数增加的项目
+
+默认在本地 SQLite 上运行（bench/data/ 下），不需要远程 MySQL：
+
+    python -m bench.generate --scale 10k
+    python -m bench.run --scale 10k --out base.json
+    python -m bench.compare base.json new.json
+"""
+
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+DATA_DIR = Path(__file__).parent / "data"
+
+# 各规模的行数；合计约为规模名对应的行数
+SCALES = {
+    "10k": {"users": 200, "bars": 20, "posts": 2_000, "comments": 5_800, "likes": 2_000},
+    "1m": {"users": 20_000, "bars": 500, "posts": 200_000, "comments": 580_000, "likes": 200_000},
+    "10m": {
+        "users": 200_000,
+        "bars": 2_000,
+        "posts": 2_000_000,
+        "comments": 5_800_000,
+        "likes": 2_000_000,
+    },
+}
+
+
+def database_path(scale):
+    return DATA_DIR / f"bench-{scale}.db"
+
+
+def use_database(path):
+    """让随后导入的 db 模块使用指定的 SQLite 文件（须在导入 db 之前调用）"""
+    import os
+
+    os.environ["DB_ENGINE"] = "sqlite"
+    os.environ["DB_SQLITE_PATH"] = str(path)
+
+
+def use_copy(scale):
+    """把生成的数据库复制到临时目录并让随后导入的 db 使用它，返回临时目录（用完后删除）"""
+    source = database_path(scale)
+    if not source.exists():
+        sys.exit(f"{source} 不存在，先运行 python -m bench.generate --scale {scale}")
+    workdir = tempfile.mkdtemp(prefix="tieba-bench-")
+    path = Path(workdir) / source.name
+    shutil.copyfile(source, path)
+    use_database(path)
+    return workdir
@@ -0,0 +1,69 @@
+"""对比两次基准结果
+
+延迟（p50 和 p95）比基准慢 --threshold 以上且至少慢 --min-ms 毫秒，或每次调用的查询数增加时，
+标为退化；有退化时以状态码 1 退出，可以放在 CI 中使用。
+
+用法: python -m bench.compare base.json new.json [--threshold 0.2] [--min-ms 0.05]
+"""
+
+import argparse
+import json
+import sys
+
+METRICS = ("p50_ms", "p95_ms")
+
+
+def load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(base, new, threshold=0.2, min_ms=0.05):
+    """返回 [(用例, 基准结果, 新结果, 退化原因列表)]，只在一边存在的用例结果为 None"""
+    rows = []
+    names = list(base["results"]) + [n for n in new["results"] if n not in base["results"]]
+    for name in names:
+        old, cur = base["results"].get(name), new["results"].get(name)
+        reasons = []
+        if old and cur:
+            for metric in METRICS:
+                if cur[metric] > old[metric] * (1 + threshold) and cur[metric] - old[metric] >= min_ms:
+                    reasons.append(f"{metric} +{(cur[metric] / old[metric] - 1) * 100:.0f}%")
+            if cur["queries_per_call"] > old["queries_per_call"]:
+                reasons.append(f"查询 {old['queries_per_call']} -> {cur['queries_per_call']}")
+        rows.append((name, old, cur, reasons))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比两次基准结果")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.2, help="视为退化的变慢比例")
+    parser.add_argument("--min-ms", type=float, default=0.05, help="视为退化的最小变慢毫秒数")
+    args = parser.parse_args()
+
+    base, new = load(args.base), load(args.new)
+    for side, report in (("基准", base), ("本次", new)):
+        meta = report["meta"]
+        print(f"{side}: {meta.get('commit')} {meta['scale']} {meta['engine']} {meta['time']}")
+    if base["meta"]["scale"] != new["meta"]["scale"]:
+        print("注意: 两次结果的数据规模不同")
+
+    regressions = 0
+    print(f"{'用例':<40}{'基准p50':>10}{'本次p50':>10}{'变化':>8}")
+    for name, old, cur, reasons in compare(base, new, args.threshold, args.min_ms):
+        if not old or not cur:
+            print(f"{name:<42}{'(仅' + ('本次' if cur else '基准') + ')':>20}")
+            continue
+        change = (cur["p50_ms"] / old["p50_ms"] - 1) * 100 if old["p50_ms"] else 0
+        flag = f"  <- {', '.join(reasons)}" if reasons else ""
+        print(f"{name:<42}{old['p50_ms']:>10.3f}{cur['p50_ms']:>10.3f}{change:>+7.0f}%{flag}")
+        regressions += bool(reasons)
+
+    print(f"{regressions} 项退化" if regressions else "没有退化")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""点赞争用基准
+
+多个线程在 --duration 秒内不停切换同一个热门帖子（和同一条评论）的点赞：
+- distinct: 每个线程是不同的用户
+- double_click: 每两个线程共用一个用户，模拟同一用户的并发连击
+
+记录每次调用的延迟分位数、吞吐、冲突重试次数和每次调用的语句数，
+结束后校验冗余点赞数与点赞记录数一致。结果格式与 bench.run 相同，可以用 bench.compare 对比。
+
+用法: python -m bench.contention --scale 10k [--threads 8] [--duration 5] [--out result.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import threading
+import time
+from datetime import datetime
+
+from bench import SCALES, use_copy
+from bench.run import git_commit, percentile, pick_targets
+
+SCENARIOS = ("distinct", "double_click")
+
+GET_POST_LIKE_COUNTS_COMMAND = """
+SELECT p.like_count,
+       (SELECT COUNT(*) FROM post_likes pl WHERE pl.post_id = p.id) as actual
+FROM posts p WHERE p.id = %s
+"""
+
+GET_COMMENT_LIKE_COUNTS_COMMAND = """
+SELECT c.likes as like_count,
+       (SELECT COUNT(*) FROM comment_likes cl WHERE cl.comment_id = c.id) as actual
+FROM comments c WHERE c.id = %s
+"""
+
+
+def run_scenario(toggle, target, threads, duration, shared_users):
+    """所有线程同时开始切换点赞，返回 (各次调用延迟, 出错次数, 执行的语句数)"""
+    import metrics
+
+    timings = [[] for _ in range(threads)]
+    errors = [0] * threads
+    start = threading.Barrier(threads)
+
+    def worker(index):
+        user_id = (index // 2 if shared_users else index) + 1
+        start.wait()
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            began = time.perf_counter()
+            try:
+                toggle(user_id, target)
+            except Exception:
+                errors[index] += 1
+                continue
+            timings[index].append((time.perf_counter() - began) * 1000)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    before = metrics.total_queries()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    queries = metrics.total_queries() - before
+    return [t for per_thread in timings for t in per_thread], sum(errors), queries
+
+
+def check_counts(db, command, target):
+    @db.with_db_connection
+    def query(cursor):
+        cursor.execute(command, (target,))
+        return cursor.fetchone()
+
+    row = query()
+    return row["like_count"], row["actual"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="点赞争用基准")
+    parser.add_argument("--scale", choices=SCALES, default="10k")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=5.0, help="每个场景的秒数")
+    parser.add_argument("--out", help="结果 JSON 文件")
+    args = parser.parse_args()
+
+    workdir = use_copy(args.scale)
+    os.environ["DB_CACHE"] = "0"
+    os.environ["DB_SLOW_QUERY_MS"] = "inf"
+    os.environ.setdefault("DB_POOL_SIZE", str(args.threads))
+
+    import db
+
+    # 统计冲突重试次数（每次重试前都会判断一次是否为冲突）
+    conflicts = [0]
+    conflicts_lock = threading.Lock()
+    # 没有冲突重试的旧版本也可以运行，便于对比
+    is_conflict = getattr(db.engine, "is_conflict", lambda error: False)
+
+    def counting_is_conflict(error):
+        conflict = is_conflict(error)
+        with conflicts_lock:
+            conflicts[0] += conflict
+        return conflict
+
+    db.engine.is_conflict = counting_is_conflict
+
+    targets = pick_targets(db)
+    cases = (
+        ("toggle_post_like", db.toggle_post_like, targets["busy_post"], GET_POST_LIKE_COUNTS_COMMAND),
+        ("like_comment", db.like_comment, targets["comment"], GET_COMMENT_LIKE_COUNTS_COMMAND),
+    )
+
+    results = {}
+    mismatches = 0
+    print(f"{'用例':<44}{'p50':>9}{'p95':>9}{'次/秒':>9}{'冲突':>6}{'出错':>6}")
+    try:
+        for name, toggle, target, count_command in cases:
+            for scenario in SCENARIOS:
+                conflicts[0] = 0
+                timings, errors, queries = run_scenario(
+                    toggle, target, args.threads, args.duration, scenario == "double_click"
+                )
+                timings.sort()
+                calls = len(timings) or 1
+                like_count, actual = check_counts(db, count_command, target)
+                mismatches += like_count != actual
+                key = f"contention.{name}.{scenario}"
+                results[key] = {
+                    "p50_ms": round(percentile(timings, 50), 3) if timings else None,
+                    "p95_ms": round(percentile(timings, 95), 3) if timings else None,
+                    "p99_ms": round(percentile(timings, 99), 3) if timings else None,
+                    "mean_ms": round(sum(timings) / calls, 3),
+                    "max_ms": round(timings[-1], 3) if timings else None,
+                    "queries_per_call": round(queries / calls, 2),
+                    "calls_per_second": round(len(timings) / args.duration, 1),
+                    "conflicts": conflicts[0],
+                    "errors": errors,
+                    "counter_ok": like_count == actual,
+                }
+                r = results[key]
+                flag = "" if r["counter_ok"] else f"  <- 计数不一致 {like_count} != {actual}"
+                print(
+                    f"{key:<46}{r['p50_ms']:>9.3f}{r['p95_ms']:>9.3f}"
+                    f"{r['calls_per_second']:>9}{r['conflicts']:>6}{errors:>6}{flag}"
+                )
+    finally:
+        db.db_pool.close_all()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "scale": args.scale,
+            "engine": db.engine.name,
+            "threads": args.threads,
+            "duration": args.duration,
+            "python": platform.python_version(),
+            "commit": git_commit(),
+            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        },
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.out}")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
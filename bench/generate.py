@@ -0,0 +1,261 @@
+"""生成确定性的模拟论坛数据
+
+同一个 --seed 和 --scale 每次生成相同的数据（时间以生成当天零点为基准向前分布）：
+- 贴吧热度服从 Zipf 分布，少数贴吧占大部分帖子
+- 帖子的受欢迎程度服从 Pareto 分布，少数帖子获得大部分评论和点赞
+- 用户发帖量服从 Zipf 分布
+- 帖子 id 与发布时间同序递增，评论在所属帖子发布后三天内
+
+冗余计数、热度、社区统计和搜索索引在写入时一并生成，与应用写入的数据一致。
+
+用法: python -m bench.generate --scale 10k [--seed 42] [--no-search]
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate, islice
+
+from bench import SCALES, database_path, use_database
+
+# 每个事务写入的行数
+CHUNK_SIZE = 5000
+# 数据时间跨度（天）
+SPAN_DAYS = 365
+# 所有模拟用户的密码
+BENCH_PASSWORD = "benchPassword"
+BENCH_SALT = "benchSalt"
+
+WORDS = (
+    "今天 明天 学校 老师 同学 考试 作业 食堂 篮球 足球 音乐 电影 游戏 手机 电脑 "
+    "编程 数学 物理 化学 英语 语文 历史 地理 生物 图书馆 操场 宿舍 社团 比赛 活动 "
+    "假期 周末 天气 下雨 晴天 早餐 午饭 晚饭 奶茶 火锅 旅行 照片 小说 动漫 "
+    "python java linux github bug hello world test vue mysql"
+).split()
+
+INSERT_USERS_COMMAND = """
+INSERT INTO users (id, type, name, password, salt, exp, create_time)
+VALUES (%s, 'U', %s, %s, %s, %s, %s)
+"""
+
+INSERT_BARS_COMMAND = """
+INSERT INTO bars (id, name, owner_id, create_time, post_count) VALUES (%s, %s, %s, %s, %s)
+"""
+
+INSERT_USER_BARS_COMMAND = """
+INSERT INTO user_bars (user_id, bar_id) VALUES (%s, %s)
+"""
+
+INSERT_POSTS_COMMAND = """
+INSERT INTO posts (id, bar_id, title, content, excerpt, author_id, create_time,
+                   like_count, comment_count, hot_decay, hot_score)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+INSERT_COMMENTS_COMMAND = """
+INSERT INTO comments (id, post_id, content, author_id, create_time, likes, reply_to_user)
+VALUES (%s, %s, %s, %s, %s, 0, NULL)
+"""
+
+INSERT_POST_LIKES_COMMAND = """
+INSERT INTO post_likes (user_id, post_id) VALUES (%s, %s)
+"""
+
+
+def zipf_weights(n, s=1.1):
+    return [1 / (rank**s) for rank in range(1, n + 1)]
+
+
+def chunks(rows, size=CHUNK_SIZE):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+class Generator:
+    def __init__(self, scale, seed=42, now=None):
+        self.counts = SCALES[scale]
+        self.rng = random.Random(seed)
+        self.now = now or datetime.combine(datetime.now().date(), datetime.min.time())
+        self.word_weights = list(accumulate(zipf_weights(len(WORDS), 0.9)))
+
+    def text(self, low, high, sep=""):
+        words = self.rng.choices(WORDS, cum_weights=self.word_weights, k=self.rng.randint(low, high))
+        return sep.join(words)
+
+    def times(self, n):
+        """n 个从 SPAN_DAYS 天前到现在递增的时间"""
+        start = self.now - timedelta(days=SPAN_DAYS)
+        offsets = sorted(self.rng.random() for _ in range(n))
+        return [start + timedelta(seconds=SPAN_DAYS * 86400 * o) for o in offsets]
+
+    def tables(self):
+        """按写入顺序逐表生成数据，返回 [(表名, 行迭代器)]；帖子和评论边生成边写入"""
+        import db
+        import ranking
+
+        rng = self.rng
+        n_users, n_bars = self.counts["users"], self.counts["bars"]
+        n_posts, n_comments = self.counts["posts"], self.counts["comments"]
+
+        password = db.hash_password(BENCH_PASSWORD, BENCH_SALT)
+        user_times = self.times(n_users)
+        users = [
+            (i, f"user{i}", password, BENCH_SALT, 0, user_times[i - 1])
+            for i in range(1, n_users + 1)
+        ]
+
+        # 贴吧与发帖用户的热度排名随机打乱，避免 id 小的总是最热
+        bar_ranks = list(range(1, n_bars + 1))
+        rng.shuffle(bar_ranks)
+        bar_weights = list(accumulate(zipf_weights(n_bars)))
+        author_ranks = list(range(1, n_users + 1))
+        rng.shuffle(author_ranks)
+        author_weights = list(accumulate(zipf_weights(n_users, 0.8)))
+
+        post_bars = [bar_ranks[i] for i in self._pick(bar_weights, n_posts)]
+        post_authors = [author_ranks[i] for i in self._pick(author_weights, n_posts)]
+        post_times = self.times(n_posts)
+
+        # 帖子受欢迎程度：评论和点赞按该权重分配
+        popularity = list(accumulate(rng.paretovariate(1.2) for _ in range(n_posts)))
+        comment_count = [0] * n_posts
+        for post in self._pick(popularity, n_comments):
+            comment_count[post] += 1
+        like_count = [0] * n_posts
+        likes = set()  # user * n_posts + post
+        for post in self._pick(popularity, self.counts["likes"]):
+            key = rng.randint(1, n_users) * n_posts + post
+            if key not in likes:
+                likes.add(key)
+                like_count[post] += 1
+
+        bar_post_count = [0] * (n_bars + 1)
+        for bar in post_bars:
+            bar_post_count[bar] += 1
+        bar_times = self.times(n_bars)
+        bars = [
+            (i, f"吧{i}", rng.randint(1, n_users), bar_times[i - 1], bar_post_count[i])
+            for i in range(1, n_bars + 1)
+        ]
+        user_bars = sorted({(owner, bar_id) for bar_id, _, owner, _, _ in bars})
+
+        def posts():
+            for i in range(n_posts):
+                decay = ranking.decay_factor(post_times[i], self.now)
+                title = self.text(2, 6)
+                content = self.text(10, 60, " ")
+                yield (
+                    i + 1,
+                    post_bars[i],
+                    title,
+                    content,
+                    db.make_excerpt(content),
+                    post_authors[i],
+                    post_times[i],
+                    like_count[i],
+                    comment_count[i],
+                    decay,
+                    ranking.hotness(like_count[i], comment_count[i], decay),
+                )
+
+        def comments():
+            comment_id = 0
+            for post in range(n_posts):
+                # 评论在发帖后三天内依次发布，且不晚于现在
+                delays = sorted(rng.random() * 3 * 86400 for _ in range(comment_count[post]))
+                for delay in delays:
+                    comment_id += 1
+                    create_time = min(post_times[post] + timedelta(seconds=delay), self.now)
+                    yield (
+                        comment_id,
+                        post + 1,
+                        self.text(3, 20, " "),
+                        rng.randint(1, n_users),
+                        create_time,
+                    )
+
+        post_likes = ((key // n_posts, key % n_posts + 1) for key in sorted(likes))
+
+        return [
+            ("users", users),
+            ("bars", bars),
+            ("user_bars", user_bars),
+            ("posts", posts()),
+            ("comments", comments()),
+            ("post_likes", post_likes),
+        ]
+
+    def _pick(self, cum_weights, k):
+        """按累计权重抽取 k 个下标"""
+        return self.rng.choices(range(len(cum_weights)), cum_weights=cum_weights, k=k)
+
+
+INSERT_COMMANDS = {
+    "users": INSERT_USERS_COMMAND,
+    "bars": INSERT_BARS_COMMAND,
+    "user_bars": INSERT_USER_BARS_COMMAND,
+    "posts": INSERT_POSTS_COMMAND,
+    "comments": INSERT_COMMENTS_COMMAND,
+    "post_likes": INSERT_POST_LIKES_COMMAND,
+}
+
+
+def write(tables, with_search=True):
+    """分块写入数据库（每块一个事务），帖子同时建立搜索索引，最后重建社区统计"""
+    import db
+    import reconcile
+    import search
+
+    @db.with_db_connection
+    def insert(cursor, table, rows):
+        cursor.executemany(INSERT_COMMANDS[table], rows)
+        if table == "posts" and with_search:
+            for row in rows:
+                search.index_post(cursor, row[0], row[2], row[3])
+
+    for table, rows in tables:
+        total = 0
+        for chunk in chunks(rows):
+            insert(table, chunk)  # type: ignore
+            total += len(chunk)
+        print(f"  {table}: {total} 行")
+
+    reconcile.rebuild_site_stats()  # type: ignore
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成模拟论坛数据")
+    parser.add_argument("--scale", choices=SCALES, default="10k")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-search", action="store_true", help="不建立搜索索引")
+    args = parser.parse_args()
+
+    path = database_path(args.scale)
+    for suffix in ("", "-wal", "-shm"):
+        path.with_name(path.name + suffix).unlink(missing_ok=True)
+    use_database(path)
+
+    import db
+    import migrations
+
+    start = time.perf_counter()
+    migrations.migrate()
+    tables = Generator(args.scale, args.seed).tables()
+    print(f"生成 {args.scale} 数据 (seed={args.seed})，写入 {path}")
+    write(tables, with_search=not args.no_search)
+
+    # 合并 WAL，得到可以直接复制的单个数据库文件
+    db.db_pool.close_all()
+    conn = db.engine.connect()
+    with conn.cursor() as cursor:
+        cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        cursor.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+    print(f"完成，用时 {time.perf_counter() - start:.1f} 秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""对 db.* 和 main.Api 逐个计时
+
+在生成的数据库的副本上运行（写操作不会改动原文件），每个用例先预热，再执行 --iterations 次，
+记录延迟分位数和每次调用执行的 SQL 语句数。读取缓存默认关闭，测的是数据库本身，
+--cache 时保留缓存。
+
+main.Api 需要 pywebview；导入失败时跳过 Api 用例。
+
+用法: python -m bench.run --scale 10k [--iterations 200] [--cache] [--only 前缀] [--out result.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from bench import SCALES, use_copy
+from bench.generate import BENCH_PASSWORD
+
+WARMUP = 5
+
+
+def percentile(sorted_values, p):
+    index = min(len(sorted_values) - 1, round(p / 100 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+def measure(func, iterations):
+    """执行 func(i)，返回延迟统计（毫秒）和每次调用的语句数（来自 metrics 的统计）"""
+    import metrics
+
+    for i in range(WARMUP):
+        func(i)
+    timings = []
+    queries = 0
+    for i in range(WARMUP, WARMUP + iterations):
+        before = metrics.total_queries()
+        start = time.perf_counter()
+        func(i)
+        timings.append((time.perf_counter() - start) * 1000)
+        queries += metrics.total_queries() - before
+    timings.sort()
+    return {
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+        "mean_ms": round(sum(timings) / len(timings), 3),
+        "max_ms": round(timings[-1], 3),
+        "queries_per_call": round(queries / iterations, 2),
+    }
+
+
+def pick_targets(db):
+    """从数据中选出用例参数：最热和最冷的贴吧、评论最多和最少的帖子、发帖最多的用户"""
+
+    @db.with_db_connection
+    def query(cursor):
+        def one(sql):
+            cursor.execute(sql)
+            return cursor.fetchone()
+
+        return {
+            "hot_bar": one("SELECT id, name FROM bars ORDER BY post_count DESC, id LIMIT 1"),
+            "cold_bar": one("SELECT id, name FROM bars ORDER BY post_count, id LIMIT 1"),
+            "busy_post": one("SELECT id FROM posts ORDER BY comment_count DESC, id LIMIT 1")["id"],
+            "quiet_post": one("SELECT id FROM posts ORDER BY comment_count, id LIMIT 1")["id"],
+            "comment": one("SELECT MAX(id) as id FROM comments")["id"],
+            "active_user": one(
+                "SELECT author_id as id FROM posts GROUP BY author_id ORDER BY COUNT(*) DESC LIMIT 1"
+            )["id"],
+        }
+
+    return query()
+
+
+def db_cases(db, t):
+    """db.* 的用例：{名称: func(i)}"""
+    user = t["active_user"]
+    hot_bar, cold_bar = t["hot_bar"], t["cold_bar"]
+    deep_cursor = {}
+
+    def latest_deep(i):
+        # 沿游标翻到第 10 页
+        if "cursor" not in deep_cursor:
+            after = None
+            for _ in range(9):
+                after = db.get_latest_posts_by_cursor(after, 20, user)["next_cursor"]
+            deep_cursor["cursor"] = after
+        db.get_latest_posts_by_cursor(deep_cursor["cursor"], 20, user)
+
+    session = db.create_session(user)["token"]
+    return {
+        # 读
+        "db.get_latest_posts": lambda i: db.get_latest_posts(1, 20, user),
+        "db.get_latest_posts.page10": lambda i: db.get_latest_posts(10, 20, user),
+        "db.get_latest_posts_by_cursor": lambda i: db.get_latest_posts_by_cursor(None, 20, user),
+        "db.get_latest_posts_by_cursor.page10": latest_deep,
+        "db.get_posts_in_bar.hot": lambda i: db.get_posts_in_bar(hot_bar["id"], 1, 20, user),
+        "db.get_posts_in_bar.cold": lambda i: db.get_posts_in_bar(cold_bar["id"], 1, 20, user),
+        "db.get_posts_in_bar_by_cursor.hot": lambda i: db.get_posts_in_bar_by_cursor(
+            hot_bar["id"], None, 20, user
+        ),
+        "db.get_post_detail.busy": lambda i: db.get_post_detail(t["busy_post"], user),
+        "db.get_comments_in_post.busy": lambda i: db.get_comments_in_post(
+            t["busy_post"], 1, 50, user
+        ),
+        "db.get_comments_in_post.quiet": lambda i: db.get_comments_in_post(
+            t["quiet_post"], 1, 50, user
+        ),
+        "db.get_comments_in_post_by_cursor.busy": lambda i: db.get_comments_in_post_by_cursor(
+            t["busy_post"], None, 50, user
+        ),
+        "db.get_hot_posts": lambda i: db.get_hot_posts(1, 20, user),
+        "db.get_hot_bars": lambda i: db.get_hot_bars(20),
+        "db.get_user_bars": lambda i: db.get_user_bars(user),
+        "db.get_user_by_id": lambda i: db.get_user_by_id(user),
+        "db.get_bar_by_name": lambda i: db.get_bar_by_name(hot_bar["name"]),
+        "db.get_stats": lambda i: db.get_stats(),
+        "db.search_posts.common": lambda i: db.search_posts("今天", user, 1, 20),
+        "db.search_posts.rare": lambda i: db.search_posts("mysql vue", user, 1, 20),
+        "db.search_posts.page2": lambda i: db.search_posts("今天", user, 2, 20),
+        "db.check_post_liked": lambda i: db.check_post_liked(user, t["busy_post"]),
+        "db.get_post_likes": lambda i: db.get_post_likes(t["busy_post"]),
+        "db.login_user": lambda i: db.login_user(f"user{user}", BENCH_PASSWORD),
+        "db.validate_session": lambda i: db.validate_session(session),
+        # 写
+        "db.create_post": lambda i: db.create_post(hot_bar["id"], f"基准{i}", "今天 天气", user),
+        "db.create_comment": lambda i: db.create_comment(t["busy_post"], f"评论{i}", user),
+        "db.toggle_post_like": lambda i: db.toggle_post_like(user, t["busy_post"]),
+        "db.like_comment": lambda i: db.like_comment(user, t["comment"]),
+        "db.follow_bar": lambda i: (
+            db.follow_bar(user, cold_bar["id"]),
+            db.unfollow_bar(user, cold_bar["id"]),
+        ),
+        "db.register_user": lambda i: db.register_user(f"bench{i}", BENCH_PASSWORD),
+        "db.create_bar": lambda i: db.create_bar(f"基准吧{i}", user),
+        "db.create_session": lambda i: db.create_session(user),
+    }
+
+
+def api_cases(t):
+    """main.Api 的用例；没有 pywebview 时返回 None"""
+    try:
+        import main
+    except ImportError as e:
+        print(f"跳过 main.Api 用例: {e}")
+        return None
+
+    api = main.Api()
+    api.session_file = os.path.join(tempfile.gettempdir(), "bench-session.json")
+    api.current_user_id = t["active_user"]
+    hot_bar = t["hot_bar"]
+    return {
+        "api.getHomepageBundle": lambda i: api.getHomepageBundle(20),
+        "api.getCurrentUser": lambda i: api.getCurrentUser(),
+        "api.getLatestPosts": lambda i: api.getLatestPosts(1, 20),
+        "api.getLatestPostsByCursor": lambda i: api.getLatestPostsByCursor(None, 20),
+        "api.getPostsInBar": lambda i: api.getPostsInBar(hot_bar["id"], 1, 20),
+        "api.getPostsInBarByCursor": lambda i: api.getPostsInBarByCursor(hot_bar["id"], None, 20),
+        "api.getPostById": lambda i: api.getPostById(t["busy_post"]),
+        "api.getCommentsInPost": lambda i: api.getCommentsInPost(t["busy_post"], 1, 50),
+        "api.getCommentsInPostByCursor": lambda i: api.getCommentsInPostByCursor(
+            t["busy_post"], None, 50
+        ),
+        "api.getHotPosts": lambda i: api.getHotPosts(1, 20),
+        "api.getHotBars": lambda i: api.getHotBars(20),
+        "api.getFollowedBars": lambda i: api.getFollowedBars(),
+        "api.getBarByName": lambda i: api.getBarByName(hot_bar["name"]),
+        "api.getUserById": lambda i: api.getUserById(t["active_user"]),
+        "api.getStats": lambda i: api.getStats(),
+        "api.searchPosts": lambda i: api.searchPosts("今天", 1, 20),
+        "api.batch": lambda i: api.batch(
+            [
+                {"method": "getHotBars", "args": [20]},
+                {"method": "getFollowedBars", "args": []},
+                {"method": "getStats", "args": []},
+            ]
+        ),
+        "api.createPost": lambda i: api.createPost(hot_bar["id"], f"接口{i}", "今天 天气"),
+        "api.createComment": lambda i: api.createComment(t["busy_post"], f"接口评论{i}"),
+        "api.toggleLike": lambda i: api.toggleLike(t["busy_post"]),
+        "api.likeComment": lambda i: api.likeComment(t["comment"]),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="运行性能基准")
+    parser.add_argument("--scale", choices=SCALES, default="10k")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--cache", action="store_true", help="保留读取缓存")
+    parser.add_argument("--only", help="只运行名称以此开头的用例")
+    parser.add_argument("--out", help="结果 JSON 文件")
+    args = parser.parse_args()
+
+    workdir = use_copy(args.scale)
+    if not args.cache:
+        os.environ["DB_CACHE"] = "0"
+
+    os.environ["DB_METRICS"] = "1"
+    os.environ["DB_SLOW_QUERY_MS"] = "inf"  # 不写慢查询日志
+
+    import db
+
+    targets = pick_targets(db)
+    cases = db_cases(db, targets)
+    cases.update(api_cases(targets) or {})
+
+    results = {}
+    print(f"{'用例':<40}{'p50':>9}{'p95':>9}{'p99':>9}{'查询':>5}")
+    try:
+        for name, func in cases.items():
+            if args.only and not name.startswith(args.only):
+                continue
+            results[name] = measure(func, args.iterations)
+            r = results[name]
+            print(
+                f"{name:<42}{r['p50_ms']:>9.3f}{r['p95_ms']:>9.3f}{r['p99_ms']:>9.3f}"
+                f"{r['queries_per_call']:>7}"
+            )
+    finally:
+        db.db_pool.close_all()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "scale": args.scale,
+            "engine": db.engine.name,
+            "cache": args.cache,
+            "iterations": args.iterations,
+            "python": platform.python_version(),
+            "commit": git_commit(),
+            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        },
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.out}")
+
+
+if __name__ == "__main__":
+    main()
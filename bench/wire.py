@@ -0,0 +1,90 @@
+"""列表接口的传输格式基准
+
+对 20、100、1000 行的帖子列表，分别以字典列表（默认）和列式紧凑格式（codec.py）调用
+db 函数并用 json.dumps 序列化（pywebview 向前端传递结果的方式），记录延迟分位数和每页字节数。
+结果格式与 bench.run 相同，可以用 bench.compare 对比。
+
+用法: python -m bench.wire --scale 10k [--iterations 200] [--out result.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+from datetime import datetime
+
+from bench import SCALES, use_copy
+from bench.run import git_commit, measure, pick_targets
+
+PAGE_SIZES = (20, 100, 1000)
+FORMATS = {"dicts": False, "columns": True}
+
+
+def wire_cases(db, t):
+    """{名称: (func(i), 每页字节数)}；func 返回序列化后的字符串"""
+    user = t["active_user"]
+    lists = {
+        "latest": lambda per_page, compact: db.get_latest_posts(
+            1, per_page, user, compact=compact
+        ),
+        "hot": lambda per_page, compact: db.get_hot_posts(1, per_page, user, compact=compact),
+    }
+    cases = {}
+    for name, fetch in lists.items():
+        for per_page in PAGE_SIZES:
+            for fmt, compact in FORMATS.items():
+
+                def func(i, fetch=fetch, per_page=per_page, compact=compact):
+                    return json.dumps(fetch(per_page, compact))
+
+                cases[f"wire.{name}.{per_page}.{fmt}"] = (func, len(func(0).encode()))
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description="列表接口传输格式基准")
+    parser.add_argument("--scale", choices=SCALES, default="10k")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--out", help="结果 JSON 文件")
+    args = parser.parse_args()
+
+    workdir = use_copy(args.scale)
+    os.environ["DB_CACHE"] = "0"
+    os.environ["DB_METRICS"] = "1"
+    os.environ["DB_SLOW_QUERY_MS"] = "inf"
+
+    import db
+
+    results = {}
+    print(f"{'用例':<32}{'p50':>9}{'p95':>9}{'字节':>10}{'字节/行':>8}")
+    try:
+        for name, (func, size) in wire_cases(db, pick_targets(db)).items():
+            results[name] = measure(func, args.iterations)
+            results[name]["bytes"] = size
+            r = results[name]
+            rows = int(name.split(".")[2])
+            print(f"{name:<34}{r['p50_ms']:>9.3f}{r['p95_ms']:>9.3f}{size:>10}{size // rows:>9}")
+    finally:
+        db.db_pool.close_all()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "scale": args.scale,
+            "engine": db.engine.name,
+            "iterations": args.iterations,
+            "python": platform.python_version(),
+            "commit": git_commit(),
+            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        },
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.out}")
+
+
+if __name__ == "__main__":
+    main()
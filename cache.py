@@ -0,0 +1,164 @@
+"""数据库读取结果缓存
+
+- 每个读函数用 @cached(ttl, tags) 单独开启缓存，并指定过期时间
+- 所有函数共用一个有界 LRU，超出容量时淘汰最久未使用的条目
+- 写操作提交后调用 invalidate(标签) 使相关条目失效；
+  读取开始后若标签被失效过，读到的结果不会写入缓存，避免把旧数据缓存下来；
+  失效次数只为正在读取的标签记录，读取结束后删除，不随出现过的标签数量增长
+- 取出和写入时都会深拷贝，调用方修改返回值不影响缓存
+"""
+
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from copy import deepcopy
+from functools import wraps
+from os import getenv
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # key -> (过期时间, 值, 标签)
+_tag_keys = defaultdict(set)  # 标签 -> key 集合
+_tag_versions = {}  # 标签 -> 读取期间的失效次数（只记录正在读取的标签）
+_reading = defaultdict(int)  # 标签 -> 正在进行的读取数
+_stats = defaultdict(lambda: {"hits": 0, "misses": 0, "evictions": 0})
+
+max_entries = int(getenv("DB_CACHE_SIZE", "1024"))
+enabled = getenv("DB_CACHE", "1") != "0"
+
+
+def _remove(key):
+    entry = _entries.pop(key, None)
+    if entry:
+        for tag in entry[2]:
+            keys = _tag_keys.get(tag)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del _tag_keys[tag]
+
+
+def _get(key):
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            return False, None
+        if entry[0] < time.monotonic():
+            _remove(key)
+            return False, None
+        _entries.move_to_end(key)
+        return True, entry[1]
+
+
+def _begin(tags):
+    """开始读取，返回各标签当前的失效次数（调用方持有锁）"""
+    for tag in tags:
+        _reading[tag] += 1
+    return {tag: _tag_versions.get(tag, 0) for tag in tags}
+
+
+def _end(tags):
+    """结束读取；标签没有其他读取时删除它的失效次数（调用方持有锁）"""
+    for tag in tags:
+        _reading[tag] -= 1
+        if not _reading[tag]:
+            del _reading[tag]
+            _tag_versions.pop(tag, None)
+
+
+def _set(key, value, ttl, tags, versions):
+    with _lock:
+        # 读取期间被失效过，不写入
+        if any(_tag_versions.get(tag, 0) != version for tag, version in versions.items()):
+            return
+        _remove(key)
+        _entries[key] = (time.monotonic() + ttl, value, tags)
+        for tag in tags:
+            _tag_keys[tag].add(key)
+        while len(_entries) > max_entries:
+            oldest = next(iter(_entries))
+            _stats[oldest[0]]["evictions"] += 1
+            _remove(oldest)
+
+
+def cached(ttl, tags=None):
+    """缓存装饰器；tags 为可选函数，接收与被装饰函数相同的参数，返回标签列表
+
+    函数名本身也是一个标签，invalidate("get_hot_bars") 会清空该函数的全部缓存。
+    """
+
+    def decorator(func):
+        name = func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            key = (name, args, tuple(sorted(kwargs.items())))
+            try:
+                hit, value = _get(key)
+            except TypeError:
+                # 参数不可哈希，不缓存
+                return func(*args, **kwargs)
+
+            if hit:
+                with _lock:
+                    _stats[name]["hits"] += 1
+                return deepcopy(value)
+
+            entry_tags = (name, *(tags(*args, **kwargs) if tags else ()))
+            with _lock:
+                _stats[name]["misses"] += 1
+                versions = _begin(entry_tags)
+            try:
+                value = func(*args, **kwargs)
+                _set(key, deepcopy(value), ttl, entry_tags, versions)
+            finally:
+                with _lock:
+                    _end(entry_tags)
+            return value
+
+        return wrapper
+
+    return decorator
+
+
+def invalidate(*tags):
+    """使带有任一标签的缓存条目失效"""
+    with _lock:
+        for tag in tags:
+            # 没有正在进行的读取时不需要记录
+            if tag in _reading:
+                _tag_versions[tag] = _tag_versions.get(tag, 0) + 1
+            for key in list(_tag_keys.get(tag, ())):
+                _remove(key)
+
+
+def clear():
+    """清空全部缓存"""
+    with _lock:
+        for key in list(_entries):
+            _remove(key)
+        for tag in _reading:
+            _tag_versions[tag] = _tag_versions.get(tag, 0) + 1
+
+
+def stats():
+    """返回各函数的命中、未命中、淘汰次数和当前条目数"""
+    with _lock:
+        sizes = defaultdict(int)
+        for key in _entries:
+            sizes[key[0]] += 1
+        functions = {}
+        for name, counts in _stats.items():
+            total = counts["hits"] + counts["misses"]
+            functions[name] = {
+                **counts,
+                "hit_rate": counts["hits"] / total if total else 0.0,
+                "size": sizes[name],
+            }
+        return {
+            "enabled": enabled,
+            "size": len(_entries),
+            "max_entries": max_entries,
+            "functions": functions,
+        }
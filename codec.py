@@ -0,0 +1,70 @@
+"""列表接口的紧凑编码（列式）
+
+默认的列表结果是字典列表：每一行都重复全部键名，create_time 逐行格式化为字符串，
+同一个用户名、贴吧名在一页中重复出现。紧凑格式为：
+
+    {
+        "format": "columns",
+        "count": 行数,
+        "columns": ["id", "title", "author_name", "create_time", ...],  # 列名只发送一次
+        "values": [[...], [...], ...],        # 每列一个数组，顺序与 columns 相同
+        "names": ["张三", "数学吧", ...],      # 用户名、贴吧名去重后的查找表
+        "name_columns": ["author_name"],      # 这些列的值为 names 的下标
+        "time_columns": ["create_time"],      # 这些列的值为 Unix 时间戳（秒，本地时间）
+    }
+
+前端的 decodeRows（static/js/main.js）把它还原为字典列表。
+"""
+
+from datetime import datetime
+
+FORMAT = "columns"
+# 值为名称、按查找表去重的列
+NAME_COLUMNS = ("author_name", "bar_name")
+# 值为时间、编码为时间戳的列
+TIME_COLUMNS = ("create_time",)
+
+
+def to_epoch(value):
+    """datetime 或 'YYYY-MM-DD HH:MM:SS' 字符串转换为 Unix 时间戳（秒）"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return int(value.timestamp())
+
+
+def encode_rows(rows):
+    """把字典列表编码为列式结构（各行的键与第一行相同）"""
+    columns = list(rows[0]) if rows else []
+    values = []
+    names = {}
+    for column in columns:
+        if column in NAME_COLUMNS:
+            values.append([names.setdefault(row[column], len(names)) for row in rows])
+        elif column in TIME_COLUMNS:
+            values.append([to_epoch(row[column]) for row in rows])
+        else:
+            values.append([row[column] for row in rows])
+    return {
+        "format": FORMAT,
+        "count": len(rows),
+        "columns": columns,
+        "values": values,
+        "names": list(names),
+        "name_columns": [column for column in columns if column in NAME_COLUMNS],
+        "time_columns": [column for column in columns if column in TIME_COLUMNS],
+    }
+
+
+def decode_rows(data):
+    """还原为字典列表（时间列保留为时间戳）；普通列表原样返回"""
+    if not isinstance(data, dict):
+        return data
+    names = data["names"]
+    columns = []
+    for column, values in zip(data["columns"], data["values"]):
+        if column in data["name_columns"]:
+            values = [names[index] for index in values]
+        columns.append(values)
+    return [dict(zip(data["columns"], row)) for row in zip(*columns)] if columns else []
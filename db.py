@@ -1,8 +1,21 @@
-from pymysql import connect
-from pymysql.cursors import DictCursor
 from dotenv import load_dotenv
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from functools import wraps
 from hashlib import sha256
 from os import urandom, getenv
+from engines import create_engine
+from pool import ConnectionPool
+from cache import cached
+import cache
+import codec
+import events
+import metrics
+import random
+import search
+import threading
+import time
 
 load_dotenv()
 
@@ -17,7 +30,8 @@ CREATE_TABLE_USER_COMMAND = """
         name VARCHAR(255) NOT NULL UNIQUE, -- 用户名唯一
         password VARCHAR(255) NOT NULL COMMENT '哈希后的密码',
         salt VARCHAR(255) NOT NULL COMMENT '密码盐值',
-        exp INT NOT NULL DEFAULT 0 COMMENT '经验值'
+        exp INT NOT NULL DEFAULT 0 COMMENT '经验值',
+        create_time DATETIME NULL DEFAULT CURRENT_TIMESTAMP COMMENT '注册时间（旧用户为空）'
     );
 """
 
@@ -28,6 +42,8 @@ CREATE_TABLE_BARS_COMMAND = """
         name VARCHAR(255) NOT NULL UNIQUE, -- 贴吧名称唯一
         owner_id INT NOT NULL,
         create_time DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        post_count INT NOT NULL DEFAULT 0 COMMENT '帖子数（冗余计数）',
+        INDEX idx_bars_post_count (post_count),
         FOREIGN KEY (owner_id) REFERENCES users(id) -- 关联用户
     );
 """
@@ -39,8 +55,16 @@ CREATE_TABLE_POSTS_COMMAND = """
         bar_id INT NOT NULL COMMENT '所属贴吧ID', -- 关键字段
         title VARCHAR(255) NOT NULL,
         content TEXT NOT NULL,
+        excerpt VARCHAR(255) NOT NULL DEFAULT '' COMMENT '正文摘要（发帖时生成，列表只返回摘要）',
         author_id INT NOT NULL,
         create_time DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        like_count INT NOT NULL DEFAULT 0 COMMENT '点赞数（冗余计数）',
+        comment_count INT NOT NULL DEFAULT 0 COMMENT '评论数（冗余计数）',
+        hot_decay DOUBLE NOT NULL DEFAULT 1 COMMENT '热度时间衰减因子',
+        hot_score DOUBLE NOT NULL DEFAULT 0 COMMENT '热度（定时衰减，点赞评论时增量更新）',
+        INDEX idx_posts_hot (hot_score, id),
+        INDEX idx_posts_time (create_time, id),
+        INDEX idx_posts_bar_time (bar_id, create_time, id),
         FOREIGN KEY (bar_id) REFERENCES bars(id), -- 关联贴吧
         FOREIGN KEY (author_id) REFERENCES users(id) -- 关联用户
     );
@@ -56,6 +80,7 @@ CREATE_TABLE_COMMENTS_COMMAND = """
         create_time DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
         likes INT NOT NULL DEFAULT 0,
         reply_to_user INT COMMENT '回复目标用户ID（可为空）',
+        INDEX idx_comments_post_time (post_id, create_time, id),
         FOREIGN KEY (post_id) REFERENCES posts(id), -- 关联帖子
         FOREIGN KEY (author_id) REFERENCES users(id), -- 关联用户
         FOREIGN KEY (reply_to_user) REFERENCES users(id) -- 关联被回复用户
@@ -95,6 +120,119 @@ CREATE_TABLE_COMMENT_LIKES_COMMAND = """
     );
 """
 
+# 搜索倒排索引表（词项区分大小写与假名，使用二进制排序规则）
+CREATE_TABLE_SEARCH_INDEX_COMMAND = """
+    CREATE TABLE IF NOT EXISTS search_index (
+        term VARCHAR(32) COLLATE utf8mb4_bin NOT NULL,
+        post_id INT NOT NULL,
+        weight INT NOT NULL COMMENT '词项权重（标题加权）',
+        PRIMARY KEY (term, post_id),
+        INDEX idx_search_post (post_id),
+        FOREIGN KEY (post_id) REFERENCES posts(id)
+    );
+"""
+
+# 搜索词项文档频率表
+CREATE_TABLE_SEARCH_TERMS_COMMAND = """
+    CREATE TABLE IF NOT EXISTS search_terms (
+        term VARCHAR(32) COLLATE utf8mb4_bin NOT NULL PRIMARY KEY,
+        df INT NOT NULL DEFAULT 0 COMMENT '包含该词项的帖子数'
+    );
+"""
+
+# 文档频率还未汇总到 search_terms 的帖子（发帖时追加，由定时任务汇总后删除）
+CREATE_TABLE_SEARCH_PENDING_COMMAND = """
+    CREATE TABLE IF NOT EXISTS search_pending (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        post_id INT NOT NULL
+    );
+"""
+
+# 社区统计计数表（由写操作维护，按天分桶）
+CREATE_TABLE_SITE_STATS_COMMAND = """
+    CREATE TABLE IF NOT EXISTS site_stats (
+        bucket DATE NOT NULL COMMENT '统计日期，1970-01-01 表示累计总数',
+        name VARCHAR(32) NOT NULL COMMENT '计数名称（posts, users, comments）',
+        value BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (bucket, name)
+    );
+"""
+
+# 登录会话表（只保存令牌的哈希）
+CREATE_TABLE_SESSIONS_COMMAND = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        token_hash CHAR(64) NOT NULL PRIMARY KEY COMMENT '令牌的 SHA256',
+        user_id INT NOT NULL,
+        create_time DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        expire_time DATETIME NOT NULL,
+        INDEX idx_sessions_user (user_id),
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    );
+"""
+
+# 批量导入：源数据 id 与本地 id 的对应关系（评论、点赞据此关联帖子和评论）
+CREATE_TABLE_IMPORT_IDS_COMMAND = """
+    CREATE TABLE IF NOT EXISTS import_ids (
+        job VARCHAR(64) NOT NULL COMMENT '导入任务名',
+        kind CHAR(1) NOT NULL COMMENT 'P 帖子, C 评论',
+        source_id VARCHAR(64) NOT NULL COMMENT '源数据中的 id',
+        local_id INT NOT NULL,
+        PRIMARY KEY (job, kind, source_id)
+    );
+"""
+
+# 批量导入：各阶段已处理的记录数，用于中断后继续
+CREATE_TABLE_IMPORT_PROGRESS_COMMAND = """
+    CREATE TABLE IF NOT EXISTS import_progress (
+        job VARCHAR(64) NOT NULL,
+        stage VARCHAR(16) NOT NULL COMMENT 'posts, comments, likes',
+        position BIGINT NOT NULL DEFAULT 0 COMMENT '已处理的记录数',
+        PRIMARY KEY (job, stage)
+    );
+"""
+
+# 批量导入：按用户汇总、导入结束时统一发放的经验值
+CREATE_TABLE_IMPORT_EXP_COMMAND = """
+    CREATE TABLE IF NOT EXISTS import_exp (
+        job VARCHAR(64) NOT NULL,
+        user_id INT NOT NULL,
+        exp BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (job, user_id)
+    );
+"""
+
+# 经验值流水：发帖、评论、点赞只追加记录，由 ledger.py 定期分批汇总到 users.exp
+# （不加外键，插入时不必锁住作者的 users 行）
+CREATE_TABLE_EXP_LEDGER_COMMAND = """
+    CREATE TABLE IF NOT EXISTS exp_ledger (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        user_id INT NOT NULL,
+        exp INT NOT NULL,
+        create_time DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        INDEX idx_exp_ledger_user (user_id)
+    );
+"""
+
+# 所有表（按依赖顺序）
+TABLES = [
+    ("users", CREATE_TABLE_USER_COMMAND),
+    ("bars", CREATE_TABLE_BARS_COMMAND),
+    ("posts", CREATE_TABLE_POSTS_COMMAND),
+    ("comments", CREATE_TABLE_COMMENTS_COMMAND),
+    ("user_bars", CREATE_TABLE_USER_BARS_COMMAND),
+    ("post_likes", CREATE_TABLE_POST_LIKES_COMMAND),
+    ("comment_likes", CREATE_TABLE_COMMENT_LIKES_COMMAND),
+    ("search_index", CREATE_TABLE_SEARCH_INDEX_COMMAND),
+    ("search_terms", CREATE_TABLE_SEARCH_TERMS_COMMAND),
+    ("site_stats", CREATE_TABLE_SITE_STATS_COMMAND),
+    ("sessions", CREATE_TABLE_SESSIONS_COMMAND),
+    ("import_ids", CREATE_TABLE_IMPORT_IDS_COMMAND),
+    ("import_progress", CREATE_TABLE_IMPORT_PROGRESS_COMMAND),
+    ("import_exp", CREATE_TABLE_IMPORT_EXP_COMMAND),
+    ("exp_ledger", CREATE_TABLE_EXP_LEDGER_COMMAND),
+    ("search_pending", CREATE_TABLE_SEARCH_PENDING_COMMAND),
+]
+
 # ========================
 # SQL 操作模板
 # ========================
@@ -123,8 +261,8 @@ DELETE FROM user_bars WHERE user_id = %s AND bar_id = %s
 
 # 插入帖子
 INSERT_POST_COMMAND = """
-INSERT INTO posts (bar_id, title, content, author_id)
-VALUES (%s, %s, %s, %s)
+INSERT INTO posts (bar_id, title, content, excerpt, author_id)
+VALUES (%s, %s, %s, %s, %s)
 """
 
 # 插入评论
@@ -133,38 +271,37 @@ INSERT INTO comments (post_id, content, author_id, reply_to_user)
 VALUES (%s, %s, %s, %s)
 """
 
-# 点赞评论
-LIKE_COMMENT_COMMAND = """
-UPDATE comments
-SET likes = likes + 1
-WHERE id = %s
-"""
-
-# 取消点赞评论
-UNLIKE_COMMENT_COMMAND = """
+# 更新评论点赞数，并通过 LAST_INSERT_ID 返回更新后的点赞数
+UPDATE_COMMENT_LIKES_COMMAND = """
 UPDATE comments
-SET likes = likes - 1
+SET likes = LAST_INSERT_ID(likes + %s)
 WHERE id = %s
 """
 
-# 检查用户是否已点赞评论
-CHECK_COMMENT_LIKED_COMMAND = """
-SELECT COUNT(*) as liked FROM comment_likes WHERE user_id = %s AND comment_id = %s
-"""
-
 # 点赞评论记录
 INSERT_COMMENT_LIKE_COMMAND = """
 INSERT INTO comment_likes (user_id, comment_id) VALUES (%s, %s)
 """
 
+# 点赞评论（已点赞时忽略，影响行数为 0）
+LIKE_COMMENT_IF_ABSENT_COMMAND = """
+INSERT IGNORE INTO comment_likes (user_id, comment_id) VALUES (%s, %s)
+"""
+
 # 取消点赞评论记录
 DELETE_COMMENT_LIKE_COMMAND = """
 DELETE FROM comment_likes WHERE user_id = %s AND comment_id = %s
 """
 
-# 获取评论点赞数
+# 获取评论点赞数（读取冗余计数）
 GET_COMMENT_LIKES_COMMAND = """
-SELECT COUNT(*) as likes FROM comment_likes WHERE comment_id = %s
+SELECT likes FROM comments WHERE id = %s
+"""
+
+# 给评论作者追加经验值流水
+ADD_COMMENT_AUTHOR_EXP_COMMAND = """
+INSERT INTO exp_ledger (user_id, exp)
+SELECT author_id, %s FROM comments WHERE id = %s
 """
 
 # 检查用户是否已点赞帖子
@@ -177,14 +314,72 @@ LIKE_POST_COMMAND = """
 INSERT INTO post_likes (user_id, post_id) VALUES (%s, %s)
 """
 
+# 点赞帖子（已点赞时忽略，影响行数为 0）
+LIKE_POST_IF_ABSENT_COMMAND = """
+INSERT IGNORE INTO post_likes (user_id, post_id) VALUES (%s, %s)
+"""
+
 # 取消点赞帖子
 UNLIKE_POST_COMMAND = """
 DELETE FROM post_likes WHERE user_id = %s AND post_id = %s
 """
 
-# 获取帖子点赞数
+# 获取帖子点赞数（读取冗余计数）
 GET_POST_LIKES_COMMAND = """
-SELECT COUNT(*) as likes FROM post_likes WHERE post_id = %s
+SELECT like_count as likes FROM posts WHERE id = %s
+"""
+
+# 获取帖子评论数
+GET_POST_COMMENT_COUNT_COMMAND = """
+SELECT comment_count FROM posts WHERE id = %s
+"""
+
+# 热度权重：热度 = (点赞数 * 1.5 + 评论数) * 时间衰减因子
+HOT_LIKE_WEIGHT = 1.5
+HOT_COMMENT_WEIGHT = 1.0
+
+# 更新帖子点赞计数，同时按当前衰减因子增量更新热度
+ADD_POST_LIKE_COUNT_COMMAND = """
+UPDATE posts
+SET like_count = like_count + %s, hot_score = hot_score + %s * hot_decay
+WHERE id = %s
+"""
+
+# 切换点赞时更新点赞计数和热度，并通过 LAST_INSERT_ID 返回更新后的点赞数
+UPDATE_POST_LIKE_COUNT_COMMAND = """
+UPDATE posts
+SET like_count = LAST_INSERT_ID(like_count + %s), hot_score = hot_score + %s * hot_decay
+WHERE id = %s
+"""
+
+# 给帖子作者追加经验值流水
+ADD_POST_AUTHOR_EXP_COMMAND = """
+INSERT INTO exp_ledger (user_id, exp)
+SELECT author_id, %s FROM posts WHERE id = %s
+"""
+
+# 更新帖子评论计数，同时增量更新热度
+ADD_POST_COMMENT_COUNT_COMMAND = """
+UPDATE posts
+SET comment_count = comment_count + %s, hot_score = hot_score + %s * hot_decay
+WHERE id = %s
+"""
+
+# 更新贴吧帖子计数
+ADD_BAR_POST_COUNT_COMMAND = """
+UPDATE bars SET post_count = post_count + %s WHERE id = %s
+"""
+
+# 批量查询用户已点赞的帖子（{ids} 为 IN 列表占位符）
+GET_POSTS_LIKED_BATCH_COMMAND = """
+SELECT post_id FROM post_likes
+WHERE user_id = %s AND post_id IN ({ids})
+"""
+
+# 批量查询用户已点赞的评论
+GET_COMMENTS_LIKED_BATCH_COMMAND = """
+SELECT comment_id FROM comment_likes
+WHERE user_id = %s AND comment_id IN ({ids})
 """
 
 # 用户登录验证
@@ -192,27 +387,65 @@ LOGIN_USER_COMMAND = """
 SELECT id, password, salt FROM users WHERE name = %s
 """
 
+# 会话有效期（天），每次校验后顺延
+SESSION_TTL_DAYS = int(getenv("SESSION_TTL_DAYS", "30"))
+
+# 创建会话
+INSERT_SESSION_COMMAND = """
+INSERT INTO sessions (token_hash, user_id, expire_time) VALUES (%s, %s, %s)
+"""
+
+# 查询未过期的会话及其用户
+GET_SESSION_USER_COMMAND = """
+SELECT u.id, u.type, u.name,
+       u.exp + COALESCE((SELECT SUM(l.exp) FROM exp_ledger l WHERE l.user_id = u.id), 0) as exp
+FROM sessions s
+JOIN users u ON u.id = s.user_id
+WHERE s.token_hash = %s AND s.expire_time > %s
+"""
+
+# 延长会话有效期
+RENEW_SESSION_COMMAND = """
+UPDATE sessions SET expire_time = %s WHERE token_hash = %s
+"""
+
+# 删除会话
+DELETE_SESSION_COMMAND = """
+DELETE FROM sessions WHERE token_hash = %s
+"""
+
+# 删除用户已过期的会话
+DELETE_EXPIRED_SESSIONS_COMMAND = """
+DELETE FROM sessions WHERE user_id = %s AND expire_time <= %s
+"""
+
 # 查询贴吧
 GET_BAR_BY_NAME_COMMAND = """
 SELECT id, name, owner_id, create_time FROM bars WHERE name = %s
 """
 
-# 查询帖子
-GET_POST_BY_ID_COMMAND = """
-SELECT p.id, p.bar_id, p.title, p.content, p.author_id, p.create_time, u.name as author_name
+# 帖子详情：帖子、冗余计数和当前用户是否已点赞（未登录时用户 id 为 NULL，is_liked 为 0）
+GET_POST_DETAIL_COMMAND = """
+SELECT p.id, p.bar_id, p.title, p.content, p.author_id, p.create_time,
+       p.like_count as likes, p.comment_count as comments_count, u.name as author_name,
+       EXISTS(SELECT 1 FROM post_likes pl WHERE pl.user_id = %s AND pl.post_id = p.id) as is_liked
 FROM posts p
 JOIN users u ON p.author_id = u.id
 WHERE p.id = %s
 """
 
-# 查询用户
+# 查询用户（经验值包括还未汇总的流水）
 GET_USER_BY_ID_COMMAND = """
-SELECT id, type, name, exp FROM users WHERE id = %s
+SELECT u.id, u.type, u.name,
+       u.exp + COALESCE((SELECT SUM(l.exp) FROM exp_ledger l WHERE l.user_id = u.id), 0) as exp
+FROM users u
+WHERE u.id = %s
 """
 
 # 查询贴吧的所有帖子
 GET_POSTS_IN_BAR_COMMAND = """
-SELECT p.id, p.title, p.author_id, p.create_time, p.content, u.name as author_name
+SELECT p.id, p.title, p.author_id, p.create_time, p.excerpt,
+       p.like_count as likes, p.comment_count as comments_count, u.name as author_name
 FROM posts p
 JOIN users u ON p.author_id = u.id
 WHERE p.bar_id = %s
@@ -220,6 +453,45 @@ ORDER BY p.create_time DESC
 LIMIT %s OFFSET %s
 """
 
+# 按游标查询贴吧的帖子（{after} 为空或 AND + POSTS_AFTER_CURSOR_CONDITION）
+GET_POSTS_IN_BAR_BY_CURSOR_COMMAND = """
+SELECT p.id, p.title, p.author_id, p.create_time, p.excerpt,
+       p.like_count as likes, p.comment_count as comments_count, u.name as author_name
+FROM posts p
+JOIN users u ON p.author_id = u.id
+WHERE p.bar_id = %s {after}
+ORDER BY p.create_time DESC, p.id DESC
+LIMIT %s
+"""
+
+# 查询最新帖子
+GET_LATEST_POSTS_COMMAND = """
+SELECT p.id, p.title, p.excerpt, p.bar_id, p.author_id, p.create_time,
+       p.like_count as likes, p.comment_count as comments_count,
+       b.name as bar_name, u.name as author_name
+FROM posts p
+JOIN bars b ON p.bar_id = b.id
+JOIN users u ON p.author_id = u.id
+ORDER BY p.create_time DESC
+LIMIT %s OFFSET %s
+"""
+
+# 按游标查询最新帖子（{where} 为空或 WHERE + POSTS_AFTER_CURSOR_CONDITION）
+GET_LATEST_POSTS_BY_CURSOR_COMMAND = """
+SELECT p.id, p.title, p.excerpt, p.bar_id, p.author_id, p.create_time,
+       p.like_count as likes, p.comment_count as comments_count,
+       b.name as bar_name, u.name as author_name
+FROM posts p
+JOIN bars b ON p.bar_id = b.id
+JOIN users u ON p.author_id = u.id
+{where}
+ORDER BY p.create_time DESC, p.id DESC
+LIMIT %s
+"""
+
+# 帖子游标条件：(create_time, id) 早于游标
+POSTS_AFTER_CURSOR_CONDITION = "(p.create_time < %s OR (p.create_time = %s AND p.id < %s))"
+
 # 查询帖子的所有评论
 GET_COMMENTS_IN_POST_COMMAND = """
 SELECT c.id, c.content, c.author_id, c.create_time, c.likes, u.name as author_name
@@ -230,17 +502,125 @@ ORDER BY c.create_time ASC
 LIMIT %s OFFSET %s
 """
 
-# 增加用户经验
+# 按游标查询帖子的评论（{after} 为空或 AND + COMMENTS_AFTER_CURSOR_CONDITION）
+GET_COMMENTS_IN_POST_BY_CURSOR_COMMAND = """
+SELECT c.id, c.content, c.author_id, c.create_time, c.likes, u.name as author_name
+FROM comments c
+JOIN users u ON c.author_id = u.id
+WHERE c.post_id = %s {after}
+ORDER BY c.create_time ASC, c.id ASC
+LIMIT %s
+"""
+
+# 评论游标条件：(create_time, id) 晚于游标
+COMMENTS_AFTER_CURSOR_CONDITION = "(c.create_time > %s OR (c.create_time = %s AND c.id > %s))"
+
+# 增加用户经验（直接更新 users，用于汇总流水和批量导入）
 ADD_USER_EXP_COMMAND = """
 UPDATE users SET exp = exp + %s WHERE id = %s
 """
 
+# 追加经验值流水
+ADD_EXP_LEDGER_COMMAND = """
+INSERT INTO exp_ledger (user_id, exp) VALUES (%s, %s)
+"""
+
+# 获取热门帖子（按热度排序）
+GET_HOT_POSTS_COMMAND = """
+SELECT p.id, p.title, p.excerpt, p.bar_id, p.author_id, p.create_time,
+       p.like_count as likes, p.comment_count as comments_count, p.hot_score as hotness,
+       b.name as bar_name, u.name as author_name
+FROM posts p
+JOIN bars b ON p.bar_id = b.id
+JOIN users u ON p.author_id = u.id
+ORDER BY p.hot_score DESC, p.id DESC
+LIMIT %s OFFSET %s
+"""
+
+# 按ID批量获取帖子（搜索结果；正文只用于生成高亮摘要，不返回）
+GET_POSTS_BY_IDS_COMMAND = """
+SELECT p.id, p.title, p.content, p.excerpt, p.bar_id, p.author_id, p.create_time,
+       p.like_count as likes, p.comment_count as comments_count,
+       b.name as bar_name, u.name as author_name
+FROM posts p
+JOIN bars b ON p.bar_id = b.id
+JOIN users u ON p.author_id = u.id
+WHERE p.id IN ({ids})
+"""
+
+# 按 id 分批读取帖子（重建搜索索引）
+GET_POSTS_TEXT_BATCH_COMMAND = """
+SELECT id, title, content FROM posts
+WHERE id > %s
+ORDER BY id
+LIMIT %s
+"""
+
+# 更新帖子摘要（回填旧帖子）
+UPDATE_POST_EXCERPT_COMMAND = """
+UPDATE posts SET excerpt = %s WHERE id = %s
+"""
+
+# 帖子摘要长度（字符，不含省略号）
+EXCERPT_LENGTH = 200
+
+# 帖子列表可以投影的字段（id 总是返回）
+POST_LIST_FIELDS = frozenset(
+    (
+        "id",
+        "title",
+        "excerpt",
+        "snippet",
+        "bar_id",
+        "bar_name",
+        "author_id",
+        "author_name",
+        "create_time",
+        "likes",
+        "comments_count",
+        "hotness",
+        "is_liked",
+    )
+)
+
+# 累计总数所在的统计日期
+STATS_TOTAL_BUCKET = date(1970, 1, 1)
+
+# 增加统计计数
+ADD_SITE_STAT_COMMAND = """
+INSERT INTO site_stats (bucket, name, value) VALUES (%s, %s, %s)
+ON DUPLICATE KEY UPDATE value = value + VALUES(value)
+"""
+
+# 读取累计总数和今日计数
+GET_SITE_STATS_COMMAND = """
+SELECT bucket, name, value FROM site_stats WHERE bucket IN (%s, %s)
+"""
+
+# 变更轮询的高水位：最大帖子id和最大评论id
+GET_CHANGE_MARKS_COMMAND = """
+SELECT (SELECT MAX(id) FROM posts) AS post_id, (SELECT MAX(id) FROM comments) AS comment_id
+"""
+
+# 高水位之后的新帖子
+GET_POSTS_AFTER_COMMAND = """
+SELECT id, bar_id FROM posts WHERE id > %s ORDER BY id LIMIT %s
+"""
+
+# 高水位之后的新评论所属的帖子
+GET_COMMENTED_POSTS_AFTER_COMMAND = """
+SELECT post_id FROM comments WHERE id > %s ORDER BY id LIMIT %s
+"""
+
+# 帖子的评论数（{ids} 为 IN 列表占位符）
+GET_POSTS_COMMENT_COUNT_COMMAND = """
+SELECT id, comment_count FROM posts WHERE id IN ({ids})
+"""
+
 # 获取热门贴吧（按帖子数量排序）
 GET_HOT_BARS_COMMAND = """
-SELECT b.id, b.name, COUNT(p.id) as post_count
-FROM bars b
-LEFT JOIN posts p ON b.id = p.bar_id
-GROUP BY b.id
+SELECT id, name, post_count
+FROM bars
 ORDER BY post_count DESC
 LIMIT %s
 """
@@ -257,57 +637,329 @@ WHERE ub.user_id = %s
 # ========================
 # 数据库连接管理
 # ========================
-DB_PASSWORD = str(getenv("pswd"))
+# 存储引擎（MySQL 或本地 SQLite），由环境变量 DB_ENGINE 选择
+engine = create_engine()
 
 
 def get_db_connection():
     """创建并返回数据库连接"""
-    return connect(
-        host="mysql2.sqlpub.com",
-        port=3307,
-        user="gpchndb",
-        password=DB_PASSWORD,
-        database="gpchndb",
-        charset="utf8mb4",
-        cursorclass=DictCursor,
-    )
+    return engine.connect()
+
+
+# 连接池：复用已建立的连接，避免每次调用都重新握手
+db_pool = ConnectionPool(
+    get_db_connection,
+    ping=engine.ping,
+    max_size=int(getenv("DB_POOL_SIZE", "8")),
+    max_idle=float(getenv("DB_POOL_MAX_IDLE", "300")),
+    ping_after=float(getenv("DB_POOL_PING_AFTER", "30")),
+    borrow_timeout=float(getenv("DB_POOL_TIMEOUT", "10")),
+)
+
+
+# 当前线程中正在执行的事务的提交后回调，以及 connection_scope 共用的连接
+_local = threading.local()
+
+
+@contextmanager
+def connection_scope():
+    """在当前线程中共用一个连接：范围内的数据库调用不再各自借还连接
+
+    每次调用仍单独提交；可以嵌套，只有最外层借出和归还连接。
+    """
+    if getattr(_local, "conn", None) is not None:
+        yield
+        return
+    _local.conn = db_pool.acquire()
+    _local.conn_broken = False
+    try:
+        yield
+    finally:
+        conn, broken = _local.conn, _local.conn_broken
+        _local.conn = None
+        db_pool.release(conn, discard=broken)
 
 
 def with_db_connection(func):
-    """数据库连接装饰器"""
+    """数据库连接装饰器（从连接池借出连接，结束后归还；在 connection_scope 中则复用其连接）"""
 
+    name = func.__name__
+
+    @wraps(func)
     def wrapper(*args, **kwargs):
-        conn = get_db_connection()
+        start = time.perf_counter()
+        shared = getattr(_local, "conn", None)
+        conn = shared or db_pool.acquire()
+        connected = time.perf_counter()
+        commit_ms = 0.0
+        broken = False
+        failed = True
+        callbacks = []
+        previous = getattr(_local, "after_commit", None)
+        _local.after_commit = callbacks
         try:
-            with conn.cursor() as cursor:
+            with metrics.cursor(conn.cursor(), name) as cursor:
                 result = func(cursor, *args, **kwargs)
+                committing = time.perf_counter()
                 conn.commit()
-            return result
+                commit_ms = (time.perf_counter() - committing) * 1000
+            failed = False
         except Exception as e:
-            conn.rollback()
+            # 连接已断开时不再放回池中（死锁等冲突只回滚事务，连接仍可用）
+            broken = isinstance(e, engine.disconnect_errors) and not engine.is_conflict(e)
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
             raise e
         finally:
-            conn.close()
+            _local.after_commit = previous
+            if shared is None:
+                db_pool.release(conn, discard=broken)
+            elif broken:
+                _local.conn_broken = True
+            metrics.record_call(
+                name,
+                (time.perf_counter() - start) * 1000,
+                connect_ms=(connected - start) * 1000,
+                commit_ms=commit_ms,
+                error=failed,
+            )
+
+        for callback in callbacks:
+            callback()
+        return result
+
+    return wrapper
+
+
+# 死锁、锁等待超时时事务的最多执行次数
+CONFLICT_ATTEMPTS = 3
+
+
+def retry_on_conflict(func):
+    """死锁、锁等待超时时重新执行整个事务（放在 @with_db_connection 外层）"""
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        for attempt in range(1, CONFLICT_ATTEMPTS + 1):
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if attempt == CONFLICT_ATTEMPTS or not engine.is_conflict(e):
+                    raise
+                # 随机退避，避免冲突的事务同时重试
+                time.sleep(random.uniform(0, 0.01 * attempt))
+
+    return wrapper
+
+
+# 本地只读副本（replica.py），未开启时为 None
+replica = None
+
+
+def with_read_connection(func):
+    """只读查询装饰器：开启了本地副本且副本已包含本进程的所有写入时从副本读取，否则读主库"""
+    primary = with_db_connection(func)
+    name = f"{func.__name__}@replica"
+
+    def on_replica(cursor, *args, **kwargs):
+        return func(metrics.cursor(cursor, name), *args, **kwargs)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if replica is not None and replica.fresh():
+            start = time.perf_counter()
+            failed = True
+            try:
+                result = replica.run(on_replica, *args, **kwargs)
+                failed = False
+                return result
+            finally:
+                metrics.record_call(name, (time.perf_counter() - start) * 1000, error=failed)
+        return primary(*args, **kwargs)
 
     return wrapper
 
 
+def changed_after_commit():
+    """事务提交后通知本地副本：在副本同步到这次写入之前，读操作改读主库"""
+    if replica is not None:
+        after_commit(replica.note_write)
+
+
+def after_commit(callback):
+    """注册事务提交后执行的回调；不在事务中时立即执行"""
+    callbacks = getattr(_local, "after_commit", None)
+    if callbacks is None:
+        callback()
+    else:
+        callbacks.append(callback)
+
+
+def invalidate_after_commit(*tags):
+    """事务提交后使相关缓存失效"""
+    after_commit(lambda: cache.invalidate(*tags))
+
+
+def warm_up():
+    """预先建立一个连接放入连接池，供启动时在后台调用"""
+    db_pool.release(db_pool.acquire())
+
+
+def get_pool_stats():
+    """获取连接池统计信息（借出等待时间等）"""
+    return db_pool.stats()
+
+
+def get_cache_stats():
+    """获取读取缓存的命中统计"""
+    return cache.stats()
+
+
+def get_query_stats():
+    """获取各数据库函数的查询统计和最近的慢查询"""
+    return metrics.snapshot()
+
+
+# ========================
+# 列表数据填充
+# ========================
+def format_create_time(rows):
+    """将结果中的 create_time 转换为字符串"""
+    for row in rows:
+        if "create_time" in row and hasattr(row["create_time"], "strftime"):
+            row["create_time"] = row["create_time"].strftime("%Y-%m-%d %H:%M:%S")
+    return rows
+
+
+def _list_rows(rows, compact=False):
+    """列表结果：compact 时为 codec 的列式编码（时间为时间戳，不逐行格式化），否则为字典列表"""
+    return codec.encode_rows(rows) if compact else format_create_time(rows)
+
+
+def make_excerpt(content, length=EXCERPT_LENGTH):
+    """列表显示的正文摘要：合并空白后截取前 length 个字符"""
+    text = " ".join((content or "").split())
+    return text[:length] + "..." if len(text) > length else text
+
+
+def _post_fields(fields):
+    """检查投影字段，返回集合；fields 为空时返回 None（不投影）"""
+    if not fields:
+        return None
+    fields = set(fields)
+    unknown = fields - POST_LIST_FIELDS
+    if unknown:
+        raise ValueError(f"未知的帖子字段: {', '.join(sorted(unknown))}")
+    return fields | {"id"}
+
+
+def project_posts(posts, fields):
+    """只保留 fields 中的字段（fields 为 None 时原样返回）"""
+    if fields is None:
+        return posts
+    for post in posts:
+        for key in [key for key in post if key not in fields]:
+            del post[key]
+    return posts
+
+
+def _in_placeholders(ids):
+    return ", ".join(["%s"] * len(ids))
+
+
+def encode_cursor(row):
+    """将一行的 (create_time, id) 编码为不透明的游标字符串"""
+    raw = f"{row['create_time']}|{row['id']}"
+    return urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """解码游标，返回 (create_time, id)"""
+    create_time, row_id = urlsafe_b64decode(cursor.encode()).decode().rsplit("|", 1)
+    return create_time, int(row_id)
+
+
+def _cursor_args(cursor):
+    """游标条件的参数；cursor 为空时返回空元组"""
+    if not cursor:
+        return ()
+    create_time, row_id = decode_cursor(cursor)
+    return (create_time, create_time, row_id)
+
+
+def _keyset_page(rows, per_page):
+    """截取一页（查询时多取一行用于判断是否还有下一页），返回 (rows, next_cursor)"""
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
+
+
+def enrich_posts(cursor, posts, user_id=None, fields=None, compact=False):
+    """为一页帖子填充 is_liked 并按 fields 投影；likes、comments_count 直接来自冗余计数列
+
+    无论页面大小，最多只执行一条查询；投影不含 is_liked 时不查询。
+    compact 为 True 时返回列式编码（见 codec.py）。
+    """
+    fields = _post_fields(fields)
+    for post in posts:
+        post["is_liked"] = False
+    if not posts or user_id is None or (fields is not None and "is_liked" not in fields):
+        return _list_rows(project_posts(posts, fields), compact)
+
+    by_id = {post["id"]: post for post in posts}
+    ids = list(by_id)
+    cursor.execute(
+        GET_POSTS_LIKED_BATCH_COMMAND.format(ids=_in_placeholders(ids)),
+        (user_id, *ids),
+    )
+    for row in cursor.fetchall():
+        by_id[row["post_id"]]["is_liked"] = True
+
+    return _list_rows(project_posts(posts, fields), compact)
+
+
+def enrich_comments(cursor, comments, user_id=None, compact=False):
+    """为一页评论填充 liked_by_user；likes 直接来自 comments.likes（最多一条查询）"""
+    for comment in comments:
+        comment["liked_by_user"] = False
+    if not comments or user_id is None:
+        return _list_rows(comments, compact)
+
+    by_id = {comment["id"]: comment for comment in comments}
+    ids = list(by_id)
+    cursor.execute(
+        GET_COMMENTS_LIKED_BATCH_COMMAND.format(ids=_in_placeholders(ids)),
+        (user_id, *ids),
+    )
+    for row in cursor.fetchall():
+        by_id[row["comment_id"]]["liked_by_user"] = True
+
+    return _list_rows(comments, compact)
+
+
 # ========================
 # API 功能实现
 # ========================
 @with_db_connection
 def create_tables(cursor):
     """创建所有数据库表"""
-    cursor.execute(CREATE_TABLE_USER_COMMAND)
-    cursor.execute(CREATE_TABLE_BARS_COMMAND)
-    cursor.execute(CREATE_TABLE_POSTS_COMMAND)
-    cursor.execute(CREATE_TABLE_COMMENTS_COMMAND)
-    cursor.execute(CREATE_TABLE_USER_BARS_COMMAND)
-    cursor.execute(CREATE_TABLE_POST_LIKES_COMMAND)
-    cursor.execute(CREATE_TABLE_COMMENT_LIKES_COMMAND)
+    for _, command in TABLES:
+        for statement in engine.schema(command):
+            cursor.execute(statement)
     return True
 
 
+def add_site_stat(cursor, name, delta=1):
+    """在当前事务中增加累计和今日的统计计数"""
+    cursor.executemany(
+        ADD_SITE_STAT_COMMAND,
+        [(STATS_TOTAL_BUCKET, name, delta), (date.today(), name, delta)],
+    )
+
+
 def hash_password(password, salt):
     """使用SHA256哈希密码"""
     return sha256((password + salt).encode()).hexdigest()
@@ -321,7 +973,10 @@ def register_user(cursor, username, password, user_type="U"):
     hashed_pw = hash_password(password, salt)
 
     cursor.execute(INSERT_USER_COMMAND, (user_type, username, hashed_pw, salt, 0))
-    return cursor.lastrowid
+    user_id = cursor.lastrowid
+    add_site_stat(cursor, "users")
+    after_commit(events.user_registered)
+    return user_id
 
 
 @with_db_connection
@@ -340,6 +995,43 @@ def login_user(cursor, username, password):
     return None
 
 
+def _token_hash(token):
+    return sha256(token.encode()).hexdigest()
+
+
+@with_db_connection
+def create_session(cursor, user_id):
+    """创建登录会话，返回 {token, expire_time}；令牌只返回这一次，库中只存哈希"""
+    now = datetime.now()
+    expire_time = now + timedelta(days=SESSION_TTL_DAYS)
+    token = urandom(32).hex()
+    cursor.execute(DELETE_EXPIRED_SESSIONS_COMMAND, (user_id, now))
+    cursor.execute(INSERT_SESSION_COMMAND, (_token_hash(token), user_id, expire_time))
+    return {"token": token, "expire_time": expire_time.strftime("%Y-%m-%d %H:%M:%S")}
+
+
+@with_db_connection
+def validate_session(cursor, token):
+    """校验会话并顺延有效期，返回用户信息；无效或已过期返回 None"""
+    now = datetime.now()
+    token_hash = _token_hash(token)
+    cursor.execute(GET_SESSION_USER_COMMAND, (token_hash, now))
+    user = cursor.fetchone()
+    if user:
+        user["exp"] = int(user["exp"])
+        cursor.execute(
+            RENEW_SESSION_COMMAND, (now + timedelta(days=SESSION_TTL_DAYS), token_hash)
+        )
+    return user
+
+
+@with_db_connection
+def delete_session(cursor, token):
+    """注销会话"""
+    cursor.execute(DELETE_SESSION_COMMAND, (_token_hash(token),))
+    return cursor.rowcount > 0
+
+
 @with_db_connection
 def create_bar(cursor, bar_name, owner_id):
     """创建贴吧"""
@@ -349,18 +1041,31 @@ def create_bar(cursor, bar_name, owner_id):
     # 用户自动关注自己创建的贴吧
     cursor.execute(INSERT_USER_BAR_COMMAND, (owner_id, bar_id))
 
+    invalidate_after_commit("get_hot_bars", f"bar:{bar_name}", f"user_bars:{owner_id}")
+    changed_after_commit()
+
     return bar_id
 
 
+@retry_on_conflict
 @with_db_connection
 def create_post(cursor, bar_id, title, content, author_id):
-    """创建帖子"""
-    cursor.execute(INSERT_POST_COMMAND, (bar_id, title, content, author_id))
+    """创建帖子（同时生成列表用的摘要）"""
+    cursor.execute(INSERT_POST_COMMAND, (bar_id, title, content, make_excerpt(content), author_id))
     post_id = cursor.lastrowid
+    cursor.execute(ADD_BAR_POST_COUNT_COMMAND, (1, bar_id))
+
+    add_site_stat(cursor, "posts")
+
+    # 建立搜索索引；词项的文档频率由定时任务汇总，发帖不锁 search_terms 的热点行
+    search.index_post(cursor, post_id, title, content, defer_df=True)
 
     # 发帖增加经验值
-    cursor.execute(ADD_USER_EXP_COMMAND, (10, author_id))
+    cursor.execute(ADD_EXP_LEDGER_COMMAND, (author_id, 10))
 
+    invalidate_after_commit("get_hot_bars", f"user:{author_id}")
+    changed_after_commit()
+    after_commit(lambda: events.post_created(bar_id, post_id))
     return post_id
 
 
@@ -369,73 +1074,79 @@ def create_comment(cursor, post_id, content, author_id, reply_to_user=None):
     """创建评论"""
     cursor.execute(INSERT_COMMENT_COMMAND, (post_id, content, author_id, reply_to_user))
     comment_id = cursor.lastrowid
+    cursor.execute(ADD_POST_COMMENT_COUNT_COMMAND, (1, HOT_COMMENT_WEIGHT, post_id))
+    add_site_stat(cursor, "comments")
 
     # 评论增加经验值
-    cursor.execute(ADD_USER_EXP_COMMAND, (5, author_id))
+    cursor.execute(ADD_EXP_LEDGER_COMMAND, (author_id, 5))
 
+    cursor.execute(GET_POST_COMMENT_COUNT_COMMAND, (post_id,))
+    row = cursor.fetchone()
+    comment_count = row["comment_count"] if row else 0
+
+    invalidate_after_commit(f"user:{author_id}")
+    changed_after_commit()
+    after_commit(lambda: events.comment_created(post_id, comment_count))
     return comment_id
 
 
+def _toggle_like(cursor, like_command, unlike_command, args):
+    """先插入点赞记录，已存在（插入被忽略）时删除，返回计数增量
+
+    由语句的影响行数判断点赞还是取消，不需要先查询；插入或删除锁住点赞记录，
+    同一用户的并发点击依次执行。返回 0 表示记录已被并发的事务删除。
+    """
+    if cursor.execute(like_command, args):
+        return 1
+    return -cursor.execute(unlike_command, args)
+
+
+@retry_on_conflict
 @with_db_connection
 def like_comment(cursor, user_id, comment_id):
     """切换评论点赞状态（点赞或取消点赞）"""
-    # 检查用户是否已点赞该评论
-    cursor.execute(CHECK_COMMENT_LIKED_COMMAND, (user_id, comment_id))
-    is_liked = cursor.fetchone()["liked"] > 0
-
-    if is_liked:
-        # 已点赞，则取消点赞
-        cursor.execute(DELETE_COMMENT_LIKE_COMMAND, (user_id, comment_id))
-        cursor.execute(UNLIKE_COMMENT_COMMAND, (comment_id,))
-        result = {"is_liked": False}
+    delta = _toggle_like(
+        cursor, LIKE_COMMENT_IF_ABSENT_COMMAND, DELETE_COMMENT_LIKE_COMMAND, (user_id, comment_id)
+    )
+    if delta:
+        # 更新计数的同时取回新的点赞数
+        cursor.execute(UPDATE_COMMENT_LIKES_COMMAND, (delta, comment_id))
+        likes_count = cursor.lastrowid
     else:
-        # 未点赞，则点赞
-        cursor.execute(INSERT_COMMENT_LIKE_COMMAND, (user_id, comment_id))
-        cursor.execute(LIKE_COMMENT_COMMAND, (comment_id,))
-        # 点赞增加经验值（给评论作者）
-        cursor.execute("SELECT author_id FROM comments WHERE id = %s", (comment_id,))
-        comment = cursor.fetchone()
-        if comment:
-            cursor.execute(ADD_USER_EXP_COMMAND, (1, comment["author_id"]))
-        result = {"is_liked": True}
+        cursor.execute(GET_COMMENT_LIKES_COMMAND, (comment_id,))
+        row = cursor.fetchone()
+        likes_count = row["likes"] if row else 0
 
-    # 获取更新后的点赞数
-    cursor.execute(GET_COMMENT_LIKES_COMMAND, (comment_id,))
-    likes_count = cursor.fetchone()["likes"]
-    result["likes"] = likes_count
-    result["success"] = True
+    if delta > 0:
+        # 点赞增加经验值（给评论作者）；作者的用户缓存不失效，最多晚 60 秒显示
+        cursor.execute(ADD_COMMENT_AUTHOR_EXP_COMMAND, (1, comment_id))
 
-    return result
+    changed_after_commit()
+    after_commit(lambda: events.comment_likes_changed(comment_id, likes_count))
+    return {"is_liked": delta > 0, "likes": likes_count, "success": True}
 
 
+@retry_on_conflict
 @with_db_connection
 def toggle_post_like(cursor, user_id, post_id):
     """切换帖子点赞状态（点赞或取消点赞）"""
-    # 检查用户是否已点赞该帖子
-    cursor.execute(CHECK_POST_LIKED_COMMAND, (user_id, post_id))
-    is_liked = cursor.fetchone()["liked"] > 0
-
-    if is_liked:
-        # 已点赞，则取消点赞
-        cursor.execute(UNLIKE_POST_COMMAND, (user_id, post_id))
-        result = {"is_liked": False}
+    delta = _toggle_like(cursor, LIKE_POST_IF_ABSENT_COMMAND, UNLIKE_POST_COMMAND, (user_id, post_id))
+    if delta:
+        # 更新计数和热度的同时取回新的点赞数；热门帖子的行锁到这里才加上
+        cursor.execute(UPDATE_POST_LIKE_COUNT_COMMAND, (delta, delta * HOT_LIKE_WEIGHT, post_id))
+        likes_count = cursor.lastrowid
     else:
-        # 未点赞，则点赞
-        cursor.execute(LIKE_POST_COMMAND, (user_id, post_id))
-        # 点赞增加经验值（给帖子作者）
-        cursor.execute("SELECT author_id FROM posts WHERE id = %s", (post_id,))
-        post = cursor.fetchone()
-        if post:
-            cursor.execute(ADD_USER_EXP_COMMAND, (2, post["author_id"]))
-        result = {"is_liked": True}
-
-    # 获取更新后的点赞数
-    cursor.execute(GET_POST_LIKES_COMMAND, (post_id,))
-    likes_count = cursor.fetchone()["likes"]
-    result["likes"] = likes_count
-    result["success"] = True
+        cursor.execute(GET_POST_LIKES_COMMAND, (post_id,))
+        row = cursor.fetchone()
+        likes_count = row["likes"] if row else 0
+
+    if delta > 0:
+        # 点赞增加经验值（给帖子作者）；作者的用户缓存不失效，最多晚 60 秒显示
+        cursor.execute(ADD_POST_AUTHOR_EXP_COMMAND, (2, post_id))
 
-    return result
+    changed_after_commit()
+    after_commit(lambda: events.post_likes_changed(post_id, likes_count))
+    return {"is_liked": delta > 0, "likes": likes_count, "success": True}
 
 
 @with_db_connection
@@ -453,6 +1164,7 @@ def get_post_likes(cursor, post_id):
     return cursor.fetchone()
 
 
+@cached(ttl=300, tags=lambda bar_name: [f"bar:{bar_name}"])
 @with_db_connection
 def get_bar_by_name(cursor, bar_name):
     """根据名称获取贴吧信息"""
@@ -460,90 +1172,99 @@ def get_bar_by_name(cursor, bar_name):
     return cursor.fetchone()
 
 
-@with_db_connection
-def get_post_by_id(cursor, post_id):
-    """根据ID获取帖子信息"""
-    cursor.execute(GET_POST_BY_ID_COMMAND, (post_id,))
-    post = cursor.fetchone()
+@with_read_connection
+def get_post_detail(cursor, post_id, user_id=None, comments_per_page=20):
+    """打开帖子所需的全部数据：帖子、计数、是否已点赞和第一页评论
 
+    在同一个连接上最多执行三条查询（帖子、评论、评论是否已点赞），与评论数无关；
+    之后的评论用 next_comment_cursor 调用 get_comments_in_post_by_cursor 获取。
+    """
+    cursor.execute(GET_POST_DETAIL_COMMAND, (user_id, post_id))
+    post = cursor.fetchone()
     if not post:
         return None
+    post["is_liked"] = bool(post["is_liked"])
+    format_create_time([post])
 
-    # 转换datetime对象为字符串
-    if "create_time" in post and hasattr(post["create_time"], "strftime"):
-        post["create_time"] = post["create_time"].strftime("%Y-%m-%d %H:%M:%S")
-
+    cursor.execute(
+        GET_COMMENTS_IN_POST_BY_CURSOR_COMMAND.format(after=""), (post_id, comments_per_page + 1)
+    )
+    comments, next_cursor = _keyset_page(cursor.fetchall(), comments_per_page)
+    post["comments"] = enrich_comments(cursor, comments, user_id)
+    post["next_comment_cursor"] = next_cursor
     return post
 
 
+@cached(ttl=60, tags=lambda user_id: [f"user:{user_id}"])
 @with_db_connection
 def get_user_by_id(cursor, user_id):
     """根据ID获取用户信息"""
     cursor.execute(GET_USER_BY_ID_COMMAND, (user_id,))
-    return cursor.fetchone()
+    user = cursor.fetchone()
+    if user:
+        user["exp"] = int(user["exp"])
+    return user
 
 
-@with_db_connection
-def get_posts_in_bar(cursor, bar_id, page=1, per_page=20, user_id=None):
+@with_read_connection
+def get_posts_in_bar(
+    cursor, bar_id, page=1, per_page=20, user_id=None, fields=None, compact=False
+):
     """获取贴吧的帖子列表（分页）"""
     offset = (page - 1) * per_page
     cursor.execute(GET_POSTS_IN_BAR_COMMAND, (bar_id, per_page, offset))
     posts = cursor.fetchall()
 
-    # 为每个帖子添加点赞数和当前用户是否已点赞
-    for post in posts:
-        # 转换datetime对象为字符串
-        if "create_time" in post and hasattr(post["create_time"], "strftime"):
-            post["create_time"] = post["create_time"].strftime("%Y-%m-%d %H:%M:%S")
-
-        # 获取点赞数
-        cursor.execute(GET_POST_LIKES_COMMAND, (post["id"],))
-        post["likes"] = cursor.fetchone()["likes"]
-
-        # 如果提供了用户ID，检查用户是否已点赞该帖子
-        if user_id is not None:
-            cursor.execute(CHECK_POST_LIKED_COMMAND, (user_id, post["id"]))
-            post["is_liked"] = cursor.fetchone()["liked"] > 0
-        else:
-            post["is_liked"] = False
+    # 计数来自冗余列，这里只批量查询是否已点赞（一条查询）
+    return enrich_posts(cursor, posts, user_id, fields, compact)
 
-        # 获取评论数
-        cursor.execute(
-            "SELECT COUNT(*) as count FROM comments WHERE post_id = %s", (post["id"],)
-        )
-        post["comments_count"] = cursor.fetchone()["count"]
 
-    return posts
+@with_read_connection
+def get_posts_in_bar_by_cursor(
+    cursor, bar_id, after=None, per_page=20, user_id=None, fields=None, compact=False
+):
+    """按游标获取贴吧的帖子，返回 {posts, next_cursor}"""
+    args = _cursor_args(after)
+    condition = f"AND {POSTS_AFTER_CURSOR_CONDITION}" if args else ""
+    cursor.execute(
+        GET_POSTS_IN_BAR_BY_CURSOR_COMMAND.format(after=condition),
+        (bar_id, *args, per_page + 1),
+    )
+    posts, next_cursor = _keyset_page(cursor.fetchall(), per_page)
 
+    posts = enrich_posts(cursor, posts, user_id, fields, compact)
+    return {"posts": posts, "next_cursor": next_cursor}
 
-@with_db_connection
-def get_comments_in_post(cursor, post_id, page=1, per_page=50, user_id=None):
+
+@with_read_connection
+def get_comments_in_post(cursor, post_id, page=1, per_page=50, user_id=None, compact=False):
     """获取帖子的评论列表（分页）"""
     offset = (page - 1) * per_page
     cursor.execute(GET_COMMENTS_IN_POST_COMMAND, (post_id, per_page, offset))
     comments = cursor.fetchall()
 
-    # 转换datetime对象为字符串
-    for comment in comments:
-        if "create_time" in comment and hasattr(comment["create_time"], "strftime"):
-            comment["create_time"] = comment["create_time"].strftime(
-                "%Y-%m-%d %H:%M:%S"
-            )
-        
-        # 获取点赞数
-        cursor.execute(GET_COMMENT_LIKES_COMMAND, (comment["id"],))
-        comment["likes"] = cursor.fetchone()["likes"]
-        
-        # 如果提供了用户ID，检查用户是否已点赞该评论
-        if user_id is not None:
-            cursor.execute(CHECK_COMMENT_LIKED_COMMAND, (user_id, comment["id"]))
-            comment["liked_by_user"] = cursor.fetchone()["liked"] > 0
-        else:
-            comment["liked_by_user"] = False
+    # 点赞数来自 comments.likes，这里只批量查询是否已点赞（一条查询）
+    return enrich_comments(cursor, comments, user_id, compact)
 
-    return comments
 
+@with_read_connection
+def get_comments_in_post_by_cursor(
+    cursor, post_id, after=None, per_page=50, user_id=None, compact=False
+):
+    """按游标获取帖子的评论（按时间正序），返回 {comments, next_cursor}"""
+    args = _cursor_args(after)
+    condition = f"AND {COMMENTS_AFTER_CURSOR_CONDITION}" if args else ""
+    cursor.execute(
+        GET_COMMENTS_IN_POST_BY_CURSOR_COMMAND.format(after=condition),
+        (post_id, *args, per_page + 1),
+    )
+    comments, next_cursor = _keyset_page(cursor.fetchall(), per_page)
 
+    comments = enrich_comments(cursor, comments, user_id, compact)
+    return {"comments": comments, "next_cursor": next_cursor}
+
+
+@cached(ttl=60)
 @with_db_connection
 def get_hot_bars(cursor, limit=10):
     """获取热门贴吧"""
@@ -558,6 +1279,7 @@ def get_hot_bars(cursor, limit=10):
     return bars
 
 
+@cached(ttl=60, tags=lambda user_id: [f"user_bars:{user_id}"])
 @with_db_connection
 def get_user_bars(cursor, user_id):
     """获取用户关注的贴吧"""
@@ -577,6 +1299,7 @@ def follow_bar(cursor, user_id, bar_id):
     """用户关注贴吧"""
     try:
         cursor.execute(INSERT_USER_BAR_COMMAND, (user_id, bar_id))
+        invalidate_after_commit(f"user_bars:{user_id}")
         return True
     except Exception:
         # 可能已经关注
@@ -587,145 +1310,210 @@ def follow_bar(cursor, user_id, bar_id):
 def unfollow_bar(cursor, user_id, bar_id):
     """用户取消关注贴吧"""
     cursor.execute(DELETE_USER_BAR_COMMAND, (user_id, bar_id))
+    invalidate_after_commit(f"user_bars:{user_id}")
     return cursor.rowcount > 0
 
 
 @with_db_connection
 def get_stats(cursor):
-    """获取社区统计信息"""
-    stats = {}
+    """获取社区统计信息（读取写操作维护的计数，一次主键查询）"""
+    today = date.today()
+    cursor.execute(GET_SITE_STATS_COMMAND, (STATS_TOTAL_BUCKET, today))
+    stats = {
+        "posts": 0,
+        "users": 0,
+        "comments": 0,
+        "today_posts": 0,
+        "today_users": 0,
+        "today_comments": 0,
+    }
+    for row in cursor.fetchall():
+        if row["bucket"] == today:
+            key = f"today_{row['name']}"
+        else:
+            key = row["name"]
+        if key in stats:
+            stats[key] = row["value"]
+    return stats
+
+
+@with_db_connection
+def get_change_marks(cursor):
+    """变更轮询的高水位，返回 {post_id, comment_id, stats}（读主库，包含其他进程的写操作）"""
+    cursor.execute(GET_CHANGE_MARKS_COMMAND)
+    row = cursor.fetchone()
+    cursor.execute(GET_SITE_STATS_COMMAND, (STATS_TOTAL_BUCKET, STATS_TOTAL_BUCKET))
+    stats = {"posts": 0, "users": 0, "comments": 0}
+    for stat in cursor.fetchall():
+        if stat["name"] in stats:
+            stats[stat["name"]] = stat["value"]
+    return {"post_id": row["post_id"] or 0, "comment_id": row["comment_id"] or 0, "stats": stats}
 
-    # 获取帖子总数
-    cursor.execute("SELECT COUNT(*) as count FROM posts")
-    stats["posts"] = cursor.fetchone()["count"]
 
-    # 获取用户总数
-    cursor.execute("SELECT COUNT(*) as count FROM users")
-    stats["users"] = cursor.fetchone()["count"]
+@with_db_connection
+def get_changes_after(cursor, post_id, comment_id, limit=200):
+    """高水位之后的变更，返回 (新帖子 [{id, bar_id}], 有新评论的帖子 {帖子id: 评论数})
 
-    # 获取评论总数
-    cursor.execute("SELECT COUNT(*) as count FROM comments")
-    stats["comments"] = cursor.fetchone()["count"]
+    各取最早的 limit 条。
+    """
+    cursor.execute(GET_POSTS_AFTER_COMMAND, (post_id, limit))
+    posts = cursor.fetchall()
 
-    # 获取今日发帖数
+    cursor.execute(GET_COMMENTED_POSTS_AFTER_COMMAND, (comment_id, limit))
+    post_ids = sorted({row["post_id"] for row in cursor.fetchall()})
+    if not post_ids:
+        return posts, {}
     cursor.execute(
-        "SELECT COUNT(*) as count FROM posts WHERE DATE(create_time) = CURDATE()"
+        GET_POSTS_COMMENT_COUNT_COMMAND.format(ids=_in_placeholders(post_ids)), post_ids
     )
-    stats["today_posts"] = cursor.fetchone()["count"]
+    return posts, {row["id"]: row["comment_count"] for row in cursor.fetchall()}
+
+
+@with_read_connection
+def search_posts(cursor, query, user_id=None, page=1, per_page=20, fields=None, compact=False):
+    """搜索帖子（标题和内容），按相关度和时间排序，附带高亮摘要（不返回正文）
+
+    返回 {posts, total, truncated}：total 为匹配总数，truncated 为 True 时只搜索了最新的部分帖子，
+    total 是下限。
+    """
+    post_ids, total, truncated = search.search(cursor, query, page, per_page)
+    if not post_ids:
+        return {"posts": _list_rows([], compact), "total": total, "truncated": truncated}
 
-    # 获取今日注册用户数
     cursor.execute(
-        "SELECT COUNT(*) as count FROM users WHERE DATE(CURRENT_TIMESTAMP) = CURDATE()"
+        GET_POSTS_BY_IDS_COMMAND.format(ids=_in_placeholders(post_ids)), post_ids
     )
-    stats["today_users"] = cursor.fetchone()["count"]
+    by_id = {post["id"]: post for post in cursor.fetchall()}
+    posts = [by_id[post_id] for post_id in post_ids if post_id in by_id]
 
-    return stats
+    for post in posts:
+        post["snippet"] = search.make_snippet(post.pop("content"), query)
+
+    # 批量添加是否已点赞
+    posts = enrich_posts(cursor, posts, user_id, fields, compact)
+    return {"posts": posts, "total": total, "truncated": truncated}
 
 
 @with_db_connection
-def search_posts(cursor, query, user_id=None):
-    """搜索帖子（标题和内容）"""
-    # 构建搜索查询
-    search_query = f"%{query}%"
-    
-    # 搜索帖子
-    cursor.execute("""
-    SELECT p.id, p.title, p.content, p.bar_id, p.author_id, p.create_time,
-           b.name as bar_name, u.name as author_name
-    FROM posts p
-    JOIN bars b ON p.bar_id = b.id
-    JOIN users u ON p.author_id = u.id
-    WHERE p.title LIKE %s OR p.content LIKE %s
-    ORDER BY p.create_time DESC
-    LIMIT 100
-    """, (search_query, search_query))
-    
-    posts = cursor.fetchall()
-    
-    # 为每个帖子添加点赞数和当前用户是否已点赞
-    for post in posts:
-        # 转换datetime对象为字符串
-        if "create_time" in post and hasattr(post["create_time"], "strftime"):
-            post["create_time"] = post["create_time"].strftime("%Y-%m-%d %H:%M:%S")
-        
-        # 获取点赞数
-        cursor.execute(GET_POST_LIKES_COMMAND, (post["id"],))
-        post["likes"] = cursor.fetchone()["likes"]
-        
-        # 如果提供了用户ID，检查用户是否已点赞该帖子
-        if user_id is not None:
-            cursor.execute(CHECK_POST_LIKED_COMMAND, (user_id, post["id"]))
-            post["is_liked"] = cursor.fetchone()["liked"] > 0
-        else:
-            post["is_liked"] = False
-        
-        # 获取评论数
-        cursor.execute(
-            "SELECT COUNT(*) as count FROM comments WHERE post_id = %s", (post["id"],)
-        )
-        post["comments_count"] = cursor.fetchone()["count"]
-    
-    return posts
+def clear_search_index(cursor):
+    """清空搜索索引"""
+    cursor.execute("DELETE FROM search_index")
+    cursor.execute("DELETE FROM search_terms")
+    cursor.execute("DELETE FROM search_pending")
+
+
+@with_db_connection
+def index_posts_batch(cursor, after_id, batch_size):
+    """为一批帖子建立搜索索引，返回 (本批最大id, 读取行数)"""
+    cursor.execute(GET_POSTS_TEXT_BATCH_COMMAND, (after_id, batch_size))
+    rows = cursor.fetchall()
+    for row in rows:
+        search.index_post(cursor, row["id"], row["title"], row["content"])
+    return (rows[-1]["id"] if rows else after_id), len(rows)
 
 
 @with_db_connection
-def get_latest_posts(cursor, page=1, per_page=20, user_id=None):
+def excerpt_posts_batch(cursor, after_id, batch_size):
+    """为一批帖子生成摘要，返回 (本批最大id, 读取行数)"""
+    cursor.execute(GET_POSTS_TEXT_BATCH_COMMAND, (after_id, batch_size))
+    rows = cursor.fetchall()
+    cursor.executemany(
+        UPDATE_POST_EXCERPT_COMMAND, [(make_excerpt(row["content"]), row["id"]) for row in rows]
+    )
+    return (rows[-1]["id"] if rows else after_id), len(rows)
+
+
+def backfill_excerpts(batch_size=500):
+    """分批为全部帖子生成摘要，返回处理的帖子数"""
+    after_id, done = 0, 0
+    while True:
+        after_id, count = excerpt_posts_batch(after_id, batch_size)  # type: ignore
+        done += count
+        if count < batch_size:
+            return done
+
+
+@with_db_connection
+def fold_search_terms_batch(cursor, batch_size=1000):
+    """把一批新帖子的词项汇总到 search_terms，返回 (帖子数, 词项数)"""
+    return search.fold_pending(cursor, batch_size)
+
+
+def fold_search_terms(batch_size=1000):
+    """分批汇总全部待汇总帖子的文档频率，每批单独提交，返回帖子数"""
+    folded = 0
+    while True:
+        try:
+            count, _ = fold_search_terms_batch(batch_size)  # type: ignore
+        except search.PendingConflict:
+            # 其他进程正在汇总，本轮到此为止
+            return folded
+        folded += count
+        if count < batch_size:
+            return folded
+
+
+def rebuild_search_index(batch_size=200):
+    """清空并分批重建搜索索引，返回索引的帖子数"""
+    clear_search_index()  # type: ignore
+    after_id, indexed = 0, 0
+    while True:
+        after_id, count = index_posts_batch(after_id, batch_size)  # type: ignore
+        indexed += count
+        if count < batch_size:
+            # 重建期间缓存的是不完整索引的结果
+            search.clear_ranked()
+            return indexed
+
+
+@with_read_connection
+def get_latest_posts(cursor, page=1, per_page=20, user_id=None, fields=None, compact=False):
     """获取最新帖子列表（分页）"""
     offset = (page - 1) * per_page
 
-    # 查询最新帖子，并关联贴吧名称和用户名
-    query = """
-    SELECT p.id, p.title, p.content, p.bar_id, p.author_id, p.create_time,
-           b.name as bar_name, u.name as author_name
-    FROM posts p
-    JOIN bars b ON p.bar_id = b.id
-    JOIN users u ON p.author_id = u.id
-    ORDER BY p.create_time DESC
-    LIMIT %s OFFSET %s
-    """
-
-    cursor.execute(query, (per_page, offset))
+    cursor.execute(GET_LATEST_POSTS_COMMAND, (per_page, offset))
     posts = cursor.fetchall()
 
-    # 为每个帖子添加点赞数和当前用户是否已点赞
-    for post in posts:
-        # 转换datetime对象为字符串
-        if "create_time" in post and hasattr(post["create_time"], "strftime"):
-            post["create_time"] = post["create_time"].strftime("%Y-%m-%d %H:%M:%S")
-
-        # 获取点赞数
-        cursor.execute(GET_POST_LIKES_COMMAND, (post["id"],))
-        post["likes"] = cursor.fetchone()["likes"]
-
-        # 如果提供了用户ID，检查用户是否已点赞该帖子
-        if user_id is not None:
-            cursor.execute(CHECK_POST_LIKED_COMMAND, (user_id, post["id"]))
-            post["is_liked"] = cursor.fetchone()["liked"] > 0
-        else:
-            post["is_liked"] = False
+    # 计数来自冗余列，这里只批量查询是否已点赞（一条查询）
+    return enrich_posts(cursor, posts, user_id, fields, compact)
 
-        # 获取评论数
-        cursor.execute(
-            "SELECT COUNT(*) as count FROM comments WHERE post_id = %s", (post["id"],)
-        )
-        post["comments_count"] = cursor.fetchone()["count"]
 
-    return posts
+@with_read_connection
+def get_latest_posts_by_cursor(
+    cursor, after=None, per_page=20, user_id=None, fields=None, compact=False
+):
+    """按游标获取最新帖子，返回 {posts, next_cursor}"""
+    args = _cursor_args(after)
+    where = f"WHERE {POSTS_AFTER_CURSOR_CONDITION}" if args else ""
+    cursor.execute(
+        GET_LATEST_POSTS_BY_CURSOR_COMMAND.format(where=where), (*args, per_page + 1)
+    )
+    posts, next_cursor = _keyset_page(cursor.fetchall(), per_page)
+
+    posts = enrich_posts(cursor, posts, user_id, fields, compact)
+    return {"posts": posts, "next_cursor": next_cursor}
+
+
+@with_db_connection
+def get_hot_posts(cursor, page=1, per_page=20, user_id=None, fields=None, compact=False):
+    """获取热门帖子列表（按热度分页）"""
+    offset = (page - 1) * per_page
+    cursor.execute(GET_HOT_POSTS_COMMAND, (per_page, offset))
+    posts = cursor.fetchall()
+
+    # 批量添加是否已点赞
+    return enrich_posts(cursor, posts, user_id, fields, compact)
 
 
 @with_db_connection
 def reset_all_dbs(cursor):
-    # 不要修改删除顺序，有依赖
-    for table in ("post_likes", "user_bars", "comments", "posts", "bars", "users"):
+    # 按依赖的逆序删除
+    for table, _ in reversed(TABLES):
         cursor.execute(f"DROP TABLE IF EXISTS {table}")
 
-    cursor.execute(CREATE_TABLE_USER_COMMAND)
-    cursor.execute(CREATE_TABLE_BARS_COMMAND)
-    cursor.execute(CREATE_TABLE_POSTS_COMMAND)
-    cursor.execute(CREATE_TABLE_COMMENTS_COMMAND)
-    cursor.execute(CREATE_TABLE_USER_BARS_COMMAND)
-    cursor.execute(CREATE_TABLE_POST_LIKES_COMMAND)
-    cursor.execute(CREATE_TABLE_COMMENT_LIKES_COMMAND)
+    for _, command in TABLES:
+        for statement in engine.schema(command):
+            cursor.execute(statement)
 
     cursor.execute(
         INSERT_USER_COMMAND,
@@ -0,0 +1,139 @@
+"""Api 请求执行层
+
+- 读请求交给有界线程池执行，避免同时打开过多数据库连接
+- 相同的读请求（方法名 + 参数 + 当前用户 + 视图）在执行期间只查询一次，其余调用共享结果
+- 每个请求有截止时间，超时后调用方立即返回错误（已开始的查询仍会在后台完成）
+- 前端切换视图时取消旧视图中尚未开始执行的请求
+"""
+
+import threading
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from functools import wraps
+from os import getenv
+
+
+class DeadlineExceeded(Exception):
+    """请求超过截止时间"""
+
+
+class Dispatcher:
+    def __init__(self, max_workers=4, deadline=15.0):
+        self.deadline = deadline
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="api"
+        )
+        self._lock = threading.Lock()
+        self._inflight = {}  # key -> Future
+        self._view_futures = {}  # view -> set(Future)
+        self.view = None
+
+        self._coalesced = 0
+        self._executed = 0
+        self._cancelled = 0
+        self._timeouts = 0
+
+    def run(self, func, key=None, deadline=None):
+        """在线程池中执行 func 并等待结果；key 相同的并发请求共享一次执行
+
+        请求被取消时返回 None。
+        """
+        with self._lock:
+            view = self.view
+            full_key = None if key is None else (view, key)
+            future = self._inflight.get(full_key) if full_key else None
+            submitted = future is None
+            if submitted:
+                future = self._executor.submit(func)
+                self._executed += 1
+                self._view_futures.setdefault(view, set()).add(future)
+                if full_key:
+                    self._inflight[full_key] = future
+            else:
+                self._coalesced += 1
+        if submitted:
+            # 在锁外注册：已完成的 future 会在当前线程立即调用 _forget，而它需要再次加锁
+            future.add_done_callback(lambda f: self._forget(full_key, view, f))
+
+        try:
+            return future.result(timeout=deadline or self.deadline)
+        except CancelledError:
+            return None
+        except FutureTimeoutError:
+            with self._lock:
+                self._timeouts += 1
+            raise DeadlineExceeded("请求超时")
+
+    def _forget(self, key, view, future):
+        with self._lock:
+            if key and self._inflight.get(key) is future:
+                del self._inflight[key]
+            futures = self._view_futures.get(view)
+            if futures is not None:
+                futures.discard(future)
+                if not futures:
+                    del self._view_futures[view]
+
+    def enter_view(self, view):
+        """切换当前视图，并取消其他视图中尚未开始的请求，返回取消的数量"""
+        with self._lock:
+            self.view = view
+            stale = [
+                future
+                for other, futures in self._view_futures.items()
+                if other != view
+                for future in futures
+            ]
+        cancelled = sum(1 for future in stale if future.cancel())
+        with self._lock:
+            self._cancelled += cancelled
+        return cancelled
+
+    def stats(self):
+        with self._lock:
+            return {
+                "view": self.view,
+                "inflight": len(self._inflight),
+                "executed": self._executed,
+                "coalesced": self._coalesced,
+                "cancelled": self._cancelled,
+                "timeouts": self._timeouts,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def dispatched(coalesce=True, deadline=None):
+    """Api 方法装饰器：通过 self._dispatcher 执行；coalesce 时合并相同的并发请求
+
+    合并的方法都是只读的，可以在 Api.batch 中调用（通过 __wrapped__ 直接执行）。
+    """
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            key = None
+            if coalesce:
+                key = (
+                    method.__name__,
+                    repr(args),
+                    repr(sorted(kwargs.items())),
+                    self.current_user_id,
+                )
+            return self._dispatcher.run(
+                lambda: method(self, *args, **kwargs), key=key, deadline=deadline
+            )
+
+        wrapper.batchable = coalesce
+        return wrapper
+
+    return decorator
+
+
+def create_dispatcher():
+    """按环境变量创建执行器"""
+    return Dispatcher(
+        max_workers=int(getenv("API_WORKERS", "4")),
+        deadline=float(getenv("API_DEADLINE", "15")),
+    )
@@ -0,0 +1,321 @@
+"""存储引擎
+
+db.py 等模块的 SQL 按 MySQL 语法编写（%s 参数、ON DUPLICATE KEY UPDATE、建表时内联 INDEX），
+引擎负责建立连接，并把 SQL 和表结构转换为自己的方言：
+
+- MySQLEngine: 远程 MySQL（pymysql），SQL 原样执行
+- SQLiteEngine: 本地嵌入式 SQLite（WAL 模式），表结构和索引与 MySQL 相同
+
+UPDATE 中的 col = LAST_INSERT_ID(expr) 用于在同一条语句中取回更新后的值（cursor.lastrowid），
+SQLite 上转换为 RETURNING。
+
+由环境变量 DB_ENGINE=mysql|sqlite 选择，见 create_engine()。
+"""
+
+import re
+import sqlite3
+from datetime import date, datetime
+from functools import lru_cache
+from os import getenv
+from pathlib import Path
+
+# 查询表的现有列（MySQL）
+GET_TABLE_COLUMNS_COMMAND = """
+SELECT COLUMN_NAME as name FROM information_schema.columns
+WHERE table_schema = DATABASE() AND table_name = %s
+"""
+
+# 查询表的现有索引（MySQL）
+GET_TABLE_INDEXES_COMMAND = """
+SELECT DISTINCT INDEX_NAME as name FROM information_schema.statistics
+WHERE table_schema = DATABASE() AND table_name = %s
+"""
+
+
+# 死锁、锁等待超时的错误码
+MYSQL_DEADLOCK = 1213
+MYSQL_LOCK_WAIT_TIMEOUT = 1205
+
+
+class MySQLEngine:
+    name = "mysql"
+
+    def __init__(self, host, port, user, password, database):
+        # 只有使用 MySQL 时才需要 pymysql
+        import pymysql
+        from pymysql.cursors import DictCursor
+
+        self._connect = lambda: pymysql.connect(
+            host=host,
+            port=port,
+            user=user,
+            password=password,
+            database=database,
+            charset="utf8mb4",
+            cursorclass=DictCursor,
+        )
+        # 出现这些错误时连接已不可用，不再放回连接池
+        self.disconnect_errors = (pymysql.err.OperationalError, pymysql.err.InterfaceError)
+        self.operational_error = pymysql.err.OperationalError
+
+    def connect(self):
+        return self._connect()
+
+    def ping(self, conn):
+        conn.ping(reconnect=False)
+
+    def is_conflict(self, error):
+        """死锁或锁等待超时：事务已回滚，可以重试"""
+        return isinstance(error, self.operational_error) and error.args[:1] in (
+            (MYSQL_DEADLOCK,),
+            (MYSQL_LOCK_WAIT_TIMEOUT,),
+        )
+
+    def translate(self, statement):
+        return statement
+
+    def schema(self, statement):
+        """建表语句转换为要依次执行的语句列表"""
+        return [statement]
+
+    def column_definition(self, definition):
+        return definition
+
+    def columns(self, cursor, table):
+        cursor.execute(GET_TABLE_COLUMNS_COMMAND, (table,))
+        return {row["name"] for row in cursor.fetchall()}
+
+    def indexes(self, cursor, table):
+        cursor.execute(GET_TABLE_INDEXES_COMMAND, (table,))
+        return {row["name"] for row in cursor.fetchall()}
+
+
+# ========================
+# SQLite
+# ========================
+# 连接参数：WAL 允许读写并发；NORMAL 在 WAL 下只在检查点时同步磁盘；
+# 锁等待 5 秒；约 64MB 页缓存和 256MB 内存映射，临时表放在内存中
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA cache_size = -65536",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA temp_store = MEMORY",
+)
+
+# 时间按 MySQL 的格式存成文本，可以直接比较大小
+sqlite3.register_adapter(datetime, lambda value: value.strftime("%Y-%m-%d %H:%M:%S"))
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_converter("DATETIME", lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_converter("DATE", lambda value: date.fromisoformat(value.decode()))
+
+LAST_INSERT_ID_PATTERN = re.compile(r"(\w+) = LAST_INSERT_ID\(([^()]*)\)")
+# RETURNING 返回的列名
+LAST_INSERT_ID_COLUMN = "last_insert_id"
+# 转换后以 RETURNING ... AS last_insert_id 结尾的语句（EXPLAIN 除外）才返回取值结果
+RETURNING_LAST_INSERT_ID_PATTERN = re.compile(
+    rf"^(?!\s*EXPLAIN\b).*\sRETURNING \w+ AS {LAST_INSERT_ID_COLUMN}$", re.S | re.I
+)
+
+INLINE_INDEX_PATTERN = re.compile(r"^\s*INDEX (\w+) (\([^)]*\)),?[ \t]*(--[^\n]*)?\n", re.M)
+CREATE_TABLE_PATTERN = re.compile(r"CREATE TABLE IF NOT EXISTS (\w+)")
+FOREIGN_KEY_PATTERN = re.compile(r"FOREIGN KEY \((\w+)\)")
+# 主键、唯一键和索引的第一列
+TABLE_KEY_PATTERN = re.compile(r"(?:PRIMARY KEY|UNIQUE|INDEX \w+) \((\w+)")
+COLUMN_KEY_PATTERN = re.compile(r"^\s*(\w+) [^\n]*\b(?:PRIMARY KEY|UNIQUE)\b", re.M)
+
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+@lru_cache(maxsize=None)
+def _sqlite_statement(statement):
+    """MySQL 语句转换为 SQLite 语句"""
+    statement = statement.replace("%s", "?")
+    statement = statement.replace("INSERT IGNORE", "INSERT OR IGNORE")
+    statement = statement.replace("ON DUPLICATE KEY UPDATE", "ON CONFLICT DO UPDATE SET")
+    statement = re.sub(r"VALUES\((\w+)\)", r"excluded.\1", statement)
+    # col = LAST_INSERT_ID(expr) -> col = expr ... RETURNING col
+    match = LAST_INSERT_ID_PATTERN.search(statement)
+    if match:
+        if match[2].strip() == match[1]:
+            # col = LAST_INSERT_ID(col) 只为取值，去掉这个赋值（给主键赋值会让 SQLite 放弃按主键更新）
+            statement = re.sub(rf",\s*{re.escape(match[0])}|{re.escape(match[0])},\s*", "", statement)
+        else:
+            statement = LAST_INSERT_ID_PATTERN.sub(r"\1 = \2", statement)
+        statement = statement.rstrip().rstrip(";")
+        statement += f" RETURNING {match[1]} AS {LAST_INSERT_ID_COLUMN}"
+    return statement
+
+
+def _sqlite_column_definition(definition):
+    definition = re.sub(r"\bINT AUTO_INCREMENT PRIMARY KEY", "INTEGER PRIMARY KEY", definition)
+    definition = re.sub(r"\s+COMMENT\s+'[^']*'", "", definition)
+    definition = definition.replace("COLLATE utf8mb4_bin", "COLLATE BINARY")
+    # SQLite 的 CURRENT_TIMESTAMP 是 UTC，MySQL 是本地时间
+    return definition.replace(
+        "DEFAULT CURRENT_TIMESTAMP", "DEFAULT (datetime('now', 'localtime'))"
+    )
+
+
+class SQLiteCursor:
+    """包装 sqlite3 游标，提供与 pymysql DictCursor 相同的用法"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._last_insert_id = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+    def execute(self, statement, args=None):
+        statement = _sqlite_statement(statement)
+        self._cursor.execute(statement, args or ())
+        self._last_insert_id = None
+        if RETURNING_LAST_INSERT_ID_PATTERN.match(statement):
+            rows = self._cursor.fetchall()
+            if rows:
+                self._last_insert_id = rows[-1][LAST_INSERT_ID_COLUMN]
+        return self._cursor.rowcount
+
+    def executemany(self, statement, args):
+        self._cursor.executemany(_sqlite_statement(statement), args)
+        return self._cursor.rowcount
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def lastrowid(self):
+        if self._last_insert_id is not None:
+            return self._last_insert_id
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self):
+        return SQLiteCursor(self._conn.cursor())
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+
+class SQLiteEngine:
+    name = "sqlite"
+    # 本地文件不会断开连接
+    disconnect_errors = ()
+    operational_error = sqlite3.OperationalError
+
+    def __init__(self, path, foreign_keys=True):
+        self.path = str(path)
+        self.foreign_keys = foreign_keys
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+
+    def connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,  # 连接池中的连接会在不同线程间借用
+        )
+        for pragma in SQLITE_PRAGMAS:
+            conn.execute(pragma)
+        if not self.foreign_keys:
+            conn.execute("PRAGMA foreign_keys = OFF")
+        conn.row_factory = _dict_row
+        return SQLiteConnection(conn)
+
+    def ping(self, conn):
+        pass
+
+    def is_conflict(self, error):
+        """写锁等待超时（busy_timeout），事务已回滚，可以重试"""
+        return isinstance(error, sqlite3.OperationalError) and "locked" in str(error)
+
+    def translate(self, statement):
+        return _sqlite_statement(statement)
+
+    def schema(self, statement):
+        """建表语句转换为 SQLite 语句：内联索引拆成单独的 CREATE INDEX
+
+        InnoDB 为没有索引可用的外键列自动建索引，SQLite 不会：这里补上同样的索引，
+        按外键列查询（如某帖子的点赞、某用户的帖子）和删除被引用的行时不用全表扫描。
+        """
+        table = CREATE_TABLE_PATTERN.search(statement).group(1)
+        indexes = []
+
+        indexed = set(TABLE_KEY_PATTERN.findall(statement)) | set(
+            COLUMN_KEY_PATTERN.findall(statement)
+        )
+        for column in FOREIGN_KEY_PATTERN.findall(statement):
+            if column not in indexed:
+                indexed.add(column)
+                indexes.append(
+                    f"CREATE INDEX IF NOT EXISTS fk_{table}_{column} ON {table} ({column})"
+                )
+
+        def collect(match):
+            indexes.append(f"CREATE INDEX IF NOT EXISTS {match[1]} ON {table} {match[2]}")
+            return ""
+
+        body = INLINE_INDEX_PATTERN.sub(collect, statement)
+        # 拆出索引后，去掉右括号前多余的逗号
+        body = re.sub(r",(\s*(?:--[^\n]*\n\s*)*)\)\s*;", r"\1);", body)
+        return [_sqlite_column_definition(body), *indexes]
+
+    def column_definition(self, definition):
+        return _sqlite_column_definition(definition)
+
+    def columns(self, cursor, table):
+        cursor.execute(f"PRAGMA table_info({table})")
+        return {row["name"] for row in cursor.fetchall()}
+
+    def indexes(self, cursor, table):
+        cursor.execute(f"PRAGMA index_list({table})")
+        return {row["name"] for row in cursor.fetchall()}
+
+
+def create_engine():
+    """按环境变量创建引擎
+
+    DB_ENGINE=mysql（默认）: DB_HOST, DB_PORT, DB_USER, DB_NAME，密码为 pswd
+    DB_ENGINE=sqlite: DB_SQLITE_PATH（默认 userdata/tieba.db）
+    """
+    kind = getenv("DB_ENGINE", "mysql")
+    if kind == "sqlite":
+        default_path = Path(__file__).parent / "userdata" / "tieba.db"
+        return SQLiteEngine(getenv("DB_SQLITE_PATH", str(default_path)))
+    if kind == "mysql":
+        return MySQLEngine(
+            host=getenv("DB_HOST", "mysql2.sqlpub.com"),
+            port=int(getenv("DB_PORT", "3307")),
+            user=getenv("DB_USER", "gpchndb"),
+            password=str(getenv("pswd")),
+            database=getenv("DB_NAME", "gpchndb"),
+        )
+    raise ValueError(f"未知的数据库引擎: {kind}")
@@ -0,0 +1,205 @@
+"""数据变更推送
+
+- db.py 的写操作在事务提交后调用这里的函数登记变更
+- 变更先在内存中合并（计数取最新值，统计取累计增量），
+  第一条变更到达后等待 DEBOUNCE 秒再一次性推送给订阅者
+- 没有订阅者时（如命令行脚本）直接丢弃，不占用内存
+- 其他进程（共用数据库的其他客户端）的写操作由 watch 启动的轮询线程发现：
+  定时读取最大帖子id、最大评论id和统计总数（高水位），有变化时查询新帖子和评论数，
+  合并到同一份推送中；点赞没有高水位，只推送本进程的变更
+
+推送内容：
+    {"new_posts": {贴吧id: [帖子id]}, "posts": {帖子id: {"likes": n, "comments": n}},
+     "comments": {评论id: 点赞数}, "stats": {"posts": 增量, "users": 增量, "comments": 增量},
+     "session": {"user": 用户信息或 null}}
+只包含有变化的部分。
+"""
+
+import threading
+import time
+from collections import defaultdict
+from os import getenv
+
+DEBOUNCE = float(getenv("LIVE_DEBOUNCE", "0.3"))
+# 轮询其他进程写操作的间隔（秒）
+POLL_INTERVAL = float(getenv("LIVE_POLL_INTERVAL", "10"))
+
+_lock = threading.Lock()
+_wakeup = threading.Event()
+_sinks = []
+_thread = None
+# 已推送的统计总数（本进程的变更和轮询发现的变更都计入），轮询时推送与数据库的差值
+_pushed_stats = defaultdict(int)
+# 轮询已推送到的最大帖子id：本进程的新帖子不超过它时说明已被轮询推送
+_polled_post_id = 0
+# 本进程已推送、轮询还没读到的新帖子id
+_local_posts = set()
+
+
+def _empty():
+    return {
+        "new_posts": defaultdict(list),
+        "posts": defaultdict(dict),
+        "comments": {},
+        "stats": defaultdict(int),
+        "session": {},
+    }
+
+
+_pending = _empty()
+
+
+def _record(update):
+    with _lock:
+        if not _sinks:
+            return
+        update(_pending)
+    _wakeup.set()
+
+
+def _add_stat(pending, name, delta):
+    pending["stats"][name] += delta
+    _pushed_stats[name] += delta
+
+
+def post_created(bar_id, post_id):
+    def update(pending):
+        if post_id > _polled_post_id:
+            pending["new_posts"][bar_id].append(post_id)
+            _local_posts.add(post_id)
+        _add_stat(pending, "posts", 1)
+
+    _record(update)
+
+
+def comment_created(post_id, comment_count):
+    def update(pending):
+        pending["posts"][post_id]["comments"] = comment_count
+        _add_stat(pending, "comments", 1)
+
+    _record(update)
+
+
+def post_likes_changed(post_id, likes):
+    def update(pending):
+        pending["posts"][post_id]["likes"] = likes
+
+    _record(update)
+
+
+def comment_likes_changed(comment_id, likes):
+    def update(pending):
+        pending["comments"][comment_id] = likes
+
+    _record(update)
+
+
+def user_registered():
+    def update(pending):
+        _add_stat(pending, "users", 1)
+
+    _record(update)
+
+
+def session_changed(user):
+    """登录状态在后台发生变化（会话失效或旧会话升级完成）"""
+
+    def update(pending):
+        pending["session"]["user"] = user
+
+    _record(update)
+
+
+def _take():
+    """取出并清空已合并的变更，返回只含非空部分的字典"""
+    global _pending
+    with _lock:
+        pending, _pending = _pending, _empty()
+        _wakeup.clear()
+    return {name: dict(part) for name, part in pending.items() if part}
+
+
+def _run():
+    while True:
+        _wakeup.wait()
+        # 等待一小段时间，把连续的变更合并为一次推送
+        time.sleep(DEBOUNCE)
+        update = _take()
+        if not update:
+            continue
+        for sink in list(_sinks):
+            try:
+                sink(update)
+            except Exception as e:
+                print(f"推送变更失败: {e}")
+
+
+def _apply_polled(marks, new_posts, comment_counts):
+    """合并一次轮询的结果（本进程已推送的部分不重复推送）"""
+
+    def update(pending):
+        global _polled_post_id
+        for post in new_posts:
+            if post["id"] > _polled_post_id and post["id"] not in _local_posts:
+                pending["new_posts"][post["bar_id"]].append(post["id"])
+        _polled_post_id = max(_polled_post_id, marks["post_id"])
+        _local_posts.difference_update([p for p in _local_posts if p <= _polled_post_id])
+
+        for post_id, count in comment_counts.items():
+            counts = pending["posts"][post_id]
+            # 评论数只增不减：本进程刚登记的值可能比轮询读到的新
+            counts["comments"] = max(counts.get("comments", 0), count)
+
+        # 本进程的变更在提交后、登记前被轮询读到时会多计一次，下次轮询按差值修正
+        for name, value in marks["stats"].items():
+            if value != _pushed_stats[name]:
+                _add_stat(pending, name, value - _pushed_stats[name])
+        for name in [name for name, delta in pending["stats"].items() if not delta]:
+            del pending["stats"][name]
+
+    _record(update)
+
+
+def watch(read_marks, read_changes, interval=POLL_INTERVAL):
+    """启动轮询线程，发现其他进程的写操作；返回用于停止的 Event
+
+    read_marks() 返回 {post_id, comment_id, stats}，
+    read_changes(post_id, comment_id) 返回 (新帖子 [{id, bar_id}], {帖子id: 评论数})。
+    """
+    global _polled_post_id
+    stop = threading.Event()
+    marks = read_marks()
+    with _lock:
+        _polled_post_id = marks["post_id"]
+        _pushed_stats.clear()
+        _pushed_stats.update(marks["stats"])
+
+    def run():
+        nonlocal marks
+        while not stop.wait(interval):
+            try:
+                current = read_marks()
+                new_posts, comment_counts = [], {}
+                # 高水位没有变化时不查询新帖子和评论；统计总数每次都比较，用于修正重复计数
+                if (current["post_id"], current["comment_id"]) != (
+                    marks["post_id"],
+                    marks["comment_id"],
+                ):
+                    new_posts, comment_counts = read_changes(marks["post_id"], marks["comment_id"])
+                _apply_polled(current, new_posts, comment_counts)
+                marks = current
+            except Exception as e:
+                print(f"轮询变更失败: {e}")
+
+    threading.Thread(target=run, name="events-watch", daemon=True).start()
+    return stop
+
+
+def subscribe(sink):
+    """注册订阅者 sink(update)，并在首次订阅时启动推送线程"""
+    global _thread
+    with _lock:
+        _sinks.append(sink)
+        if _thread is None:
+            _thread = threading.Thread(target=_run, name="events", daemon=True)
+            _thread.start()
@@ -0,0 +1,518 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""批量导入帖子、评论和点赞
+
+用于迁移旧论坛或批量初始化内容。输入为 JSONL 或 CSV（按扩展名区分），逐行读取，
+每 --chunk-size 条记录一个事务，用 executemany 批量写入，内存占用与输入大小无关。
+
+记录格式（create_time 可省略，默认为导入时间）：
+    帖子: id, bar, author, title, content, create_time
+    评论: id, post_id, author, content, create_time, reply_to
+    点赞: user, post_id 或 comment_id
+其中 id、post_id、comment_id 为源数据中的 id，bar、author、user、reply_to 为名称：
+- 用户、贴吧按名称对应到本地 id，不存在时创建（导入的用户使用随机密码，无法登录；
+  新贴吧的吧主为其中第一个帖子的作者）
+- 帖子、评论的源 id 与本地 id 的对应关系保存在 import_ids 表中，评论、点赞据此关联
+- 点赞数、评论数、贴吧帖子数、热度和搜索索引随每批一起更新
+- 经验值按用户汇总到 import_exp 表，全部导入完成后统一发放，最后重建社区统计
+
+各阶段已处理的记录数与数据在同一事务中保存到 import_progress 表，中断后用相同的
+--job 重新运行即从断点继续；导入新的数据请使用新的任务名。
+导入的帖子、评论按本地最大 id 顺延分配 id，导入期间请勿同时发帖、评论。
+
+用法: python importer.py --job NAME [--posts FILE] [--comments FILE] [--likes FILE]
+                         [--chunk-size N] [--status]
+"""
+
+import argparse
+import csv
+import json
+from collections import Counter
+from datetime import datetime
+from itertools import islice
+from os import urandom
+import db
+import ranking
+import reconcile
+import search
+from db import with_db_connection
+
+# 每个事务处理的记录数
+CHUNK_SIZE = 2000
+# 导入阶段（按依赖顺序）
+STAGES = ("posts", "comments", "likes")
+# 与 db.py 中发帖、评论、点赞获得的经验值相同
+POST_EXP = 10
+COMMENT_EXP = 5
+POST_LIKE_EXP = 2
+COMMENT_LIKE_EXP = 1
+
+GET_IMPORT_PROGRESS_COMMAND = """
+SELECT stage, position FROM import_progress WHERE job = %s
+"""
+
+SET_IMPORT_PROGRESS_COMMAND = """
+INSERT INTO import_progress (job, stage, position) VALUES (%s, %s, %s)
+ON DUPLICATE KEY UPDATE position = VALUES(position)
+"""
+
+# 源 id 对应的本地 id（{ids} 为 IN 列表占位符）
+GET_IMPORT_IDS_COMMAND = """
+SELECT source_id, local_id FROM import_ids
+WHERE job = %s AND kind = %s AND source_id IN ({ids})
+"""
+
+INSERT_IMPORT_ID_COMMAND = """
+INSERT INTO import_ids (job, kind, source_id, local_id) VALUES (%s, %s, %s, %s)
+"""
+
+ADD_IMPORT_EXP_COMMAND = """
+INSERT INTO import_exp (job, user_id, exp) VALUES (%s, %s, %s)
+ON DUPLICATE KEY UPDATE exp = exp + VALUES(exp)
+"""
+
+GET_IMPORT_EXP_BATCH_COMMAND = """
+SELECT user_id, exp FROM import_exp WHERE job = %s ORDER BY user_id LIMIT %s
+"""
+
+DELETE_IMPORT_EXP_COMMAND = """
+DELETE FROM import_exp WHERE job = %s AND user_id IN ({ids})
+"""
+
+GET_USER_IDS_BY_NAME_COMMAND = """
+SELECT id, name FROM users WHERE name IN ({ids})
+"""
+
+INSERT_IMPORTED_USER_COMMAND = """
+INSERT IGNORE INTO users (type, name, password, salt, exp) VALUES ('U', %s, %s, %s, 0)
+"""
+
+GET_BAR_IDS_BY_NAME_COMMAND = """
+SELECT id, name FROM bars WHERE name IN ({ids})
+"""
+
+INSERT_IMPORTED_BAR_COMMAND = """
+INSERT IGNORE INTO bars (name, owner_id) VALUES (%s, %s)
+"""
+
+GET_MAX_POST_ID_COMMAND = """
+SELECT COALESCE(MAX(id), 0) as max_id FROM posts
+"""
+
+GET_MAX_COMMENT_ID_COMMAND = """
+SELECT COALESCE(MAX(id), 0) as max_id FROM comments
+"""
+
+INSERT_IMPORTED_POST_COMMAND = """
+INSERT INTO posts (id, bar_id, title, content, excerpt, author_id, create_time, hot_decay, hot_score)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s, 0)
+"""
+
+INSERT_IMPORTED_COMMENT_COMMAND = """
+INSERT INTO comments (id, post_id, content, author_id, reply_to_user, create_time)
+VALUES (%s, %s, %s, %s, %s, %s)
+"""
+
+# 本批用户对本批帖子、评论已有的点赞（{users}、{ids} 为 IN 列表占位符）
+GET_EXISTING_POST_LIKES_COMMAND = """
+SELECT user_id, post_id as target FROM post_likes
+WHERE user_id IN ({users}) AND post_id IN ({ids})
+"""
+
+GET_EXISTING_COMMENT_LIKES_COMMAND = """
+SELECT user_id, comment_id as target FROM comment_likes
+WHERE user_id IN ({users}) AND comment_id IN ({ids})
+"""
+
+GET_POST_AUTHORS_COMMAND = """
+SELECT id, author_id FROM posts WHERE id IN ({ids})
+"""
+
+GET_COMMENT_AUTHORS_COMMAND = """
+SELECT id, author_id FROM comments WHERE id IN ({ids})
+"""
+
+ADD_COMMENT_LIKES_COMMAND = """
+UPDATE comments SET likes = likes + %s WHERE id = %s
+"""
+
+
+# ========================
+# 读取输入
+# ========================
+def read_records(path):
+    """逐条读取 JSONL 或 CSV 记录（空行跳过）"""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if str(path).endswith(".csv"):
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def chunks(records, size):
+    records = iter(records)
+    while chunk := list(islice(records, size)):
+        yield chunk
+
+
+def _placeholders(values):
+    return ", ".join(["%s"] * len(values))
+
+
+def _parse_time(value, default):
+    if not value:
+        return default
+    return datetime.fromisoformat(str(value)).replace(microsecond=0, tzinfo=None)
+
+
+# ========================
+# 外键对应
+# ========================
+def _lookup(cursor, command, key, value, values, *args):
+    """按 IN 列表查询，返回 {row[key]: row[value]}"""
+    values = list(values)
+    if not values:
+        return {}
+    cursor.execute(command.format(ids=_placeholders(values)), (*args, *values))
+    return {row[key]: row[value] for row in cursor.fetchall()}
+
+
+def _import_ids(cursor, job, kind, source_ids):
+    """源 id -> 本地 id"""
+    return _lookup(
+        cursor, GET_IMPORT_IDS_COMMAND, "source_id", "local_id", set(source_ids), job, kind
+    )
+
+
+def _user_ids(cursor, names):
+    """用户名 -> 用户 id，不存在的用户以随机密码创建"""
+    names = {name for name in names if name}
+    if not names:
+        return {}
+    found = _lookup(cursor, GET_USER_IDS_BY_NAME_COMMAND, "name", "id", names)
+    missing = names - found.keys()
+    if missing:
+        rows = []
+        for name in sorted(missing):
+            salt = urandom(16).hex()
+            rows.append((name, db.hash_password(urandom(16).hex(), salt), salt))
+        cursor.executemany(INSERT_IMPORTED_USER_COMMAND, rows)
+        found.update(_lookup(cursor, GET_USER_IDS_BY_NAME_COMMAND, "name", "id", missing))
+    return found
+
+
+def _bar_ids(cursor, owners):
+    """贴吧名 -> 贴吧 id；owners 为 {贴吧名: 吧主 id}，不存在的贴吧创建并由吧主关注"""
+    if not owners:
+        return {}
+    found = _lookup(cursor, GET_BAR_IDS_BY_NAME_COMMAND, "name", "id", owners)
+    missing = owners.keys() - found.keys()
+    if missing:
+        cursor.executemany(
+            INSERT_IMPORTED_BAR_COMMAND, [(name, owners[name]) for name in sorted(missing)]
+        )
+        created = _lookup(cursor, GET_BAR_IDS_BY_NAME_COMMAND, "name", "id", missing)
+        cursor.executemany(
+            db.INSERT_USER_BAR_COMMAND,
+            [(owners[name], bar_id) for name, bar_id in created.items()],
+        )
+        found.update(created)
+    return found
+
+
+def _add_exp(cursor, job, exp):
+    """把本批的经验值按用户累加到 import_exp"""
+    if exp:
+        cursor.executemany(
+            ADD_IMPORT_EXP_COMMAND, [(job, user_id, value) for user_id, value in exp.items()]
+        )
+
+
+def _next_id(cursor, command):
+    cursor.execute(command)
+    return cursor.fetchone()["max_id"] + 1
+
+
+# ========================
+# 各阶段的批处理（每批一个事务，进度随数据一起提交）
+# ========================
+@with_db_connection
+def import_posts_chunk(cursor, job, records, position):
+    """导入一批帖子，返回导入数"""
+    records = [
+        r for r in records if r.get("id") and r.get("bar") and r.get("author") and r.get("title")
+    ]
+    known = _import_ids(cursor, job, "P", (str(r["id"]) for r in records))
+    records = [r for r in records if str(r["id"]) not in known]
+    imported = 0
+    if records:
+        users = _user_ids(cursor, (r["author"] for r in records))
+        owners = {}
+        for r in records:
+            owners.setdefault(r["bar"], users[r["author"]])
+        bars = _bar_ids(cursor, owners)
+
+        now = datetime.now().replace(microsecond=0)
+        post_id = _next_id(cursor, GET_MAX_POST_ID_COMMAND)
+        rows, ids, seen = [], [], set()
+        bar_posts, exp = Counter(), Counter()
+        for r in records:
+            source_id = str(r["id"])
+            if source_id in seen:
+                continue
+            seen.add(source_id)
+            create_time = _parse_time(r.get("create_time"), now)
+            author_id, bar_id = users[r["author"]], bars[r["bar"]]
+            content = r.get("content") or ""
+            rows.append(
+                (
+                    post_id,
+                    bar_id,
+                    r["title"],
+                    content,
+                    db.make_excerpt(content),
+                    author_id,
+                    create_time,
+                    ranking.decay_factor(create_time, now),
+                )
+            )
+            ids.append((job, "P", source_id, post_id))
+            bar_posts[bar_id] += 1
+            exp[author_id] += POST_EXP
+            post_id += 1
+
+        cursor.executemany(INSERT_IMPORTED_POST_COMMAND, rows)
+        cursor.executemany(INSERT_IMPORT_ID_COMMAND, ids)
+        for row in rows:
+            search.index_post(cursor, row[0], row[2], row[3])
+        cursor.executemany(
+            db.ADD_BAR_POST_COUNT_COMMAND, [(count, bar_id) for bar_id, count in bar_posts.items()]
+        )
+        _add_exp(cursor, job, exp)
+        imported = len(rows)
+
+    cursor.execute(SET_IMPORT_PROGRESS_COMMAND, (job, "posts", position))
+    return imported
+
+
+@with_db_connection
+def import_comments_chunk(cursor, job, records, position):
+    """导入一批评论（所属帖子须已导入），返回导入数"""
+    records = [r for r in records if r.get("id") and r.get("post_id") and r.get("author")]
+    known = _import_ids(cursor, job, "C", (str(r["id"]) for r in records))
+    posts = _import_ids(cursor, job, "P", (str(r["post_id"]) for r in records))
+    records = [
+        r for r in records if str(r["id"]) not in known and str(r["post_id"]) in posts
+    ]
+    imported = 0
+    if records:
+        users = _user_ids(
+            cursor, [r["author"] for r in records] + [r.get("reply_to") for r in records]
+        )
+        now = datetime.now().replace(microsecond=0)
+        comment_id = _next_id(cursor, GET_MAX_COMMENT_ID_COMMAND)
+        rows, ids, seen = [], [], set()
+        post_comments, exp = Counter(), Counter()
+        for r in records:
+            source_id = str(r["id"])
+            if source_id in seen:
+                continue
+            seen.add(source_id)
+            post_id, author_id = posts[str(r["post_id"])], users[r["author"]]
+            rows.append(
+                (
+                    comment_id,
+                    post_id,
+                    r.get("content") or "",
+                    author_id,
+                    users.get(r.get("reply_to")),
+                    _parse_time(r.get("create_time"), now),
+                )
+            )
+            ids.append((job, "C", source_id, comment_id))
+            post_comments[post_id] += 1
+            exp[author_id] += COMMENT_EXP
+            comment_id += 1
+
+        cursor.executemany(INSERT_IMPORTED_COMMENT_COMMAND, rows)
+        cursor.executemany(INSERT_IMPORT_ID_COMMAND, ids)
+        cursor.executemany(
+            db.ADD_POST_COMMENT_COUNT_COMMAND,
+            [
+                (count, count * db.HOT_COMMENT_WEIGHT, post_id)
+                for post_id, count in post_comments.items()
+            ],
+        )
+        _add_exp(cursor, job, exp)
+        imported = len(rows)
+
+    cursor.execute(SET_IMPORT_PROGRESS_COMMAND, (job, "comments", position))
+    return imported
+
+
+def _import_likes(cursor, job, pairs, kind):
+    """写入一类点赞 [(用户 id, 本地目标 id)]（已去重），更新计数并记录经验值，返回写入数"""
+    if not pairs:
+        return 0
+    if kind == "P":
+        existing_command, insert_command = GET_EXISTING_POST_LIKES_COMMAND, db.LIKE_POST_COMMAND
+        authors_command, exp_value = GET_POST_AUTHORS_COMMAND, POST_LIKE_EXP
+    else:
+        existing_command = GET_EXISTING_COMMENT_LIKES_COMMAND
+        insert_command = db.INSERT_COMMENT_LIKE_COMMAND
+        authors_command, exp_value = GET_COMMENT_AUTHORS_COMMAND, COMMENT_LIKE_EXP
+
+    user_ids = sorted({user_id for user_id, _ in pairs})
+    target_ids = sorted({target for _, target in pairs})
+    cursor.execute(
+        existing_command.format(users=_placeholders(user_ids), ids=_placeholders(target_ids)),
+        (*user_ids, *target_ids),
+    )
+    existing = {(row["user_id"], row["target"]) for row in cursor.fetchall()}
+    pairs = [pair for pair in pairs if pair not in existing]
+    if not pairs:
+        return 0
+    cursor.executemany(insert_command, pairs)
+
+    likes = Counter(target for _, target in pairs)
+    if kind == "P":
+        cursor.executemany(
+            db.ADD_POST_LIKE_COUNT_COMMAND,
+            [(count, count * db.HOT_LIKE_WEIGHT, post_id) for post_id, count in likes.items()],
+        )
+    else:
+        cursor.executemany(
+            ADD_COMMENT_LIKES_COMMAND, [(count, comment_id) for comment_id, count in likes.items()]
+        )
+
+    authors = _lookup(cursor, authors_command, "id", "author_id", likes)
+    exp = Counter()
+    for target, count in likes.items():
+        if target in authors:
+            exp[authors[target]] += count * exp_value
+    _add_exp(cursor, job, exp)
+    return len(pairs)
+
+
+@with_db_connection
+def import_likes_chunk(cursor, job, records, position):
+    """导入一批点赞（所属帖子、评论须已导入，已存在的点赞跳过），返回导入数"""
+    records = [r for r in records if r.get("user") and (r.get("post_id") or r.get("comment_id"))]
+    posts = _import_ids(cursor, job, "P", (str(r["post_id"]) for r in records if r.get("post_id")))
+    comments = _import_ids(
+        cursor, job, "C", (str(r["comment_id"]) for r in records if r.get("comment_id"))
+    )
+    targets = []  # (用户名, 类型, 本地 id)
+    for r in records:
+        if r.get("post_id") and str(r["post_id"]) in posts:
+            targets.append((r["user"], "P", posts[str(r["post_id"])]))
+        elif r.get("comment_id") and str(r["comment_id"]) in comments:
+            targets.append((r["user"], "C", comments[str(r["comment_id"])]))
+    users = _user_ids(cursor, (name for name, _, _ in targets))
+    # dict 去重并保持顺序
+    post_likes, comment_likes = {}, {}
+    for name, kind, target in targets:
+        (post_likes if kind == "P" else comment_likes)[(users[name], target)] = True
+
+    imported = _import_likes(cursor, job, list(post_likes), "P")
+    imported += _import_likes(cursor, job, list(comment_likes), "C")
+
+    cursor.execute(SET_IMPORT_PROGRESS_COMMAND, (job, "likes", position))
+    return imported
+
+
+CHUNK_IMPORTERS = {
+    "posts": import_posts_chunk,
+    "comments": import_comments_chunk,
+    "likes": import_likes_chunk,
+}
+
+
+@with_db_connection
+def get_progress(cursor, job):
+    """各阶段已处理的记录数"""
+    cursor.execute(GET_IMPORT_PROGRESS_COMMAND, (job,))
+    return {row["stage"]: row["position"] for row in cursor.fetchall()}
+
+
+@with_db_connection
+def apply_exp_batch(cursor, job, batch_size):
+    """发放一批用户的待发放经验值，返回发放的用户数"""
+    cursor.execute(GET_IMPORT_EXP_BATCH_COMMAND, (job, batch_size))
+    rows = cursor.fetchall()
+    if rows:
+        cursor.executemany(db.ADD_USER_EXP_COMMAND, [(r["exp"], r["user_id"]) for r in rows])
+        user_ids = [r["user_id"] for r in rows]
+        cursor.execute(
+            DELETE_IMPORT_EXP_COMMAND.format(ids=_placeholders(user_ids)), (job, *user_ids)
+        )
+    return len(rows)
+
+
+# ========================
+# 导入流程
+# ========================
+def import_stage(job, stage, path, chunk_size=CHUNK_SIZE):
+    """导入一个阶段的文件，从上次的进度继续，返回 {imported, skipped, resumed_from}"""
+    done = get_progress(job).get(stage, 0)  # type: ignore
+    records = islice(read_records(path), done, None)
+    position, imported = done, 0
+    for chunk in chunks(records, chunk_size):
+        position += len(chunk)
+        imported += CHUNK_IMPORTERS[stage](job, chunk, position)  # type: ignore
+        print(f"  {stage}: 已处理 {position} 条，导入 {imported} 条")
+    return {"imported": imported, "skipped": position - done - imported, "resumed_from": done}
+
+
+def finish(job, batch_size=1000):
+    """发放汇总的经验值并重建社区统计，返回发放经验值的用户数"""
+    users = 0
+    while True:
+        count = apply_exp_batch(job, batch_size)  # type: ignore
+        users += count
+        if count < batch_size:
+            break
+    reconcile.rebuild_site_stats()  # type: ignore
+    return users
+
+
+def import_all(job, files, chunk_size=CHUNK_SIZE):
+    """按 posts、comments、likes 的顺序导入 files 中给出的文件，然后发放经验值"""
+    report = {}
+    for stage in STAGES:
+        if files.get(stage):
+            report[stage] = import_stage(job, stage, files[stage], chunk_size)
+    report["exp_users"] = finish(job)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量导入帖子、评论和点赞")
+    parser.add_argument("--job", required=True, help="导入任务名，中断后用相同的名称继续")
+    parser.add_argument("--posts", help="帖子文件（.jsonl 或 .csv）")
+    parser.add_argument("--comments", help="评论文件")
+    parser.add_argument("--likes", help="点赞文件")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--status", action="store_true", help="只查看导入进度")
+    args = parser.parse_args()
+
+    if args.status:
+        progress = get_progress(args.job)  # type: ignore
+        for stage in STAGES:
+            print(f"{stage}: 已处理 {progress.get(stage, 0)} 条")
+        return
+
+    files = {"posts": args.posts, "comments": args.comments, "likes": args.likes}
+    report = import_all(args.job, files, args.chunk_size)
+    for stage in STAGES:
+        if stage in report:
+            r = report[stage]
+            resumed = f"（从第 {r['resumed_from']} 条继续）" if r["resumed_from"] else ""
+            print(f"{stage}: 导入 {r['imported']} 条，跳过 {r['skipped']} 条{resumed}")
+    print(f"已向 {report['exp_users']} 个用户发放经验值")
+
+
+if __name__ == "__main__":
+    main()
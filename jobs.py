@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""后台定时任务
+
+热度衰减、经验值流水汇总、搜索词项的文档频率汇总会改写共享数据库中的大量行，
+只需要一个进程执行：
+- 连接远程 MySQL 时单独运行 python jobs.py（如部署在服务器上），桌面客户端不执行
+- 本地 SQLite 只有一个客户端，应用启动时在进程内执行
+设置 DB_JOBS=1 可以让应用在连接 MySQL 时也在进程内执行（只应有一个客户端这样设置）。
+
+用法: python jobs.py
+"""
+
+import threading
+from os import getenv
+import db
+
+# 搜索词项文档频率的汇总间隔（秒）
+SEARCH_TERMS_INTERVAL = float(getenv("SEARCH_TERMS_INTERVAL", "60"))
+
+
+def in_app():
+    """应用是否应在自己的进程内执行定时任务"""
+    return db.engine.name == "sqlite" or getenv("DB_JOBS") == "1"
+
+
+def start_periodic(name, interval, func):
+    """启动后台线程，每隔 interval 秒执行一次 func；返回用于停止的 Event"""
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval):
+            try:
+                func()
+            except Exception as e:
+                print(f"定时任务 {name} 失败: {e}")
+
+    threading.Thread(target=run, name=name, daemon=True).start()
+    return stop
+
+
+def start():
+    """启动全部定时任务，返回用于停止的 Event 列表"""
+    import ledger
+    import ranking
+
+    return [
+        # 每小时对帖子热度做时间衰减
+        ranking.start_decay_scheduler(),
+        # 定时把经验值流水汇总到用户表
+        ledger.start_aggregator(),
+        # 定时把新帖子的词项汇总到 search_terms
+        start_periodic("search-terms", SEARCH_TERMS_INTERVAL, db.fold_search_terms),
+    ]
+
+
+if __name__ == "__main__":
+    start()
+    print("定时任务已启动，Ctrl+C 退出")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
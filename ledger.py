@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""经验值流水汇总
+
+发帖、评论、点赞时只向 exp_ledger 追加一条流水，不更新作者的 users 行，
+热门作者不会成为所有点赞都要等待的热点锁。定时任务（jobs.py）每隔 EXP_FOLD_INTERVAL 秒
+把流水按用户汇总后分批加到 users.exp 并删除；查询用户时经验值为 users.exp 加上
+还未汇总的流水，汇总前后显示的数值不变。
+
+多个进程同时汇总时（如定时任务运行时手动执行本脚本），先删除流水再加经验值：
+删除的行数不足说明这批已被其他进程汇总，整批回滚，不会重复发放。
+
+用法: python ledger.py  （立即汇总全部流水）
+"""
+
+import threading
+from collections import Counter
+from os import getenv
+import db
+from db import with_db_connection
+
+# 汇总间隔（秒）
+FOLD_INTERVAL = float(getenv("EXP_FOLD_INTERVAL", "10"))
+# 每个事务汇总的流水条数
+BATCH_SIZE = 1000
+
+# 最早的一批流水
+GET_EXP_LEDGER_BATCH_COMMAND = """
+SELECT id, user_id, exp FROM exp_ledger ORDER BY id LIMIT %s
+"""
+
+# 删除已汇总的流水（{ids} 为 IN 列表占位符）
+DELETE_EXP_LEDGER_COMMAND = """
+DELETE FROM exp_ledger WHERE id IN ({ids})
+"""
+
+
+class LedgerConflict(Exception):
+    """这批流水已被其他进程汇总"""
+
+
+def _placeholders(values):
+    return ", ".join(["%s"] * len(values))
+
+
+@with_db_connection
+def fold_batch(cursor, batch_size=BATCH_SIZE):
+    """把最早的一批流水加到 users.exp 并删除，返回 (流水条数, 用户数)"""
+    cursor.execute(GET_EXP_LEDGER_BATCH_COMMAND, (batch_size,))
+    rows = cursor.fetchall()
+    if not rows:
+        return 0, 0
+
+    ids = [row["id"] for row in rows]
+    if cursor.execute(DELETE_EXP_LEDGER_COMMAND.format(ids=_placeholders(ids)), ids) != len(ids):
+        raise LedgerConflict("经验值流水已被汇总")
+
+    exp = Counter()
+    for row in rows:
+        exp[row["user_id"]] += row["exp"]
+    # 按用户 id 顺序加锁，避免与其他汇总事务死锁
+    cursor.executemany(
+        db.ADD_USER_EXP_COMMAND, [(exp[user_id], user_id) for user_id in sorted(exp) if exp[user_id]]
+    )
+    return len(rows), len(exp)
+
+
+def fold_all(batch_size=BATCH_SIZE):
+    """分批汇总全部流水，每批单独提交，返回汇总的流水条数"""
+    folded = 0
+    while True:
+        try:
+            count, _ = fold_batch(batch_size)  # type: ignore
+        except LedgerConflict:
+            # 其他进程正在汇总，本轮到此为止
+            return folded
+        folded += count
+        if count < batch_size:
+            return folded
+
+
+def start_aggregator(interval=FOLD_INTERVAL):
+    """启动后台线程，每隔约 interval 秒汇总一次流水；返回用于停止的 Event"""
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval):
+            try:
+                fold_all()
+            except Exception as e:
+                print(f"汇总经验值流水失败: {e}")
+
+    threading.Thread(target=run, name="exp-ledger", daemon=True).start()
+    return stop
+
+
+if __name__ == "__main__":
+    print(f"已汇总 {fold_all()} 条经验值流水")
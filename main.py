@@ -1,22 +1,34 @@
 #!/usr/bin/env python3
 # coding=utf-8
 
+import startup
 import webview
 from pathlib import Path
-import db
+import events
+from dispatch import create_dispatcher, dispatched
 import json
 import os
+import threading
+
+# 数据库模块（及 pymysql 等依赖）在首次使用时才导入，不阻塞窗口显示
+db = startup.lazy_import("db")
+startup.mark("import")
 
 
 ROOT_DIR = Path(__file__).parent
 STATIC_DIR = ROOT_DIR / "static"
 USER_DATA_DIR = ROOT_DIR / "userdata"
+# 打开帖子时随详情一起返回的评论数
+POST_DETAIL_COMMENTS = 20
 
 
 class Api:
     def __init__(self):
         # 简单的内存会话，仅用于桌面应用示例
         self.current_user_id = None
+        self._session_token = None
+        # 读请求的执行器（线程池 + 相同请求合并）
+        self._dispatcher = create_dispatcher()
         self.session_file = str(USER_DATA_DIR / "session.json")  # 转换为字符串
         # 确保用户数据目录存在
         os.makedirs(USER_DATA_DIR, exist_ok=True)
@@ -24,44 +36,83 @@ class Api:
         self._load_session()
 
     def _load_session(self):
-        """从文件加载会话信息并尝试自动登录"""
+        """从文件恢复会话：直接使用缓存的用户信息，后台再向服务器校验令牌"""
         try:
             if os.path.exists(self.session_file):  # 使用os.path.exists替代Path.exists
                 with open(self.session_file, "r", encoding="utf-8") as f:
                     session_data = json.load(f)
-                    username = session_data.get("username")
-                    password = session_data.get("password")
-
-                    if username and password:
-                        # 尝试自动登录
-                        user_id = db.login_user(username, password)  # type: ignore
-                        if user_id:
-                            self.current_user_id = user_id
-                            return {
-                                "success": True,
-                                "auto_login": True,
-                                "user_id": user_id,
-                            }
-                        else:
-                            # 密码错误，清除会话
-                            os.remove(self.session_file)
-                            return {
-                                "success": False,
-                                "error": "保存的密码已失效，请重新登录",
-                            }
+                token = session_data.get("token")
+                user = session_data.get("user")
+                if token and user:
+                    self._session_token = token
+                    self.current_user_id = user["id"]
+                    threading.Thread(target=self._revalidate_session, daemon=True).start()
+                elif session_data.get("username") and session_data.get("password"):
+                    # 旧版会话文件保存的是密码，后台换成令牌
+                    threading.Thread(
+                        target=self._upgrade_legacy_session,
+                        args=(session_data["username"], session_data["password"]),
+                        daemon=True,
+                    ).start()
         except Exception as e:
             print(f"加载会话失败: {e}")
             self.current_user_id = None
-        return {"success": False, "error": "未找到有效的登录信息"}
 
-    def _save_session(self, username, password):
-        """保存用户名和密码到文件"""
+    def _revalidate_session(self):
+        """向服务器校验令牌；失效时退出登录，网络错误时保留本地会话"""
+        token = self._session_token
+        try:
+            user = db.validate_session(token)  # type: ignore
+        except Exception as e:
+            print(f"校验会话失败: {e}")
+            return
+        if token != self._session_token:
+            # 校验期间已重新登录或退出
+            return
+        if user:
+            self._save_session(token, user)
+        else:
+            self._clear_session()
+            events.session_changed(None)
+
+    def _upgrade_legacy_session(self, username, password):
+        try:
+            user_id = db.login_user(username, password)  # type: ignore
+            if not user_id:
+                self._clear_session()
+                return
+            user = self._start_session(user_id)
+            events.session_changed(user)
+        except Exception as e:
+            print(f"升级会话失败: {e}")
+
+    def _start_session(self, user_id):
+        """创建服务器会话并保存令牌，返回用户信息"""
+        session = db.create_session(user_id)  # type: ignore
+        user = db.get_user_by_id(user_id)  # type: ignore
+        self._session_token = session["token"]
+        self.current_user_id = user_id
+        self._save_session(session["token"], user)
+        return user
+
+    def _save_session(self, token, user):
+        """保存令牌和用户信息到文件（不保存密码）"""
         try:
             with open(self.session_file, "w", encoding="utf-8") as f:
-                json.dump({"username": username, "password": password}, f)
+                json.dump({"token": token, "user": user}, f)
         except Exception as e:
             print(f"保存会话失败: {e}")
 
+    def _clear_session(self):
+        self.current_user_id = None
+        self._session_token = None
+        # 清除保存的会话
+        try:
+            if os.path.exists(self.session_file):  # 使用os.path.exists替代Path.exists
+                os.remove(self.session_file)  # 使用os.remove替代Path.unlink
+        except Exception as e:
+            print(f"清除会话失败: {e}")
+
     def _ensure_logged_in(self):
         if not self.current_user_id:
             raise RuntimeError("not_logged_in")
@@ -70,9 +121,8 @@ class Api:
         """用户登录，成功后返回 {success: True, user_id: id} 或 {success: False, error: msg}"""
         user_id = db.login_user(username, password)  # type: ignore
         if user_id:
-            self.current_user_id = user_id
-            # 保存用户名和密码以便自动登录
-            self._save_session(username, password)
+            # 保存会话令牌以便自动登录
+            self._start_session(user_id)
             return {"success": True, "user_id": user_id}
         else:
             return {"success": False, "error": "用户名或密码错误"}
@@ -83,15 +133,16 @@ class Api:
         return {"success": True, "user_id": user_id}
 
     def logout(self):
-        self.current_user_id = None
-        # 清除保存的会话
-        try:
-            if os.path.exists(self.session_file):  # 使用os.path.exists替代Path.exists
-                os.remove(self.session_file)  # 使用os.remove替代Path.unlink
-        except Exception as e:
-            print(f"清除会话失败: {e}")
+        token = self._session_token
+        self._clear_session()
+        if token:
+            try:
+                db.delete_session(token)  # type: ignore
+            except Exception as e:
+                print(f"注销会话失败: {e}")
         return {"success": True}
 
+    @dispatched()
     def getCurrentUser(self):
         """获取当前用户信息或 null"""
         if not self.current_user_id:
@@ -99,9 +150,22 @@ class Api:
         user = db.get_user_by_id(self.current_user_id)  # type: ignore
         return user
 
+    def enterView(self, view):
+        """前端切换视图时调用，取消旧视图中尚未执行的读请求"""
+        return {"cancelled": self._dispatcher.enter_view(view)}
+
+    def markStartup(self, phase):
+        """前端报告启动阶段（first_api, first_paint），首次渲染后保存启动耗时"""
+        startup.mark(phase)
+        if phase == "first_paint":
+            startup.save_report()
+        return True
+
     def getAutoLoginStatus(self):
-        """获取自动登录状态"""
-        return self._load_session()
+        """获取自动登录状态（使用本地会话，不访问数据库）"""
+        if self.current_user_id:
+            return {"success": True, "auto_login": True, "user_id": self.current_user_id}
+        return {"success": False, "error": "未找到有效的登录信息"}
 
     def createBar(self, name):
         """创建贴吧（需要登录）"""
@@ -109,6 +173,7 @@ class Api:
         bar_id = db.create_bar(name, self.current_user_id)  # type: ignore
         return {"success": True, "bar_id": bar_id}
 
+    @dispatched()
     def getBarByName(self, name):
         return db.get_bar_by_name(name)  # type: ignore
 
@@ -117,29 +182,12 @@ class Api:
         post_id = db.create_post(bar_id, title, content, self.current_user_id)  # type: ignore
         return {"success": True, "post_id": post_id}
 
+    @dispatched()
     def getPostById(self, post_id):
-        post = db.get_post_by_id(post_id)  # type: ignore
-        if not post:
-            return None
-
-        # 获取点赞数
-        try:
-            post["likes"] = db.get_post_likes(post_id)["likes"]  # type: ignore
-        except:
-            post["likes"] = 0
-
-        # 如果用户已登录，检查是否已点赞该帖子
-        if self.current_user_id:
-            try:
-                post["is_liked"] = db.check_post_liked(self.current_user_id, post_id)  # type: ignore
-            except:
-                post["is_liked"] = False
-        else:
-            post["is_liked"] = False
-
-        comments = db.get_comments_in_post(post_id, page=1, per_page=100, user_id=self.current_user_id)  # type: ignore
-        post["comments"] = comments
-        return post
+        """帖子详情和第一页评论，之后的评论用 next_comment_cursor 调用 getCommentsInPostByCursor"""
+        return db.get_post_detail(  # type: ignore
+            post_id, self.current_user_id, comments_per_page=POST_DETAIL_COMMENTS
+        )
 
     def createComment(self, post_id, content, reply_to=None):
         self._ensure_logged_in()
@@ -157,19 +205,43 @@ class Api:
         result = db.toggle_post_like(self.current_user_id, post_id)  # type: ignore
         return result
 
+    @dispatched()
     def getUserById(self, user_id):
         return db.get_user_by_id(user_id)  # type: ignore
 
-    def getPostsInBar(self, bar_id, page=1, per_page=20):
-        posts = db.get_posts_in_bar(bar_id, page, per_page, self.current_user_id)  # type: ignore
+    @dispatched()
+    def getPostsInBar(self, bar_id, page=1, per_page=20, fields=None, compact=False):
+        posts = db.get_posts_in_bar(  # type: ignore
+            bar_id, page, per_page, self.current_user_id, fields, compact
+        )
         return posts
 
-    def getCommentsInPost(self, post_id, page=1, per_page=50):
-        return db.get_comments_in_post(post_id, page, per_page, user_id=self.current_user_id)
-
+    @dispatched()
+    def getCommentsInPost(self, post_id, page=1, per_page=50, compact=False):
+        """获取帖子的评论（分页）"""
+        return db.get_comments_in_post(  # type: ignore
+            post_id, page, per_page, user_id=self.current_user_id, compact=compact
+        )
+
+    @dispatched()
+    def getPostsInBarByCursor(self, bar_id, cursor=None, per_page=20, fields=None, compact=False):
+        """按游标获取贴吧帖子，返回 {posts, next_cursor}"""
+        return db.get_posts_in_bar_by_cursor(  # type: ignore
+            bar_id, cursor, per_page, self.current_user_id, fields, compact
+        )
+
+    @dispatched()
+    def getCommentsInPostByCursor(self, post_id, cursor=None, per_page=50, compact=False):
+        """按游标获取帖子评论，返回 {comments, next_cursor}"""
+        return db.get_comments_in_post_by_cursor(  # type: ignore
+            post_id, cursor, per_page, self.current_user_id, compact
+        )
+
+    @dispatched()
     def getHotBars(self, limit=10):
         return db.get_hot_bars(limit)
 
+    @dispatched()
     def getFollowedBars(self):
         if not self.current_user_id:
             return []
@@ -187,28 +259,148 @@ class Api:
         result = db.unfollow_bar(self.current_user_id, bar_id)  # type: ignore
         return {"success": result}
 
+    @dispatched()
+    def getHomepageBundle(self, per_page=20, fields=None, compact=False):
+        """首页需要的全部数据，一次调用、一个连接返回"""
+        user_id = self.current_user_id
+        with db.connection_scope():
+            return {
+                "current_user": db.get_user_by_id(user_id) if user_id else None,  # type: ignore
+                "hot_bars": db.get_hot_bars(20),  # type: ignore
+                "followed_bars": db.get_user_bars(user_id) if user_id else [],  # type: ignore
+                "stats": db.get_stats(),  # type: ignore
+                "latest": db.get_latest_posts_by_cursor(  # type: ignore
+                    None, per_page, user_id, fields, compact
+                ),
+            }
+
+    @dispatched(coalesce=False)
+    def batch(self, requests):
+        """批量调用只读接口，共用一个连接
+
+        requests 为 [{method, args}]，按顺序返回 [{result} 或 {error}]；
+        方法和参数都相同的子请求只执行一次。
+        """
+        results = {}
+        responses = []
+        with db.connection_scope():
+            for request in requests or []:
+                name = request.get("method") or ""
+                args = request.get("args") or []
+                key = (name, repr(args))
+                if key not in results:
+                    method = getattr(type(self), name, None)
+                    if name.startswith("_") or not getattr(method, "batchable", False):
+                        results[key] = {"error": f"不支持批量调用: {name}"}
+                    else:
+                        try:
+                            results[key] = {"result": method.__wrapped__(self, *args)}
+                        except Exception as e:
+                            results[key] = {"error": str(e)}
+                responses.append(results[key])
+        return responses
+
+    @dispatched()
     def getStats(self):
         """获取社区统计信息"""
         return db.get_stats()  # type: ignore
 
-    def getLatestPosts(self, page=1, per_page=20):
+    @dispatched()
+    def getLatestPosts(self, page=1, per_page=20, fields=None, compact=False):
         """获取最新帖子（分页）"""
-        return db.get_latest_posts(page, per_page, self.current_user_id)  # type: ignore
-        
-    def searchPosts(self, query):
-        """搜索帖子"""
+        return db.get_latest_posts(  # type: ignore
+            page, per_page, self.current_user_id, fields, compact
+        )
+
+    @dispatched()
+    def getLatestPostsByCursor(self, cursor=None, per_page=20, fields=None, compact=False):
+        """按游标获取最新帖子，返回 {posts, next_cursor}"""
+        return db.get_latest_posts_by_cursor(  # type: ignore
+            cursor, per_page, self.current_user_id, fields, compact
+        )
+
+    @dispatched()
+    def getHotPosts(self, page=1, per_page=20, fields=None, compact=False):
+        """获取热门帖子（按热度分页）"""
+        return db.get_hot_posts(  # type: ignore
+            page, per_page, self.current_user_id, fields, compact
+        )
+
+    @dispatched()
+    def searchPosts(self, query, page=1, per_page=20, fields=None, compact=False):
+        """搜索帖子（分页，按相关度排序）"""
         if not query or not query.strip():
-            return []
-        return db.search_posts(query.strip(), self.current_user_id)  # type: ignore
-
-
+            return {"posts": [], "total": 0, "truncated": False}
+        return db.search_posts(  # type: ignore
+            query.strip(), self.current_user_id, page, per_page, fields, compact
+        )
+
+    def getDiagnostics(self):
+        """数据库调用统计、慢查询、连接池、缓存、请求执行器、本地副本和启动耗时，用于排查性能问题"""
+        return {
+            "queries": db.get_query_stats(),  # type: ignore
+            "pool": db.get_pool_stats(),  # type: ignore
+            "cache": db.get_cache_stats(),  # type: ignore
+            "dispatcher": self._dispatcher.stats(),
+            "replica": db.replica.stats() if db.replica else None,  # type: ignore
+            "startup": startup.marks(),
+        }
+
+
+api = Api()
 main_window = webview.create_window(
     title="Tieba",
     url=f"file://{STATIC_DIR}/index.html",
-    js_api=Api(),
+    js_api=api,
     height=800,
     width=1200,
 )
+startup.mark("window_created")
+main_window.events.shown += lambda: startup.mark("window_shown")
+
+
+def push_live_update(update):
+    """把合并后的数据变更推送到前端"""
+    main_window.evaluate_js(
+        f"window.applyLiveUpdate && window.applyLiveUpdate({json.dumps(update)})"
+    )
+
+
+def warm_up():
+    """后台导入数据库模块并建立第一个连接，然后启动定时任务和本地副本同步"""
+    try:
+        db.load()
+        db.warm_up()
+        startup.mark("db_ready")
+    except Exception as e:
+        print(f"预热数据库连接失败: {e}")
+
+    # 共用数据库的其他客户端的写操作：后台轮询高水位，合并到推送中
+    try:
+        events.watch(db.get_change_marks, db.get_changes_after)  # type: ignore
+    except Exception as e:
+        print(f"启动变更轮询失败: {e}")
+
+    if os.getenv("DB_REPLICA") == "1":
+        import replica
+
+        # 浏览类查询读本地副本，写操作仍写主库
+        replica.enable(USER_DATA_DIR / "replica.db", current_user=lambda: api.current_user_id)
+
+    import jobs
+
+    # 定时任务改写共享数据库中的大量行：连接远程 MySQL 时由单独的 jobs.py 进程执行
+    if jobs.in_app():
+        jobs.start()
+
+    import metrics
+
+    # 设置了 DB_METRICS_DUMP 时定期保存数据库调用统计
+    metrics.start_periodic_dump()
+
 
 if __name__ == "__main__":
+    # 写操作产生的变更推送到前端（其他客户端的变更由后台轮询发现），代替前端轮询
+    events.subscribe(push_live_update)
+    threading.Thread(target=warm_up, name="warmup", daemon=True).start()
     webview.start(http_server=True, debug=True)
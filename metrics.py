@@ -0,0 +1,255 @@
+"""数据库调用统计与慢查询日志
+
+db.with_db_connection 把每次调用的游标包装为 InstrumentedCursor，按函数名累计：
+- 调用次数、出错次数、执行的语句数、返回的行数
+- 借连接（connect）、执行（execute）、取结果（fetch）、提交（commit）各自的耗时
+- 整次调用的延迟直方图
+
+执行时间超过 DB_SLOW_QUERY_MS 毫秒的语句记入慢查询日志：SQL 压缩空白后记录，
+参数只记录个数和类型，不记录值。
+
+设置 DB_METRICS_DUMP=秒数 后，后台定期把统计追加到 userdata/metrics.jsonl。
+"""
+
+import json
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+from os import getenv
+from pathlib import Path
+
+enabled = getenv("DB_METRICS", "1") != "0"
+# 慢查询阈值（毫秒）
+SLOW_QUERY_MS = float(getenv("DB_SLOW_QUERY_MS", "100"))
+# 保留最近的慢查询条数
+SLOW_LOG_SIZE = int(getenv("DB_SLOW_LOG_SIZE", "200"))
+# 延迟直方图的桶上限（毫秒），最后一个桶为无穷大
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, float("inf"))
+
+SLOW_LOG_FILE = Path(__file__).parent / "userdata" / "slow_queries.log"
+DUMP_FILE = Path(__file__).parent / "userdata" / "metrics.jsonl"
+
+_lock = threading.Lock()
+_slow_queries = deque(maxlen=SLOW_LOG_SIZE)
+_started = time.time()
+
+
+def _new_stats():
+    return {
+        "calls": 0,
+        "errors": 0,
+        "queries": 0,
+        "rows": 0,
+        "connect_ms": 0.0,
+        "execute_ms": 0.0,
+        "fetch_ms": 0.0,
+        "commit_ms": 0.0,
+        "total_ms": 0.0,
+        "max_ms": 0.0,
+        "histogram": [0] * len(BUCKETS),
+    }
+
+
+_functions = defaultdict(_new_stats)
+
+
+# IN 列表的占位符（%s 或 ?），长度随页面大小、批次大小变化
+IN_LIST_PATTERN = re.compile(r"\bIN\s*\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)", re.I)
+
+
+def normalize_sql(statement):
+    """压缩空白、把 IN 列表合并为 IN (...)，得到可以聚合的语句文本（参数仍为占位符，不含值）"""
+    statement = re.sub(r"\s+", " ", statement).strip()
+    return IN_LIST_PATTERN.sub("IN (...)", statement)
+
+
+def _describe_args(args):
+    """参数只保留个数和类型"""
+    if args is None:
+        return []
+    if isinstance(args, dict):
+        return {key: type(value).__name__ for key, value in args.items()}
+    if not isinstance(args, (list, tuple)):
+        args = (args,)
+    return [type(value).__name__ for value in args]
+
+
+def _slow_query(function, statement, args, elapsed_ms):
+    entry = {
+        "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "function": function,
+        "ms": round(elapsed_ms, 1),
+        "sql": normalize_sql(statement),
+        "args": _describe_args(args),
+    }
+    with _lock:
+        _slow_queries.append(entry)
+    try:
+        SLOW_LOG_FILE.parent.mkdir(parents=True, exist_ok=True)
+        with open(SLOW_LOG_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    except Exception as e:
+        print(f"写入慢查询日志失败: {e}")
+
+
+class InstrumentedCursor:
+    """包装游标，把执行和取结果的耗时、语句数、行数记到调用它的函数名下"""
+
+    def __init__(self, cursor, function):
+        self._cursor = cursor
+        with _lock:
+            self._stats = _functions[function]
+        self._function = function
+
+    def __enter__(self):
+        self._cursor.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._cursor.__exit__(*exc)
+
+    def _execute(self, method, statement, args):
+        start = time.perf_counter()
+        try:
+            return method(statement, args)
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            with _lock:
+                self._stats["queries"] += 1
+                self._stats["execute_ms"] += elapsed
+            if elapsed >= SLOW_QUERY_MS:
+                _slow_query(self._function, statement, args, elapsed)
+
+    def execute(self, statement, args=None):
+        return self._execute(self._cursor.execute, statement, args)
+
+    def executemany(self, statement, args):
+        return self._execute(self._cursor.executemany, statement, args)
+
+    def _fetch(self, method):
+        start = time.perf_counter()
+        result = method()
+        elapsed = (time.perf_counter() - start) * 1000
+        rows = len(result) if isinstance(result, (list, tuple)) else int(result is not None)
+        with _lock:
+            self._stats["fetch_ms"] += elapsed
+            self._stats["rows"] += rows
+        return result
+
+    def fetchone(self):
+        return self._fetch(self._cursor.fetchone)
+
+    def fetchall(self):
+        return self._fetch(self._cursor.fetchall)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def cursor(cursor, function):
+    """开启统计时返回包装后的游标"""
+    return InstrumentedCursor(cursor, function) if enabled else cursor
+
+
+def record_call(function, elapsed_ms, connect_ms=0.0, commit_ms=0.0, error=False):
+    """记录一次调用的总耗时以及借连接、提交的耗时"""
+    if not enabled:
+        return
+    bucket = next(i for i, limit in enumerate(BUCKETS) if elapsed_ms <= limit)
+    with _lock:
+        stats = _functions[function]
+        stats["calls"] += 1
+        stats["errors"] += error
+        stats["connect_ms"] += connect_ms
+        stats["commit_ms"] += commit_ms
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+        stats["histogram"][bucket] += 1
+
+
+def _summary(stats):
+    calls = stats["calls"] or 1
+    summary = {
+        key: round(value, 3) if isinstance(value, float) else value
+        for key, value in stats.items()
+        if key != "histogram"
+    }
+    summary["mean_ms"] = round(stats["total_ms"] / calls, 3)
+    summary["queries_per_call"] = round(stats["queries"] / calls, 2)
+    summary["rows_per_call"] = round(stats["rows"] / calls, 1)
+    summary["histogram"] = {
+        f"<={limit:g}ms" if limit != float("inf") else "inf": count
+        for limit, count in zip(BUCKETS, stats["histogram"])
+        if count
+    }
+    return summary
+
+
+def _slow_statements(slow):
+    """按语句文本汇总慢查询（按总耗时排序）"""
+    statements = {}
+    for entry in slow:
+        stats = statements.setdefault(
+            entry["sql"], {"sql": entry["sql"], "count": 0, "total_ms": 0.0, "max_ms": 0.0}
+        )
+        stats["count"] += 1
+        stats["total_ms"] = round(stats["total_ms"] + entry["ms"], 1)
+        stats["max_ms"] = max(stats["max_ms"], entry["ms"])
+    return sorted(statements.values(), key=lambda stats: -stats["total_ms"])
+
+
+def snapshot():
+    """各函数的统计（按总耗时排序）、最近的慢查询及其按语句的汇总"""
+    with _lock:
+        functions = {name: _summary(stats) for name, stats in _functions.items()}
+        slow = list(_slow_queries)
+    return {
+        "since": datetime.fromtimestamp(_started).strftime("%Y-%m-%d %H:%M:%S"),
+        "slow_query_ms": SLOW_QUERY_MS,
+        "functions": dict(sorted(functions.items(), key=lambda item: -item[1]["total_ms"])),
+        "slow_queries": slow,
+        "slow_statements": _slow_statements(slow),
+    }
+
+
+def total_queries():
+    """所有函数执行过的语句总数"""
+    with _lock:
+        return sum(stats["queries"] for stats in _functions.values())
+
+
+def reset():
+    global _started
+    with _lock:
+        _functions.clear()
+        _slow_queries.clear()
+        _started = time.time()
+
+
+def dump(path=DUMP_FILE):
+    """把当前统计追加到文件"""
+    record = {"time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), **snapshot()}
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    except Exception as e:
+        print(f"保存数据库统计失败: {e}")
+
+
+def start_periodic_dump(interval=None):
+    """按 DB_METRICS_DUMP 秒（未设置则不开启）在后台定期保存统计"""
+    interval = interval or float(getenv("DB_METRICS_DUMP", "0"))
+    if interval <= 0:
+        return None
+
+    def run():
+        while True:
+            time.sleep(interval)
+            dump()
+
+    thread = threading.Thread(target=run, name="metrics-dump", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,595 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""数据库结构迁移与索引建议
+
+- 迁移按版本号顺序执行，已执行的版本记录在 schema_version 表中
+- 加列、加索引前先检查是否已存在，MySQL 上尽量使用不锁表的在线 DDL
+- 迁移中的建表语句是发布时的表结构，不随 db.py 变化；新建的数据库（还没有任何表）
+  直接按 db.py 中的当前表结构建表并记录所有版本，不逐个执行迁移
+- advise 对 db.py 等模块中的每个 SQL 模板执行 EXPLAIN，标出全表扫描和文件排序
+
+用法: python migrations.py [migrate|status|advise]
+"""
+
+import argparse
+import re
+import db
+import importer
+import ledger
+import ranking
+import reconcile
+import search
+from db import with_db_connection
+
+CREATE_TABLE_SCHEMA_VERSION_COMMAND = """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        applied_time DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+"""
+
+GET_APPLIED_VERSIONS_COMMAND = """
+SELECT version FROM schema_version
+"""
+
+INSERT_SCHEMA_VERSION_COMMAND = """
+INSERT INTO schema_version (version, name) VALUES (%s, %s)
+"""
+
+
+# ========================
+# 迁移步骤
+# ========================
+def sql(statement):
+    """执行一条 SQL（须可重复执行，如 CREATE TABLE IF NOT EXISTS）"""
+
+    def step(cursor):
+        if statement.lstrip().startswith(("CREATE TABLE", "--")):
+            for part in db.engine.schema(statement):
+                cursor.execute(part)
+        else:
+            cursor.execute(statement)
+        return None
+
+    return step
+
+
+def mysql_only(step):
+    """只在 MySQL 上执行的步骤（SQLite 建表时已是最终结构）"""
+
+    def wrapper(cursor):
+        return step(cursor) if db.engine.name == "mysql" else None
+
+    return wrapper
+
+
+def sqlite_only(step):
+    """只在 SQLite 上执行的步骤（MySQL 建表时已自动建立）"""
+
+    def wrapper(cursor):
+        return step(cursor) if db.engine.name == "sqlite" else None
+
+    return wrapper
+
+
+def add_column(table, column, definition):
+    """加列；MySQL 优先使用 INSTANT 算法，不支持时退回默认方式"""
+
+    def step(cursor):
+        if column in db.engine.columns(cursor, table):
+            return None
+        statement = (
+            f"ALTER TABLE {table} ADD COLUMN {column} "
+            f"{db.engine.column_definition(definition)}"
+        )
+        if db.engine.name != "mysql":
+            cursor.execute(statement)
+        else:
+            try:
+                cursor.execute(f"{statement}, ALGORITHM=INSTANT")
+            except db.engine.operational_error:
+                cursor.execute(statement)
+        return f"已添加列 {table}.{column}"
+
+    return step
+
+
+def add_index(table, name, columns):
+    """加索引；MySQL 使用在线 DDL（INPLACE，不阻塞读写）"""
+
+    def step(cursor):
+        if name in db.engine.indexes(cursor, table):
+            return None
+        if db.engine.name != "mysql":
+            cursor.execute(f"CREATE INDEX {name} ON {table} {columns}")
+        else:
+            cursor.execute(
+                f"ALTER TABLE {table} ADD INDEX {name} {columns}, "
+                "ALGORITHM=INPLACE, LOCK=NONE"
+            )
+        return f"已添加索引 {table}.{name}"
+
+    return step
+
+
+def backfill(func, description):
+    """回填数据（func 自行分批提交）"""
+
+    def step(cursor):
+        func()
+        return description
+
+    return step
+
+
+# ========================
+# 已发布迁移的建表语句：按发布时的表结构写成字面量，之后修改 db.py 中的表结构不影响已发布的迁移
+# ========================
+V1_USERS_TABLE = """
+    -- 用户表
+    CREATE TABLE IF NOT EXISTS users (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        type CHAR(1) NOT NULL COMMENT '用户类型（Teacher, Student, Class）',
+        name VARCHAR(255) NOT NULL UNIQUE, -- 用户名唯一
+        password VARCHAR(255) NOT NULL COMMENT '哈希后的密码',
+        salt VARCHAR(255) NOT NULL COMMENT '密码盐值',
+        exp INT NOT NULL DEFAULT 0 COMMENT '经验值'
+    );
+"""
+
+V1_BARS_TABLE = """
+    -- 贴吧表
+    CREATE TABLE IF NOT EXISTS bars (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL UNIQUE, -- 贴吧名称唯一
+        owner_id INT NOT NULL,
+        create_time DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (owner_id) REFERENCES users(id) -- 关联用户
+    );
+"""
+
+V1_POSTS_TABLE = """
+    -- 帖子表
+    CREATE TABLE IF NOT EXISTS posts (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        bar_id INT NOT NULL COMMENT '所属贴吧ID', -- 关键字段
+        title VARCHAR(255) NOT NULL,
+        content TEXT NOT NULL,
+        author_id INT NOT NULL,
+        create_time DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (bar_id) REFERENCES bars(id), -- 关联贴吧
+        FOREIGN KEY (author_id) REFERENCES users(id) -- 关联用户
+    );
+"""
+
+V1_COMMENTS_TABLE = """
+    -- 评论表
+    CREATE TABLE IF NOT EXISTS comments (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        post_id INT NOT NULL COMMENT '所属帖子ID', -- 关键字段
+        content TEXT NOT NULL,
+        author_id INT NOT NULL,
+        create_time DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        likes INT NOT NULL DEFAULT 0,
+        reply_to_user INT COMMENT '回复目标用户ID（可为空）',
+        FOREIGN KEY (post_id) REFERENCES posts(id), -- 关联帖子
+        FOREIGN KEY (author_id) REFERENCES users(id), -- 关联用户
+        FOREIGN KEY (reply_to_user) REFERENCES users(id) -- 关联被回复用户
+    );
+"""
+
+V1_USER_BARS_TABLE = """
+    CREATE TABLE IF NOT EXISTS user_bars (
+        user_id INT NOT NULL,
+        bar_id INT NOT NULL,
+        PRIMARY KEY (user_id, bar_id),
+        FOREIGN KEY (user_id) REFERENCES users(id),
+        FOREIGN KEY (bar_id) REFERENCES bars(id)
+    );
+"""
+
+V1_POST_LIKES_TABLE = """
+    CREATE TABLE IF NOT EXISTS post_likes (
+        user_id INT NOT NULL,
+        post_id INT NOT NULL,
+        PRIMARY KEY (user_id, post_id),
+        FOREIGN KEY (user_id) REFERENCES users(id),
+        FOREIGN KEY (post_id) REFERENCES posts(id)
+    );
+"""
+
+V1_COMMENT_LIKES_TABLE = """
+    CREATE TABLE IF NOT EXISTS comment_likes (
+        user_id INT NOT NULL,
+        comment_id INT NOT NULL,
+        PRIMARY KEY (user_id, comment_id),
+        FOREIGN KEY (user_id) REFERENCES users(id),
+        FOREIGN KEY (comment_id) REFERENCES comments(id)
+    );
+"""
+
+V5_SEARCH_INDEX_TABLE = """
+    CREATE TABLE IF NOT EXISTS search_index (
+        term VARCHAR(32) COLLATE utf8mb4_bin NOT NULL,
+        post_id INT NOT NULL,
+        weight INT NOT NULL COMMENT '词项权重（标题加权）',
+        PRIMARY KEY (term, post_id),
+        INDEX idx_search_post (post_id),
+        FOREIGN KEY (post_id) REFERENCES posts(id)
+    );
+"""
+
+V5_SEARCH_TERMS_TABLE = """
+    CREATE TABLE IF NOT EXISTS search_terms (
+        term VARCHAR(32) COLLATE utf8mb4_bin NOT NULL PRIMARY KEY,
+        df INT NOT NULL DEFAULT 0 COMMENT '包含该词项的帖子数'
+    );
+"""
+
+V6_SITE_STATS_TABLE = """
+    CREATE TABLE IF NOT EXISTS site_stats (
+        bucket DATE NOT NULL COMMENT '统计日期，1970-01-01 表示累计总数',
+        name VARCHAR(32) NOT NULL COMMENT '计数名称（posts, users, comments）',
+        value BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (bucket, name)
+    );
+"""
+
+V7_SESSIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        token_hash CHAR(64) NOT NULL PRIMARY KEY COMMENT '令牌的 SHA256',
+        user_id INT NOT NULL,
+        create_time DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        expire_time DATETIME NOT NULL,
+        INDEX idx_sessions_user (user_id),
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    );
+"""
+
+V8_IMPORT_IDS_TABLE = """
+    CREATE TABLE IF NOT EXISTS import_ids (
+        job VARCHAR(64) NOT NULL COMMENT '导入任务名',
+        kind CHAR(1) NOT NULL COMMENT 'P 帖子, C 评论',
+        source_id VARCHAR(64) NOT NULL COMMENT '源数据中的 id',
+        local_id INT NOT NULL,
+        PRIMARY KEY (job, kind, source_id)
+    );
+"""
+
+V8_IMPORT_PROGRESS_TABLE = """
+    CREATE TABLE IF NOT EXISTS import_progress (
+        job VARCHAR(64) NOT NULL,
+        stage VARCHAR(16) NOT NULL COMMENT 'posts, comments, likes',
+        position BIGINT NOT NULL DEFAULT 0 COMMENT '已处理的记录数',
+        PRIMARY KEY (job, stage)
+    );
+"""
+
+V8_IMPORT_EXP_TABLE = """
+    CREATE TABLE IF NOT EXISTS import_exp (
+        job VARCHAR(64) NOT NULL,
+        user_id INT NOT NULL,
+        exp BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (job, user_id)
+    );
+"""
+
+V9_EXP_LEDGER_TABLE = """
+    CREATE TABLE IF NOT EXISTS exp_ledger (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        user_id INT NOT NULL,
+        exp INT NOT NULL,
+        create_time DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        INDEX idx_exp_ledger_user (user_id)
+    );
+"""
+
+V12_SEARCH_PENDING_TABLE = """
+    CREATE TABLE IF NOT EXISTS search_pending (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        post_id INT NOT NULL
+    );
+"""
+
+
+# ========================
+# 迁移列表（只能追加，不要修改已发布的版本）
+# ========================
+MIGRATIONS = [
+    (
+        1,
+        "基础表结构",
+        [
+            sql(V1_USERS_TABLE),
+            sql(V1_BARS_TABLE),
+            sql(V1_POSTS_TABLE),
+            sql(V1_COMMENTS_TABLE),
+            sql(V1_USER_BARS_TABLE),
+            sql(V1_POST_LIKES_TABLE),
+            sql(V1_COMMENT_LIKES_TABLE),
+        ],
+    ),
+    (
+        2,
+        "帖子与贴吧冗余计数",
+        [
+            add_column("bars", "post_count", "INT NOT NULL DEFAULT 0 COMMENT '帖子数（冗余计数）'"),
+            add_column("posts", "like_count", "INT NOT NULL DEFAULT 0 COMMENT '点赞数（冗余计数）'"),
+            add_column("posts", "comment_count", "INT NOT NULL DEFAULT 0 COMMENT '评论数（冗余计数）'"),
+            backfill(reconcile.reconcile_all, "已回填冗余计数"),
+        ],
+    ),
+    (
+        3,
+        "帖子热度",
+        [
+            add_column("posts", "hot_decay", "DOUBLE NOT NULL DEFAULT 1 COMMENT '热度时间衰减因子'"),
+            add_column("posts", "hot_score", "DOUBLE NOT NULL DEFAULT 0 COMMENT '热度'"),
+            add_index("posts", "idx_posts_hot", "(hot_score, id)"),
+            backfill(ranking.decay_all, "已回填帖子热度"),
+        ],
+    ),
+    (
+        4,
+        "性能索引",
+        [
+            add_index("bars", "idx_bars_post_count", "(post_count)"),
+            add_index("posts", "idx_posts_time", "(create_time, id)"),
+            add_index("posts", "idx_posts_bar_time", "(bar_id, create_time, id)"),
+            add_index("comments", "idx_comments_post_time", "(post_id, create_time, id)"),
+        ],
+    ),
+    (
+        5,
+        "全文搜索索引",
+        [
+            sql(V5_SEARCH_INDEX_TABLE),
+            sql(V5_SEARCH_TERMS_TABLE),
+            backfill(db.rebuild_search_index, "已重建搜索索引"),
+        ],
+    ),
+    (
+        6,
+        "社区统计计数",
+        [
+            # 旧用户的注册时间未知，保持为空；新用户默认当前时间
+            add_column("users", "create_time", "DATETIME NULL COMMENT '注册时间（旧用户为空）'"),
+            mysql_only(
+                sql(
+                    "ALTER TABLE users MODIFY COLUMN create_time DATETIME NULL "
+                    "DEFAULT CURRENT_TIMESTAMP COMMENT '注册时间（旧用户为空）'"
+                )
+            ),
+            sql(V6_SITE_STATS_TABLE),
+            backfill(reconcile.rebuild_site_stats, "已回填社区统计"),
+        ],
+    ),
+    (
+        7,
+        "登录会话",
+        [sql(V7_SESSIONS_TABLE)],
+    ),
+    (
+        8,
+        "批量导入",
+        [
+            sql(V8_IMPORT_IDS_TABLE),
+            sql(V8_IMPORT_PROGRESS_TABLE),
+            sql(V8_IMPORT_EXP_TABLE),
+        ],
+    ),
+    (
+        9,
+        "经验值流水",
+        [sql(V9_EXP_LEDGER_TABLE)],
+    ),
+    (
+        10,
+        "帖子摘要",
+        [
+            add_column(
+                "posts",
+                "excerpt",
+                "VARCHAR(255) NOT NULL DEFAULT '' COMMENT '正文摘要（发帖时生成，列表只返回摘要）'",
+            ),
+            backfill(db.backfill_excerpts, "已回填帖子摘要"),
+        ],
+    ),
+    (
+        11,
+        "外键索引",
+        [
+            # InnoDB 为外键列自动建索引，之前建立的 SQLite 库缺少这些索引
+            sqlite_only(add_index("bars", "fk_bars_owner_id", "(owner_id)")),
+            sqlite_only(add_index("posts", "fk_posts_author_id", "(author_id)")),
+            sqlite_only(add_index("comments", "fk_comments_author_id", "(author_id)")),
+            sqlite_only(add_index("comments", "fk_comments_reply_to_user", "(reply_to_user)")),
+            sqlite_only(add_index("user_bars", "fk_user_bars_bar_id", "(bar_id)")),
+            sqlite_only(add_index("post_likes", "fk_post_likes_post_id", "(post_id)")),
+            sqlite_only(add_index("comment_likes", "fk_comment_likes_comment_id", "(comment_id)")),
+        ],
+    ),
+    (
+        12,
+        "搜索词项文档频率延迟汇总",
+        [sql(V12_SEARCH_PENDING_TABLE)],
+    ),
+]
+
+
+@with_db_connection
+def get_applied_versions(cursor):
+    """获取已执行的迁移版本"""
+    cursor.execute(CREATE_TABLE_SCHEMA_VERSION_COMMAND)
+    cursor.execute(GET_APPLIED_VERSIONS_COMMAND)
+    return {row["version"] for row in cursor.fetchall()}
+
+
+@with_db_connection
+def apply_migration(cursor, version, name, steps):
+    """执行一个迁移并记录版本，返回各步骤的说明"""
+    messages = []
+    for step in steps:
+        message = step(cursor)
+        if message:
+            messages.append(message)
+    cursor.execute(INSERT_SCHEMA_VERSION_COMMAND, (version, name))
+    return messages
+
+
+@with_db_connection
+def create_current_schema(cursor):
+    """数据库中还没有表时按当前表结构建表并记录所有版本，返回是否新建"""
+    if db.engine.columns(cursor, "users"):
+        return False
+    for _, command in db.TABLES:
+        for statement in db.engine.schema(command):
+            cursor.execute(statement)
+    cursor.executemany(
+        INSERT_SCHEMA_VERSION_COMMAND, [(version, name) for version, name, _ in MIGRATIONS]
+    )
+    return True
+
+
+def migrate():
+    """按顺序执行所有未执行的迁移，返回 [(版本, 名称, 步骤说明)]"""
+    applied = get_applied_versions()  # type: ignore
+    if not applied and create_current_schema():  # type: ignore
+        # 当前表结构已包含所有迁移
+        return [(version, name, []) for version, name, _ in MIGRATIONS]
+    done = []
+    for version, name, steps in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version in applied:
+            continue
+        messages = apply_migration(version, name, steps)  # type: ignore
+        done.append((version, name, messages))
+    return done
+
+
+# ========================
+# 索引建议
+# ========================
+# 示例参数：LIMIT/OFFSET 用数字，时间比较用日期，其余用字符串 '1'
+SAMPLE_DATETIME = "'2000-01-01 00:00:00'"
+
+
+def collect_templates(modules=(db, reconcile, ranking, search, importer, ledger)):
+    """收集模块中所有 *_COMMAND 查询模板（SELECT/UPDATE/DELETE）"""
+    templates = {}
+    for module in modules:
+        for name in dir(module):
+            value = getattr(module, name)
+            if not name.endswith("_COMMAND") or not isinstance(value, str):
+                continue
+            body = re.sub(r"--[^\n]*", "", value).strip()
+            if body.split(None, 1)[0].upper() in ("SELECT", "UPDATE", "DELETE"):
+                templates[f"{module.__name__}.{name}"] = body
+    return templates
+
+
+def fill_template(template):
+    """把模板中的占位符替换为示例值，得到可以 EXPLAIN 的 SQL"""
+    statement = template.format(
+        ids="%s, %s",
+        terms="%s, %s",
+        users="%s, %s",
+        table="posts",
+        where=f"WHERE {db.POSTS_AFTER_CURSOR_CONDITION}",
+        after=f"AND {db.POSTS_AFTER_CURSOR_CONDITION}"
+        if "FROM posts" in template
+        else f"AND {db.COMMENTS_AFTER_CURSOR_CONDITION}",
+    )
+    statement = re.sub(r"(LIMIT|OFFSET)\s+%s", r"\1 20", statement)
+    statement = re.sub(r"(create_time\s*[<>=]+\s*)%s", rf"\g<1>{SAMPLE_DATETIME}", statement)
+    return statement.replace("%s", "'1'")
+
+
+@with_db_connection
+def explain(cursor, statement):
+    if db.engine.name == "sqlite":
+        cursor.execute("EXPLAIN QUERY PLAN " + statement)
+        return [_sqlite_plan_row(row["detail"]) for row in cursor.fetchall()]
+    cursor.execute("EXPLAIN " + statement)
+    return cursor.fetchall()
+
+
+def _sqlite_plan_row(detail):
+    """把 SQLite 查询计划的一行转换为 MySQL EXPLAIN 的字段"""
+    match = re.match(r"(SCAN|SEARCH) (\w+)(?: USING (?:COVERING )?INDEX (\w+))?", detail)
+    row = {"table": None, "type": None, "key": None, "rows": None, "Extra": ""}
+    if match:
+        scan, table, key = match.groups()
+        full_scan = scan == "SCAN" and not key and "PRIMARY KEY" not in detail
+        row.update(table=table, key=key, type="ALL" if full_scan else "ref")
+    if "USE TEMP B-TREE FOR ORDER BY" in detail:
+        row["Extra"] = "Using filesort"
+    elif "USE TEMP B-TREE" in detail:
+        row["Extra"] = "Using temporary"
+    return row
+
+
+def advise():
+    """对所有查询模板执行 EXPLAIN，返回存在全表扫描或文件排序的问题列表"""
+    findings = []
+    for name, template in sorted(collect_templates().items()):
+        try:
+            plan = explain(fill_template(template))  # type: ignore
+        except Exception as e:
+            findings.append({"template": name, "issues": [f"EXPLAIN 失败: {e}"]})
+            continue
+        for row in plan:
+            issues = []
+            extra = row.get("Extra") or ""
+            if row.get("type") == "ALL":
+                issues.append("全表扫描")
+            if "Using filesort" in extra:
+                issues.append("文件排序")
+            if "Using temporary" in extra:
+                issues.append("临时表")
+            if issues:
+                findings.append(
+                    {
+                        "template": name,
+                        "table": row.get("table"),
+                        "type": row.get("type"),
+                        "key": row.get("key"),
+                        "rows": row.get("rows"),
+                        "issues": issues,
+                    }
+                )
+    return findings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数据库迁移与索引建议")
+    parser.add_argument(
+        "command", nargs="?", default="migrate", choices=("migrate", "status", "advise")
+    )
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        done = migrate()
+        for version, name, messages in done:
+            print(f"[{version}] {name}")
+            for message in messages:
+                print(f"    {message}")
+        if not done:
+            print("数据库结构已是最新")
+    elif args.command == "status":
+        applied = get_applied_versions()  # type: ignore
+        for version, name, _ in MIGRATIONS:
+            print(f"[{'x' if version in applied else ' '}] {version} {name}")
+    else:
+        findings = advise()
+        for finding in findings:
+            detail = ", ".join(finding["issues"])
+            table = finding.get("table")
+            where = f" 表 {table}，预计扫描 {finding.get('rows')} 行" if table else ""
+            print(f"{finding['template']}: {detail}{where}")
+        if not findings:
+            print("未发现全表扫描或文件排序")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """在限定时间内没有借到连接"""
+
+
+class ConnectionPool:
+    """线程安全的有界连接池
+
+    - max_size: 同时存在的连接上限（空闲 + 借出）
+    - max_idle: 空闲超过该秒数的连接直接丢弃，避免被服务端断开后再使用
+    - ping_after: 空闲超过该秒数的连接在借出前先 ping 一次（0 表示每次都 ping）
+    - borrow_timeout: 连接池耗尽时最长等待秒数
+    """
+
+    def __init__(
+        self,
+        factory,
+        max_size=8,
+        max_idle=300,
+        ping_after=30,
+        borrow_timeout=10,
+        ping=None,
+    ):
+        self._factory = factory
+        self._ping = ping or (lambda conn: conn.ping(reconnect=False))
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.ping_after = ping_after
+        self.borrow_timeout = borrow_timeout
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (conn, 归还时间)
+        self._size = 0  # 当前存在的连接数
+
+        # 统计信息
+        self._borrows = 0
+        self._created = 0
+        self._discarded = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._recent_waits = deque(maxlen=1024)
+
+    def acquire(self):
+        """借出一个可用连接"""
+        start = time.perf_counter()
+        deadline = start + self.borrow_timeout
+        while True:
+            conn, idle_since, create = self._take(deadline)
+            if create:
+                try:
+                    conn = self._factory()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._created += 1
+                break
+
+            idle_for = time.monotonic() - idle_since
+            if idle_for > self.max_idle:
+                self._discard(conn)
+                continue
+            if idle_for >= self.ping_after:
+                try:
+                    self._ping(conn)
+                except Exception:
+                    self._discard(conn)
+                    continue
+            break
+
+        self._record_wait(time.perf_counter() - start)
+        return conn
+
+    def _take(self, deadline):
+        """取出空闲连接，或占用一个新建名额；返回 (conn, 空闲起始时间, 是否需要新建)"""
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, idle_since = self._idle.pop()
+                    return conn, idle_since, False
+                if self._size < self.max_size:
+                    self._size += 1
+                    return None, 0, True
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout("数据库连接池已耗尽")
+                self._cond.wait(remaining)
+
+    def release(self, conn, discard=False):
+        """归还连接；discard 为 True 时关闭连接而不放回"""
+        if discard:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._discarded += 1
+            self._cond.notify()
+
+    def _record_wait(self, waited):
+        with self._cond:
+            self._borrows += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+            self._recent_waits.append(waited)
+
+    def close_all(self):
+        """关闭所有空闲连接（借出中的连接归还后仍会进入池中）"""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self):
+        """返回连接池统计信息，等待时间单位为毫秒"""
+        with self._cond:
+            waits = sorted(self._recent_waits)
+            borrows = self._borrows
+
+            def percentile(p):
+                if not waits:
+                    return 0.0
+                return waits[min(len(waits) - 1, int(len(waits) * p))] * 1000
+
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "max_size": self.max_size,
+                "borrows": borrows,
+                "created": self._created,
+                "discarded": self._discarded,
+                "timeouts": self._timeouts,
+                "wait_avg_ms": (self._wait_total / borrows * 1000) if borrows else 0.0,
+                "wait_max_ms": self._wait_max * 1000,
+                "wait_p50_ms": percentile(0.50),
+                "wait_p95_ms": percentile(0.95),
+            }
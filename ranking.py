@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""帖子热度排名
+
+热度 = (点赞数 * 1.5 + 评论数) * 时间衰减因子
+- 点赞、评论时由 db.py 按当前 hot_decay 增量更新 hot_score
+- 衰减因子只随发帖天数变化，由定时任务分批重新计算
+
+用法: python ranking.py  （立即重新计算全部帖子的热度）
+"""
+
+import math
+import threading
+from datetime import datetime
+import db
+from db import with_db_connection
+
+# 按 id 分批读取帖子的热度相关字段
+GET_POST_HOTNESS_BATCH_COMMAND = """
+SELECT id, create_time, like_count, comment_count, hot_decay, hot_score
+FROM posts
+WHERE id > %s
+ORDER BY id
+LIMIT %s
+"""
+
+# 热度在语句中按当前计数计算，读取之后提交的点赞、评论不会被覆盖
+SET_POST_HOTNESS_COMMAND = """
+UPDATE posts SET hot_decay = %s, hot_score = (like_count * %s + comment_count * %s) * %s
+WHERE id = %s
+"""
+
+
+def decay_factor(create_time, now=None):
+    """时间衰减因子：24小时内为1，之后按天数对数衰减"""
+    now = now or datetime.now()
+    hours = max(1, int((now - create_time).total_seconds() // 3600))
+    if hours <= 24:
+        return 1.0
+    return 1 / math.log(hours // 24 + 2)
+
+
+def hotness(likes, comments, decay):
+    return (likes * db.HOT_LIKE_WEIGHT + comments * db.HOT_COMMENT_WEIGHT) * decay
+
+
+@with_db_connection
+def decay_batch(cursor, after_id, batch_size, now=None):
+    """重新计算一批帖子的衰减因子和热度，返回 (本批最大id, 读取行数, 更新行数)"""
+    cursor.execute(GET_POST_HOTNESS_BATCH_COMMAND, (after_id, batch_size))
+    rows = cursor.fetchall()
+    updates = []
+    for row in rows:
+        decay = decay_factor(row["create_time"], now)
+        score = hotness(row["like_count"], row["comment_count"], decay)
+        if (
+            abs(decay - row["hot_decay"]) > 1e-9
+            or abs(score - row["hot_score"]) > 1e-6
+        ):
+            updates.append(
+                (decay, db.HOT_LIKE_WEIGHT, db.HOT_COMMENT_WEIGHT, decay, row["id"])
+            )
+    if updates:
+        cursor.executemany(SET_POST_HOTNESS_COMMAND, updates)
+    return (rows[-1]["id"] if rows else after_id), len(rows), len(updates)
+
+
+def decay_all(batch_size=1000):
+    """分批更新所有帖子的热度，每批单独提交，返回更新的行数"""
+    now = datetime.now()
+    after_id, updated = 0, 0
+    while True:
+        after_id, count, changed = decay_batch(after_id, batch_size, now)  # type: ignore
+        updated += changed
+        if count < batch_size:
+            return updated
+
+
+def start_decay_scheduler(interval=3600):
+    """启动后台线程，每隔 interval 秒执行一次热度衰减；返回用于停止的 Event"""
+    stop = threading.Event()
+
+    def run():
+        while True:
+            try:
+                decay_all()
+            except Exception as e:
+                print(f"热度衰减失败: {e}")
+            if stop.wait(interval):
+                return
+
+    threading.Thread(target=run, name="hot-decay", daemon=True).start()
+    return stop
+
+
+if __name__ == "__main__":
+    print(f"已更新 {decay_all()} 个帖子的热度")
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""冗余计数校对：找出并修复 like_count / comment_count / post_count / comments.likes 的偏差，
+并按实际行数重写社区统计计数（site_stats）
+
+修复时在 UPDATE / INSERT 语句中重新计数，不写回之前读到的值：
+读取和修复之间提交的点赞、评论、发帖不会被覆盖。
+
+用法: python reconcile.py [--batch-size N]
+"""
+
+import argparse
+from datetime import date, datetime, timedelta
+import db
+from db import retry_on_conflict, with_db_connection
+
+# 按 id 分批读取帖子的计数与实际值
+GET_POST_COUNTERS_BATCH_COMMAND = """
+SELECT p.id, p.like_count, p.comment_count,
+       (SELECT COUNT(*) FROM post_likes pl WHERE pl.post_id = p.id) as actual_likes,
+       (SELECT COUNT(*) FROM comments c WHERE c.post_id = p.id) as actual_comments
+FROM posts p
+WHERE p.id > %s
+ORDER BY p.id
+LIMIT %s
+"""
+
+# 按 id 分批读取评论的点赞计数与实际值
+GET_COMMENT_COUNTERS_BATCH_COMMAND = """
+SELECT c.id, c.likes,
+       (SELECT COUNT(*) FROM comment_likes cl WHERE cl.comment_id = c.id) as actual_likes
+FROM comments c
+WHERE c.id > %s
+ORDER BY c.id
+LIMIT %s
+"""
+
+# 按 id 分批读取贴吧的帖子计数与实际值
+GET_BAR_COUNTERS_BATCH_COMMAND = """
+SELECT b.id, b.post_count,
+       (SELECT COUNT(*) FROM posts p WHERE p.bar_id = b.id) as actual_posts
+FROM bars b
+WHERE b.id > %s
+ORDER BY b.id
+LIMIT %s
+"""
+
+# 按实际行数修复计数
+SET_POST_COUNTERS_COMMAND = """
+UPDATE posts
+SET like_count = (SELECT COUNT(*) FROM post_likes pl WHERE pl.post_id = posts.id),
+    comment_count = (SELECT COUNT(*) FROM comments c WHERE c.post_id = posts.id)
+WHERE id = %s
+"""
+
+SET_COMMENT_LIKES_COMMAND = """
+UPDATE comments
+SET likes = (SELECT COUNT(*) FROM comment_likes cl WHERE cl.comment_id = comments.id)
+WHERE id = %s
+"""
+
+SET_BAR_POST_COUNT_COMMAND = """
+UPDATE bars SET post_count = (SELECT COUNT(*) FROM posts p WHERE p.bar_id = bars.id)
+WHERE id = %s
+"""
+
+# 按表的实际行数重写累计总数
+SET_TOTAL_SITE_STAT_COMMAND = """
+INSERT INTO site_stats (bucket, name, value)
+SELECT %s, %s, COUNT(*) FROM {table} WHERE 1 = 1
+ON DUPLICATE KEY UPDATE value = VALUES(value)
+"""
+
+# 按指定时间段内新增的行数重写当天的计数
+SET_DAY_SITE_STAT_COMMAND = """
+INSERT INTO site_stats (bucket, name, value)
+SELECT %s, %s, COUNT(*) FROM {table} WHERE create_time >= %s AND create_time < %s
+ON DUPLICATE KEY UPDATE value = VALUES(value)
+"""
+
+
+@retry_on_conflict
+@with_db_connection
+def reconcile_posts_batch(cursor, after_id, batch_size):
+    """校对一批帖子，返回 (本批最大id, 读取行数, 修复行数)"""
+    cursor.execute(GET_POST_COUNTERS_BATCH_COMMAND, (after_id, batch_size))
+    rows = cursor.fetchall()
+    fixes = [
+        (row["id"],)
+        for row in rows
+        if row["like_count"] != row["actual_likes"]
+        or row["comment_count"] != row["actual_comments"]
+    ]
+    if fixes:
+        cursor.executemany(SET_POST_COUNTERS_COMMAND, fixes)
+    return (rows[-1]["id"] if rows else after_id), len(rows), len(fixes)
+
+
+@retry_on_conflict
+@with_db_connection
+def reconcile_comments_batch(cursor, after_id, batch_size):
+    """校对一批评论，返回 (本批最大id, 读取行数, 修复行数)"""
+    cursor.execute(GET_COMMENT_COUNTERS_BATCH_COMMAND, (after_id, batch_size))
+    rows = cursor.fetchall()
+    fixes = [(row["id"],) for row in rows if row["likes"] != row["actual_likes"]]
+    if fixes:
+        cursor.executemany(SET_COMMENT_LIKES_COMMAND, fixes)
+    return (rows[-1]["id"] if rows else after_id), len(rows), len(fixes)
+
+
+@retry_on_conflict
+@with_db_connection
+def reconcile_bars_batch(cursor, after_id, batch_size):
+    """校对一批贴吧，返回 (本批最大id, 读取行数, 修复行数)"""
+    cursor.execute(GET_BAR_COUNTERS_BATCH_COMMAND, (after_id, batch_size))
+    rows = cursor.fetchall()
+    fixes = [(row["id"],) for row in rows if row["post_count"] != row["actual_posts"]]
+    if fixes:
+        cursor.executemany(SET_BAR_POST_COUNT_COMMAND, fixes)
+    return (rows[-1]["id"] if rows else after_id), len(rows), len(fixes)
+
+
+@retry_on_conflict
+@with_db_connection
+def rebuild_site_stats(cursor, today=None):
+    """按实际行数重写累计和今日的统计计数，返回 {名称: (总数, 今日)}"""
+    today = today or date.today()
+    start = datetime.combine(today, datetime.min.time())
+    end = start + timedelta(days=1)
+    names = ("posts", "users", "comments")
+    for name in names:
+        cursor.execute(
+            SET_TOTAL_SITE_STAT_COMMAND.format(table=name), (db.STATS_TOTAL_BUCKET, name)
+        )
+        cursor.execute(SET_DAY_SITE_STAT_COMMAND.format(table=name), (today, name, start, end))
+
+    cursor.execute(db.GET_SITE_STATS_COMMAND, (db.STATS_TOTAL_BUCKET, today))
+    values = {(row["bucket"], row["name"]): row["value"] for row in cursor.fetchall()}
+    return {
+        name: (values.get((db.STATS_TOTAL_BUCKET, name), 0), values.get((today, name), 0))
+        for name in names
+    }
+
+
+def reconcile_all(batch_size=500):
+    """分批校对所有冗余计数，每批单独提交，返回各表 {checked, fixed}"""
+    report = {}
+    for name, run_batch in (
+        ("posts", reconcile_posts_batch),
+        ("comments", reconcile_comments_batch),
+        ("bars", reconcile_bars_batch),
+    ):
+        after_id, checked, fixed = 0, 0, 0
+        while True:
+            after_id, count, repaired = run_batch(after_id, batch_size)  # type: ignore
+            checked += count
+            fixed += repaired
+            if count < batch_size:
+                break
+        report[name] = {"checked": checked, "fixed": fixed}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="校对并修复冗余计数")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    for name, result in reconcile_all(args.batch_size).items():
+        print(f"{name}: 检查 {result['checked']} 行，修复 {result['fixed']} 行")
+
+    for name, (total, today) in rebuild_site_stats().items():  # type: ignore
+        print(f"统计 {name}: 总数 {total}，今日 {today}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+"""本地只读副本
+
+把主库的 users、bars、posts、comments 增量同步到 USER_DATA_DIR 下的 SQLite 文件，
+db.py 中以 @with_read_connection 标注的读操作（最新帖子、贴吧帖子、帖子详情、评论、搜索）
+在副本可用时直接读本地文件，写操作仍然写主库。
+
+- 新行：按各表本地最大 id（高水位）分批拉取 id 更大的行；高水位以下 RESCAN_WINDOW 范围内
+  副本缺少的行（拉取时事务还未提交）在之后的同步中补上
+- 计数：点赞数、评论数、热度等会变化的列，每次同步刷新最近 REFRESH_WINDOW 条帖子和评论，
+  贴吧的帖子数全部刷新
+- 点赞：只同步当前用户的点赞记录（用于显示“已点赞”），每次整体替换
+- 搜索：新帖子写入副本时在本地建立倒排索引，不同步主库的索引表
+- 读自己的写入：本进程提交写操作后，在副本同步完这次写入之前，读操作改读主库；
+  切换登录用户后，在同步完新用户的点赞记录之前也读主库
+
+通过环境变量 DB_REPLICA=1 开启，见 main.py。
+"""
+
+import threading
+import time
+from os import getenv
+
+import db
+import search
+from engines import SQLiteEngine
+from pool import ConnectionPool
+
+# 每批拉取的行数
+BATCH_SIZE = int(getenv("DB_REPLICA_BATCH", "1000"))
+# 每次刷新计数的最近帖子、评论数
+REFRESH_WINDOW = int(getenv("DB_REPLICA_REFRESH", "2000"))
+# 每次同步在高水位以下重新核对的 id 范围：自增 id 较小的事务可能晚于 id 较大的事务提交，
+# 拉取时还看不到，之后在这个范围内补上
+RESCAN_WINDOW = int(getenv("DB_REPLICA_RESCAN", "1000"))
+# 没有写操作时的同步间隔（秒）
+SYNC_INTERVAL = float(getenv("DB_REPLICA_INTERVAL", "30"))
+
+# 副本中的表（不含关注、统计、会话等只从主库读取的表）
+REPLICA_TABLES = (
+    "users",
+    "bars",
+    "posts",
+    "comments",
+    "post_likes",
+    "comment_likes",
+    "search_index",
+    "search_terms",
+)
+
+# 按依赖顺序同步的表及列；users 不同步密码和盐值
+SYNC_COLUMNS = {
+    "users": ("id", "type", "name", "exp", "create_time"),
+    "bars": ("id", "name", "owner_id", "create_time", "post_count"),
+    "posts": (
+        "id",
+        "bar_id",
+        "title",
+        "content",
+        "excerpt",
+        "author_id",
+        "create_time",
+        "like_count",
+        "comment_count",
+        "hot_decay",
+        "hot_score",
+    ),
+    "comments": ("id", "post_id", "content", "author_id", "create_time", "likes", "reply_to_user"),
+}
+
+# 副本中不同步、但不能为空的列
+PLACEHOLDER_VALUES = {"users": {"password": "''", "salt": "''"}}
+
+# 从主库拉取 id 大于高水位的新行
+GET_NEW_ROWS_COMMAND = """
+SELECT {columns} FROM {table} WHERE id > %s ORDER BY id LIMIT %s
+"""
+
+# 高水位以下一段范围内的 id（主库、副本各查一次，找出副本缺少的行）
+GET_IDS_IN_RANGE_COMMAND = """
+SELECT id FROM {table} WHERE id > %s AND id <= %s
+"""
+
+# 按 id 拉取行
+GET_ROWS_BY_IDS_COMMAND = """
+SELECT {columns} FROM {table} WHERE id IN ({ids})
+"""
+
+# 写入副本
+REPLACE_ROWS_COMMAND = """
+REPLACE INTO {table} ({columns}) VALUES ({values})
+"""
+
+# 副本中各表的高水位
+GET_MAX_ID_COMMAND = """
+SELECT COALESCE(MAX(id), 0) as max_id FROM {table}
+"""
+
+# 最近帖子的计数
+GET_RECENT_POST_COUNTERS_COMMAND = """
+SELECT id, like_count, comment_count, hot_decay, hot_score FROM posts WHERE id > %s
+"""
+
+SET_POST_COUNTERS_COMMAND = """
+UPDATE posts SET like_count = %s, comment_count = %s, hot_decay = %s, hot_score = %s
+WHERE id = %s
+"""
+
+# 最近评论的点赞数
+GET_RECENT_COMMENT_LIKES_COMMAND = """
+SELECT id, likes FROM comments WHERE id > %s
+"""
+
+SET_COMMENT_LIKES_COMMAND = """
+UPDATE comments SET likes = %s WHERE id = %s
+"""
+
+GET_BAR_POST_COUNTS_COMMAND = """
+SELECT id, post_count FROM bars
+"""
+
+SET_BAR_POST_COUNT_COMMAND = """
+UPDATE bars SET post_count = %s WHERE id = %s
+"""
+
+# 用户的点赞记录
+GET_USER_POST_LIKES_COMMAND = """
+SELECT post_id FROM post_likes WHERE user_id = %s
+"""
+
+GET_USER_COMMENT_LIKES_COMMAND = """
+SELECT comment_id FROM comment_likes WHERE user_id = %s
+"""
+
+DELETE_USER_POST_LIKES_COMMAND = """
+DELETE FROM post_likes WHERE user_id = %s
+"""
+
+DELETE_USER_COMMENT_LIKES_COMMAND = """
+DELETE FROM comment_likes WHERE user_id = %s
+"""
+
+INSERT_POST_LIKE_COMMAND = """
+INSERT INTO post_likes (user_id, post_id) VALUES (%s, %s)
+"""
+
+INSERT_COMMENT_LIKE_COMMAND = """
+INSERT INTO comment_likes (user_id, comment_id) VALUES (%s, %s)
+"""
+
+
+@db.with_db_connection
+def fetch_primary(cursor, command, args=()):
+    """在主库上执行查询"""
+    cursor.execute(command, args)
+    return cursor.fetchall()
+
+
+class Replica:
+    def __init__(self, path, current_user=None, interval=SYNC_INTERVAL):
+        self.engine = SQLiteEngine(path, foreign_keys=False)
+        self.pool = ConnectionPool(self.engine.connect, ping=self.engine.ping, max_size=4)
+        self.interval = interval
+        self._current_user = current_user or (lambda: None)
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._write_generation = 0
+        self._synced_generation = -1
+        self._synced_user = None
+        self.ready = False
+
+        self.syncs = 0
+        self.rows_copied = 0
+        self.last_sync_ms = None
+        self.last_error = None
+
+        self._write(self._create_tables)
+
+    def _create_tables(self, cursor):
+        # 旧版本建立的副本缺少后来加的列时删除重建，重新全量同步
+        if any(
+            (existing := self.engine.columns(cursor, table)) and set(columns) - existing
+            for table, columns in SYNC_COLUMNS.items()
+        ):
+            for table in reversed(REPLICA_TABLES):
+                cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        for table, command in db.TABLES:
+            if table in REPLICA_TABLES:
+                for statement in self.engine.schema(command):
+                    cursor.execute(statement)
+
+    def _write(self, func, *args):
+        conn = self.pool.acquire()
+        try:
+            with conn.cursor() as cursor:
+                result = func(cursor, *args)
+            conn.commit()
+            return result
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.release(conn)
+
+    def run(self, func, *args, **kwargs):
+        """在副本上执行读函数 func(cursor, ...)"""
+        conn = self.pool.acquire()
+        try:
+            with conn.cursor() as cursor:
+                result = func(cursor, *args, **kwargs)
+            conn.commit()  # 结束读事务，下次读取能看到新同步的数据
+            return result
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.release(conn)
+
+    def note_write(self):
+        """本进程向主库提交了写操作：副本同步到这次写入之前不再提供读取"""
+        with self._lock:
+            self._write_generation += 1
+        self._wakeup.set()
+
+    def fresh(self):
+        """副本是否已完成首次同步、包含本进程的所有写入，且点赞记录属于当前用户"""
+        with self._lock:
+            if self._current_user() != self._synced_user:
+                self._wakeup.set()
+                return False
+            return self.ready and self._synced_generation >= self._write_generation
+
+    # ========================
+    # 同步
+    # ========================
+    def _max_id(self, cursor, table):
+        cursor.execute(GET_MAX_ID_COMMAND.format(table=table))
+        return cursor.fetchone()["max_id"]
+
+    def _apply_rows(self, cursor, table, rows):
+        columns = SYNC_COLUMNS[table]
+        placeholders = PLACEHOLDER_VALUES.get(table, {})
+        cursor.executemany(
+            REPLACE_ROWS_COMMAND.format(
+                table=table,
+                columns=", ".join((*columns, *placeholders)),
+                values=", ".join((*["%s"] * len(columns), *placeholders.values())),
+            ),
+            [tuple(row[column] for column in columns) for row in rows],
+        )
+        if table == "posts":
+            for row in rows:
+                search.index_post(cursor, row["id"], row["title"], row["content"])
+
+    def _ids_in_range(self, cursor, table, low, high):
+        cursor.execute(GET_IDS_IN_RANGE_COMMAND.format(table=table), (low, high))
+        return {row["id"] for row in cursor.fetchall()}
+
+    def _fill_gaps(self, table, high):
+        """补上高水位以下 RESCAN_WINDOW 范围内副本缺少的行（拉取时尚未提交），返回行数"""
+        low = max(0, high - RESCAN_WINDOW)
+        if high <= low:
+            return 0
+        command = GET_IDS_IN_RANGE_COMMAND.format(table=table)
+        primary = {row["id"] for row in fetch_primary(command, (low, high))}  # type: ignore
+        missing = sorted(primary - self._write(self._ids_in_range, table, low, high))
+        if not missing:
+            return 0
+        rows = fetch_primary(  # type: ignore
+            GET_ROWS_BY_IDS_COMMAND.format(
+                table=table,
+                columns=", ".join(SYNC_COLUMNS[table]),
+                ids=", ".join(["%s"] * len(missing)),
+            ),
+            missing,
+        )
+        self._write(self._apply_rows, table, rows)
+        return len(rows)
+
+    def _copy_table(self, table):
+        """拉取一张表的新行（并补上高水位以下缺少的行），返回行数"""
+        after_id = self._write(self._max_id, table)
+        copied = self._fill_gaps(table, after_id)
+        command = GET_NEW_ROWS_COMMAND.format(
+            table=table, columns=", ".join(SYNC_COLUMNS[table])
+        )
+        while True:
+            rows = fetch_primary(command, (after_id, BATCH_SIZE))  # type: ignore
+            if rows:
+                self._write(self._apply_rows, table, rows)
+                after_id = rows[-1]["id"]
+                copied += len(rows)
+            if len(rows) < BATCH_SIZE:
+                return copied
+
+    def _refresh_counters(self):
+        post_id = self._write(self._max_id, "posts")
+        comment_id = self._write(self._max_id, "comments")
+        posts = fetch_primary(  # type: ignore
+            GET_RECENT_POST_COUNTERS_COMMAND, (post_id - REFRESH_WINDOW,)
+        )
+        comments = fetch_primary(  # type: ignore
+            GET_RECENT_COMMENT_LIKES_COMMAND, (comment_id - REFRESH_WINDOW,)
+        )
+        bars = fetch_primary(GET_BAR_POST_COUNTS_COMMAND)  # type: ignore
+
+        def apply(cursor):
+            cursor.executemany(
+                SET_POST_COUNTERS_COMMAND,
+                [
+                    (r["like_count"], r["comment_count"], r["hot_decay"], r["hot_score"], r["id"])
+                    for r in posts
+                ],
+            )
+            cursor.executemany(
+                SET_COMMENT_LIKES_COMMAND, [(r["likes"], r["id"]) for r in comments]
+            )
+            cursor.executemany(
+                SET_BAR_POST_COUNT_COMMAND, [(r["post_count"], r["id"]) for r in bars]
+            )
+
+        self._write(apply)
+
+    def _refresh_likes(self, user_id):
+        post_likes = fetch_primary(GET_USER_POST_LIKES_COMMAND, (user_id,))  # type: ignore
+        comment_likes = fetch_primary(GET_USER_COMMENT_LIKES_COMMAND, (user_id,))  # type: ignore
+
+        def apply(cursor):
+            cursor.execute(DELETE_USER_POST_LIKES_COMMAND, (user_id,))
+            cursor.execute(DELETE_USER_COMMENT_LIKES_COMMAND, (user_id,))
+            cursor.executemany(
+                INSERT_POST_LIKE_COMMAND, [(user_id, r["post_id"]) for r in post_likes]
+            )
+            cursor.executemany(
+                INSERT_COMMENT_LIKE_COMMAND, [(user_id, r["comment_id"]) for r in comment_likes]
+            )
+
+        self._write(apply)
+
+    def sync_once(self):
+        """同步一次，返回拉取的新行数"""
+        start = time.perf_counter()
+        with self._lock:
+            generation = self._write_generation
+        user_id = self._current_user()
+
+        # 本轮对主库的查询共用一个连接
+        with db.connection_scope():
+            copied = sum(self._copy_table(table) for table in SYNC_COLUMNS)
+            self._refresh_counters()
+            if user_id:
+                self._refresh_likes(user_id)
+
+        with self._lock:
+            self._synced_generation = max(self._synced_generation, generation)
+            self._synced_user = user_id
+            self.ready = True
+            self.syncs += 1
+            self.rows_copied += copied
+            self.last_sync_ms = round((time.perf_counter() - start) * 1000, 1)
+        return copied
+
+    def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                self.sync_once()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"同步本地副本失败: {e}")
+            self._wakeup.wait(self.interval)
+
+    def start(self):
+        threading.Thread(target=self._run, name="replica", daemon=True).start()
+        return self
+
+    def stats(self):
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "fresh": self.ready and self._synced_generation >= self._write_generation,
+                "syncs": self.syncs,
+                "rows_copied": self.rows_copied,
+                "last_sync_ms": self.last_sync_ms,
+                "last_error": self.last_error,
+            }
+
+
+def enable(path, current_user=None):
+    """开启本地副本并在后台开始同步；之后的只读查询在副本可用时读本地文件"""
+    db.replica = Replica(path, current_user).start()
+    return db.replica
@@ -0,0 +1,332 @@
+"""帖子全文搜索（倒排索引）
+
+- 分词：中日韩文字按单字和相邻二字切分，字母数字按整词切分（统一小写）
+- 索引：search_index(term, post_id, weight) 记录词项在帖子中的权重，标题权重更高；
+  search_terms(term, df) 记录包含该词项的帖子数，用于计算 IDF 和挑选最稀有的词项
+- 文档频率：常用汉字的 search_terms 行几乎每次发帖都要更新，会让所有发帖排队；
+  发帖时只写 search_index 并在 search_pending 中记下帖子 id，由定时任务（jobs.py）
+  分批汇总到 search_terms。汇总前 df 略低，新词项按 df=1 估计，只影响排序
+- 查询：以最稀有的词项为驱动，从新到旧每批取 CANDIDATE_BATCH 个帖子作为候选，
+  再用主键点查其余词项，查询代价与驱动词项的帖子数成正比，与帖子总数无关；
+  驱动词项的帖子超过 MAX_CANDIDATES 时只在最新的这些帖子中排序，结果标记为截断
+- 翻页：排好序的帖子id列表按 (查询词项, 最大帖子id) 缓存，翻页只需一次 MAX(id) 查询；
+  有新帖子时最大id变化，重新评分
+
+这里的函数都接收游标，由 db.py 在自己的事务中调用。
+"""
+
+import html
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from datetime import datetime
+
+# 标题中出现的词项权重
+TITLE_WEIGHT = 3
+# 单个词项在正文中计入的最大次数
+MAX_TERM_FREQUENCY = 10
+# 词项最大长度（与表结构一致）
+MAX_TERM_LENGTH = 32
+# 查询最多使用的词项数
+MAX_QUERY_TERMS = 8
+# 每批评分的候选帖子数
+CANDIDATE_BATCH = 1000
+# 每次查询最多评分的候选帖子数
+MAX_CANDIDATES = 5000
+# 缓存的排序结果数（每条最多 MAX_CANDIDATES 个帖子id）
+RANKED_CACHE_SIZE = 64
+# 时间衰减半衰期（天）：相关度相同时新帖排在前面
+RECENCY_HALF_LIFE_DAYS = 30
+# 摘要长度
+SNIPPET_LENGTH = 120
+
+CJK_RANGES = (
+    "\u3400-\u4dbf"  # 汉字扩展A
+    "\u4e00-\u9fff"  # 基本汉字
+    "\uf900-\ufaff"  # 兼容汉字
+    "\u3040-\u30ff"  # 日文假名
+    "\uac00-\ud7af"  # 韩文
+)
+TOKEN_PATTERN = re.compile(f"([{CJK_RANGES}]+)|([0-9a-z]+)")
+
+_ranked_lock = threading.Lock()
+_ranked = OrderedDict()  # (词项, 最大帖子id) -> (排序后的帖子id列表, 是否截断)
+
+# 写入词项
+INSERT_SEARCH_POSTING_COMMAND = """
+INSERT INTO search_index (term, post_id, weight) VALUES (%s, %s, %s)
+"""
+
+# 更新词项的文档频率
+UPSERT_SEARCH_TERM_COMMAND = """
+INSERT INTO search_terms (term, df) VALUES (%s, %s)
+ON DUPLICATE KEY UPDATE df = df + VALUES(df)
+"""
+
+# 记下文档频率还未汇总的帖子
+INSERT_SEARCH_PENDING_COMMAND = """
+INSERT INTO search_pending (post_id) VALUES (%s)
+"""
+
+# 最早的一批待汇总帖子
+GET_SEARCH_PENDING_BATCH_COMMAND = """
+SELECT id, post_id FROM search_pending ORDER BY id LIMIT %s
+"""
+
+# 删除已汇总的记录（{ids} 为 IN 列表占位符）
+DELETE_SEARCH_PENDING_COMMAND = """
+DELETE FROM search_pending WHERE id IN ({ids})
+"""
+
+# 一批帖子包含的词项（{ids} 为 IN 列表占位符）
+GET_POSTS_TERMS_COMMAND = """
+SELECT term FROM search_index WHERE post_id IN ({ids})
+"""
+
+# 查询词项的文档频率
+GET_SEARCH_TERMS_COMMAND = """
+SELECT term, df FROM search_terms WHERE term IN ({terms})
+"""
+
+# 按 post_id 从新到旧分批取最稀有词项的候选帖子
+GET_SEARCH_CANDIDATES_COMMAND = """
+SELECT post_id FROM search_index
+WHERE term = %s AND post_id < %s
+ORDER BY post_id DESC
+LIMIT %s
+"""
+
+# 获取候选帖子在各词项上的权重
+GET_SEARCH_POSTINGS_COMMAND = """
+SELECT term, post_id, weight FROM search_index
+WHERE term IN ({terms}) AND post_id IN ({ids})
+"""
+
+# 获取候选帖子的发布时间
+GET_POSTS_CREATE_TIME_COMMAND = """
+SELECT id, create_time FROM posts WHERE id IN ({ids})
+"""
+
+# 帖子总数的近似值（用于 IDF）
+GET_MAX_POST_ID_COMMAND = """
+SELECT MAX(id) as max_id FROM posts
+"""
+
+
+class PendingConflict(Exception):
+    """这批待汇总记录已被其他进程汇总"""
+
+
+def clear_ranked():
+    """清空缓存的排序结果（重建索引后调用）"""
+    with _ranked_lock:
+        _ranked.clear()
+
+
+def _placeholders(values):
+    return ", ".join(["%s"] * len(values))
+
+
+def tokenize(text):
+    """分词，返回 Counter(词项 -> 出现次数)"""
+    terms = Counter()
+    for cjk, word in TOKEN_PATTERN.findall((text or "").lower()):
+        if word:
+            terms[word[:MAX_TERM_LENGTH]] += 1
+            continue
+        for i, char in enumerate(cjk):
+            terms[char] += 1
+            if i + 1 < len(cjk):
+                terms[cjk[i : i + 2]] += 1
+    return terms
+
+
+def query_terms(query):
+    """查询分词：多字中文只用二字词项（更精确），单字时用单字"""
+    terms = []
+    for cjk, word in TOKEN_PATTERN.findall((query or "").lower()):
+        if word:
+            terms.append(word[:MAX_TERM_LENGTH])
+        elif len(cjk) == 1:
+            terms.append(cjk)
+        else:
+            terms.extend(cjk[i : i + 2] for i in range(len(cjk) - 1))
+    return list(dict.fromkeys(terms))[:MAX_QUERY_TERMS]
+
+
+def index_post(cursor, post_id, title, content, defer_df=False):
+    """为新帖子建立索引（在发帖的事务中调用）
+
+    defer_df 为 True 时不更新 search_terms，只记下帖子 id，由 fold_pending 汇总；
+    重建索引、批量导入等只有一个写入者的场景直接更新。
+    """
+    weights = Counter()
+    for term in tokenize(title):
+        weights[term] += TITLE_WEIGHT
+    for term, count in tokenize(content).items():
+        weights[term] += min(count, MAX_TERM_FREQUENCY)
+    if not weights:
+        return 0
+
+    terms = sorted(weights)
+    cursor.executemany(
+        INSERT_SEARCH_POSTING_COMMAND,
+        [(term, post_id, weights[term]) for term in terms],
+    )
+    if defer_df:
+        cursor.execute(INSERT_SEARCH_PENDING_COMMAND, (post_id,))
+    else:
+        _add_df(cursor, Counter(terms))
+    return len(weights)
+
+
+def _add_df(cursor, counts):
+    # 按词项顺序加锁，避免与其他汇总事务死锁
+    cursor.executemany(
+        UPSERT_SEARCH_TERM_COMMAND, [(term, counts[term]) for term in sorted(counts)]
+    )
+
+
+def fold_pending(cursor, batch_size):
+    """把最早一批待汇总帖子的词项加到 search_terms 并删除记录，返回 (记录数, 词项数)
+
+    先删除记录再加 df：删除的行数不足说明这批已被其他进程汇总，抛出 PendingConflict
+    由调用方回滚，不会重复计数。
+    """
+    cursor.execute(GET_SEARCH_PENDING_BATCH_COMMAND, (batch_size,))
+    rows = cursor.fetchall()
+    if not rows:
+        return 0, 0
+
+    ids = [row["id"] for row in rows]
+    deleted = cursor.execute(DELETE_SEARCH_PENDING_COMMAND.format(ids=_placeholders(ids)), ids)
+    if deleted != len(ids):
+        raise PendingConflict("待汇总的帖子已被汇总")
+
+    post_ids = sorted({row["post_id"] for row in rows})
+    cursor.execute(GET_POSTS_TERMS_COMMAND.format(ids=_placeholders(post_ids)), post_ids)
+    counts = Counter(row["term"] for row in cursor.fetchall())
+    _add_df(cursor, counts)
+    return len(rows), len(counts)
+
+
+def _score_batch(cursor, terms, idf, candidates, now):
+    """为一批候选帖子评分，返回 {帖子id: 得分}（只包含所有词项都出现的帖子）"""
+    cursor.execute(
+        GET_SEARCH_POSTINGS_COMMAND.format(
+            terms=_placeholders(terms), ids=_placeholders(candidates)
+        ),
+        (*terms, *candidates),
+    )
+    matched_terms = Counter()
+    relevance = Counter()
+    for row in cursor.fetchall():
+        matched_terms[row["post_id"]] += 1
+        relevance[row["post_id"]] += row["weight"] * idf[row["term"]]
+    matches = [post_id for post_id in candidates if matched_terms[post_id] == len(terms)]
+    if not matches:
+        return {}
+
+    cursor.execute(GET_POSTS_CREATE_TIME_COMMAND.format(ids=_placeholders(matches)), matches)
+    create_times = {row["id"]: row["create_time"] for row in cursor.fetchall()}
+
+    def score(post_id):
+        create_time = create_times.get(post_id)
+        age_days = (now - create_time).total_seconds() / 86400 if create_time else 0
+        recency = 0.5 ** (max(age_days, 0) / RECENCY_HALF_LIFE_DAYS)
+        return relevance[post_id] * (0.5 + 0.5 * recency)
+
+    return {post_id: score(post_id) for post_id in matches}
+
+
+def _rank(cursor, terms, max_id, now):
+    """对所有词项都出现的帖子评分排序，返回 (帖子id列表, 是否截断)"""
+    cursor.execute(GET_SEARCH_TERMS_COMMAND.format(terms=_placeholders(terms)), terms)
+    # 还没汇总到 search_terms 的词项按 df=1 估计：它会成为驱动词项，没有帖子时立即返回空结果
+    df = {term: 1 for term in terms}
+    df.update((row["term"], max(row["df"], 1)) for row in cursor.fetchall())
+
+    total_posts = max_id or 1
+    idf = {term: math.log(1 + total_posts / df[term]) for term in terms}
+
+    driver = min(terms, key=lambda term: df[term])
+    scores = {}
+    before, scanned, truncated = max_id + 1, 0, False
+    while True:
+        if scanned >= MAX_CANDIDATES:
+            # 还有更旧的候选帖子时结果不完整
+            cursor.execute(GET_SEARCH_CANDIDATES_COMMAND, (driver, before, 1))
+            truncated = cursor.fetchone() is not None
+            break
+        batch = min(CANDIDATE_BATCH, MAX_CANDIDATES - scanned)
+        cursor.execute(GET_SEARCH_CANDIDATES_COMMAND, (driver, before, batch))
+        candidates = [row["post_id"] for row in cursor.fetchall()]
+        if candidates:
+            scores.update(_score_batch(cursor, terms, idf, candidates, now))
+            scanned += len(candidates)
+            before = candidates[-1]
+        if len(candidates) < batch:
+            break
+
+    ranked = sorted(scores, key=lambda post_id: (scores[post_id], post_id), reverse=True)
+    return ranked, truncated
+
+
+def search(cursor, query, page=1, per_page=20, now=None):
+    """搜索帖子，返回 (当前页帖子id列表, 匹配总数, 是否截断)
+
+    所有词项都必须出现；得分 = Σ 权重 × IDF，再乘以时间衰减。
+    驱动词项的帖子超过 MAX_CANDIDATES 时只对最新的部分评分，截断为 True，匹配总数为下限。
+    """
+    terms = query_terms(query)
+    if not terms:
+        return [], 0, False
+
+    cursor.execute(GET_MAX_POST_ID_COMMAND)
+    max_id = cursor.fetchone()["max_id"] or 0
+    key = (tuple(terms), max_id)
+    with _ranked_lock:
+        entry = _ranked.get(key)
+        if entry is not None:
+            _ranked.move_to_end(key)
+    if entry is None:
+        entry = _rank(cursor, terms, max_id, now or datetime.now())
+        with _ranked_lock:
+            _ranked[key] = entry
+            while len(_ranked) > RANKED_CACHE_SIZE:
+                _ranked.popitem(last=False)
+
+    ranked, truncated = entry
+    start = (page - 1) * per_page
+    return ranked[start : start + per_page], len(ranked), truncated
+
+
+def make_snippet(text, query, length=SNIPPET_LENGTH):
+    """截取包含查询词的片段，HTML 转义后用 <mark> 高亮"""
+    text = text or ""
+    words = sorted(
+        {w for w in re.split(r"\s+", query or "") if w} | set(query_terms(query)),
+        key=len,
+        reverse=True,
+    )
+    if not words:
+        return html.escape(text[:length])
+    pattern = re.compile("|".join(re.escape(w) for w in words), re.IGNORECASE)
+
+    first = pattern.search(text)
+    start = max(0, (first.start() if first else 0) - length // 4)
+    end = min(len(text), start + length)
+    window = text[start:end]
+
+    parts = []
+    last = 0
+    for match in pattern.finditer(window):
+        parts.append(html.escape(window[last : match.start()]))
+        parts.append(f"<mark>{html.escape(match.group())}</mark>")
+        last = match.end()
+    parts.append(html.escape(window[last:]))
+
+    prefix = "..." if start > 0 else ""
+    suffix = "..." if end < len(text) else ""
+    return prefix + "".join(parts) + suffix
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""启动耗时记录
+
+main.py 最先导入本模块，以导入时刻为起点，记录各启动阶段距起点的毫秒数：
+    import          主模块导入完成
+    window_created  窗口对象创建完成
+    window_shown    窗口显示
+    db_import       数据库模块导入完成（后台）
+    db_ready        第一个数据库连接建立（后台）
+    first_api       前端收到首页数据
+    first_paint     前端渲染完首页
+每次启动的结果追加到 startup.jsonl，用 python startup.py 查看最近几次的对比。
+
+用法: python startup.py [--runs N]
+"""
+
+import argparse
+import importlib
+import json
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from statistics import median
+
+_start = time.perf_counter()
+_lock = threading.Lock()
+_marks = {}
+
+PHASES = (
+    "import",
+    "window_created",
+    "window_shown",
+    "db_import",
+    "db_ready",
+    "first_api",
+    "first_paint",
+)
+# 比最近几次的中位数慢这么多时提示
+REGRESSION_RATIO = 1.2
+
+LOG_FILE = Path(__file__).parent / "userdata" / "startup.jsonl"
+
+
+def mark(phase):
+    """记录阶段完成时刻（同一阶段只记录第一次），返回毫秒数"""
+    elapsed = round((time.perf_counter() - _start) * 1000, 1)
+    with _lock:
+        return _marks.setdefault(phase, elapsed)
+
+
+def marks():
+    with _lock:
+        return dict(_marks)
+
+
+class LazyModule:
+    """首次访问属性时才导入的模块，导入完成时记录 <名称>_import 阶段"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+                    mark(f"{self._name}_import")
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+
+def lazy_import(name):
+    return LazyModule(name)
+
+
+def save_report(path=LOG_FILE):
+    """把本次启动的各阶段耗时追加到日志并打印"""
+    record = {"time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), **marks()}
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+    except Exception as e:
+        print(f"保存启动耗时失败: {e}")
+    print(
+        "启动耗时(ms): "
+        + ", ".join(f"{phase}={record[phase]}" for phase in PHASES if phase in record)
+    )
+    return record
+
+
+def load_reports(path=LOG_FILE, runs=20):
+    """读取最近 runs 次启动记录"""
+    if not path.exists():
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return records[-runs:]
+
+
+def compare(records):
+    """最近一次与之前各次的中位数对比，返回 [(阶段, 本次, 中位数, 是否变慢)]"""
+    if not records:
+        return []
+    latest, history = records[-1], records[:-1]
+    rows = []
+    for phase in PHASES:
+        if phase not in latest:
+            continue
+        values = [r[phase] for r in history if phase in r]
+        baseline = median(values) if values else None
+        slower = baseline is not None and latest[phase] > baseline * REGRESSION_RATIO
+        rows.append((phase, latest[phase], baseline, slower))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查看启动耗时")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    records = load_reports(runs=args.runs)
+    if not records:
+        print("没有启动记录")
+        return
+    print(f"最近一次 {records[-1]['time']}，对比之前 {len(records) - 1} 次的中位数")
+    for phase, value, baseline, slower in compare(records):
+        base = f"{baseline:.1f}" if baseline is not None else "-"
+        flag = "  <- 变慢" if slower else ""
+        print(f"{phase:<16}{value:>10.1f}{base:>10}{flag}")
+
+
+if __name__ == "__main__":
+    main()
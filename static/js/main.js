@@ -1,5 +1,5 @@
 // Vue应用初始化
-const { createApp, ref, reactive, computed, onMounted, onUnmounted } = Vue;
+const { createApp, ref, reactive, computed, nextTick, onMounted, onUnmounted } = Vue;
 
 // 全局变量跟踪Vue应用状态
 window.vueAppStatus = {
@@ -8,6 +8,314 @@ window.vueAppStatus = {
   error: null,
 };
 
+// 解码列表接口的紧凑格式（见 codec.py）：列名只出现一次、每列一个数组，
+// 用户名、贴吧名为 names 查找表的下标，时间为 Unix 时间戳（秒），还原为 Date；普通数组原样返回
+const decodeRows = (data) => {
+  if (!data || Array.isArray(data)) return data || [];
+  const { count, columns, values, names, name_columns, time_columns } = data;
+  const rows = Array.from({ length: count }, () => ({}));
+  columns.forEach((column, c) => {
+    const columnValues = values[c];
+    if (name_columns.includes(column)) {
+      for (let i = 0; i < count; i++) rows[i][column] = names[columnValues[i]];
+    } else if (time_columns.includes(column)) {
+      for (let i = 0; i < count; i++) {
+        const t = columnValues[i];
+        rows[i][column] = t === null ? null : new Date(t * 1000);
+      }
+    } else {
+      for (let i = 0; i < count; i++) rows[i][column] = columnValues[i];
+    }
+  });
+  return rows;
+};
+
+// 虚拟列表：只渲染可见范围（上下各多渲染 overscan 像素）内的行，行的 key 为槽位号，
+// 滚出的行空出的槽位（及其 DOM 节点）直接用于新滚入的行。数据按页保存，已加载的页超过 maxPages 时
+// 释放离可见范围最远的页，只保留其行数和高度，滚动回来时用该页的请求参数重新获取。
+const VIRTUAL_POOL_SIZE = 48; // 同时渲染的最多行数（槽位数）
+
+const createVirtualList = ({
+  estimate, // 未测量的行的估计高度
+  overscan = 800,
+  maxPages = 10,
+  scroller = () => window, // (列表元素) => 滚动容器
+}) => {
+  const heights = new Map(); // 行 id -> 实测高度（含间距）
+  let listEl = null;
+  let scrollEl = null;
+  let fetchPage = null; // (请求参数) => Promise<{ items, next }>
+  let rendered = []; // 当前渲染的行 [{ item, index, top, bottom }]
+  let slots = new Map(); // 当前渲染的行 -> 槽位号
+  let frame = 0;
+
+  const list = reactive({
+    pages: [], // [{ request, items, count, height, loading }]，items 为 null 表示已释放
+    next: null, // 下一页的请求参数，null 表示没有更多
+    loading: false, // 是否正在获取下一页
+    visible: [], // 模板渲染的行 [{ item, slot }]
+    before: 0, // 可见行之前的高度
+    after: 0, // 可见行之后的高度
+  });
+
+  const rowHeight = (item) => heights.get(item.id) || estimate;
+  const pageHeight = (page) =>
+    page.items ? page.items.reduce((sum, item) => sum + rowHeight(item), 0) : page.height;
+
+  // 可见范围在列表坐标中的位置
+  const viewport = () => {
+    const listTop = listEl.getBoundingClientRect().top;
+    if (scrollEl === window) return { top: -listTop, bottom: window.innerHeight - listTop };
+    const rect = scrollEl.getBoundingClientRect();
+    return { top: rect.top - listTop, bottom: rect.bottom - listTop };
+  };
+
+  const scrollBy = (delta) => {
+    if (scrollEl === window) window.scrollBy(0, delta);
+    else scrollEl.scrollTop += delta;
+  };
+
+  const layout = () => {
+    if (!listEl) return;
+    const view = viewport();
+    const low = view.top - overscan;
+    const high = view.bottom + overscan;
+    const rows = [];
+    let top = 0;
+    let index = 0;
+    for (const page of list.pages) {
+      if (!page.items) {
+        const bottom = top + page.height;
+        if (bottom > low && top < high) reload(page);
+        top = bottom;
+        index += page.count;
+        continue;
+      }
+      for (const item of page.items) {
+        const bottom = top + rowHeight(item);
+        if (bottom > low && top < high) rows.push({ item, index, top, bottom });
+        top = bottom;
+        index += 1;
+      }
+    }
+    // 槽位不够时先去掉可见范围之上的预渲染行
+    while (rows.length > VIRTUAL_POOL_SIZE && rows[0].bottom < view.top) rows.shift();
+    rows.length = Math.min(rows.length, VIRTUAL_POOL_SIZE);
+
+    const changed =
+      rows.length !== rendered.length ||
+      rows.some((row, i) => row.item !== rendered[i].item);
+    rendered = rows;
+    list.before = rows.length ? rows[0].top : 0;
+    list.after = top - (rows.length ? rows[rows.length - 1].bottom : 0);
+    if (changed) {
+      list.visible = assignSlots(rows);
+      nextTick(measure);
+    }
+  };
+
+  // 仍在范围内的行保留原来的槽位，新滚入的行使用空出的槽位
+  const assignSlots = (rows) => {
+    const kept = new Map();
+    for (const row of rows) {
+      if (slots.has(row.item)) kept.set(row.item, slots.get(row.item));
+    }
+    const used = new Set(kept.values());
+    let free = 0;
+    const visible = rows.map((row) => {
+      let slot = kept.get(row.item);
+      if (slot === undefined) {
+        while (used.has(free)) free += 1;
+        slot = free;
+        used.add(slot);
+        kept.set(row.item, slot);
+      }
+      return { item: row.item, slot };
+    });
+    slots = kept;
+    return visible;
+  };
+
+  // 测量渲染出的行；可见范围之上的行高度变化时调整滚动位置，内容不跳动
+  const measure = () => {
+    if (!listEl) return;
+    const view = viewport();
+    const gap = parseFloat(getComputedStyle(listEl).rowGap) || 0;
+    let changed = false;
+    let shift = 0;
+    listEl.querySelectorAll(":scope > [data-row]").forEach((el, i) => {
+      const row = rendered[i];
+      if (!row) return;
+      const style = getComputedStyle(el);
+      const height =
+        el.offsetHeight + parseFloat(style.marginTop) + parseFloat(style.marginBottom) + gap;
+      const old = rowHeight(row.item);
+      if (Math.abs(height - old) < 0.5) return;
+      heights.set(row.item.id, height);
+      changed = true;
+      if (row.bottom <= view.top) shift += height - old;
+    });
+    if (!changed) return;
+    if (shift) scrollBy(shift);
+    layout();
+  };
+
+  // 释放离可见范围最远的页（与可见范围及预渲染区域重叠的页不释放）
+  const evict = () => {
+    const loaded = list.pages.filter((page) => page.items);
+    if (loaded.length <= maxPages || !listEl) return;
+    const view = viewport();
+    const distance = new Map();
+    let top = 0;
+    for (const page of list.pages) {
+      const bottom = top + pageHeight(page);
+      if (page.items) {
+        distance.set(page, Math.max(view.top - overscan - bottom, top - view.bottom - overscan));
+      }
+      top = bottom;
+    }
+    const far = loaded
+      .filter((page) => distance.get(page) > 0)
+      .sort((a, b) => distance.get(b) - distance.get(a))
+      .slice(0, loaded.length - maxPages);
+    for (const page of far) {
+      page.height = pageHeight(page);
+      page.items.forEach((item) => heights.delete(item.id));
+      page.items = null;
+    }
+  };
+
+  // 重新获取已释放的页
+  const reload = async (page) => {
+    if (page.loading || !fetchPage) return;
+    page.loading = true;
+    const fetcher = fetchPage;
+    try {
+      const { items } = await fetcher(page.request);
+      // 列表已重置
+      if (fetcher !== fetchPage || !list.pages.includes(page)) return;
+      page.items = items;
+      page.count = items.length;
+      evict();
+      layout();
+    } catch (error) {
+      console.error("重新加载列表失败:", error);
+    } finally {
+      page.loading = false;
+    }
+  };
+
+  const onScroll = () => {
+    if (frame) return;
+    frame = requestAnimationFrame(() => {
+      frame = 0;
+      layout();
+    });
+  };
+
+  // 模板中的 :ref，挂载时开始监听滚动，卸载时停止
+  list.attach = (el) => {
+    if (el === listEl) return;
+    if (scrollEl) {
+      scrollEl.removeEventListener("scroll", onScroll);
+      window.removeEventListener("resize", measure);
+    }
+    listEl = el;
+    scrollEl = el ? scroller(el) : null;
+    rendered = [];
+    if (!scrollEl) return;
+    scrollEl.addEventListener("scroll", onScroll, { passive: true });
+    window.addEventListener("resize", measure);
+    nextTick(layout);
+  };
+
+  // 用第一页替换全部数据；fetcher(请求参数) 用于重新获取已释放的页
+  list.reset = (items, next, fetcher, request = null) => {
+    fetchPage = fetcher;
+    heights.clear();
+    list.pages = [{ request, items, count: items.length, height: 0, loading: false }];
+    list.next = next;
+    nextTick(layout);
+  };
+
+  // 追加 list.next 对应的一页
+  list.append = (items, next) => {
+    if (items.length) {
+      list.pages.push({ request: list.next, items, count: items.length, height: 0, loading: false });
+    }
+    list.next = next;
+    evict();
+    nextTick(layout);
+  };
+
+  // 获取并追加下一页
+  list.loadNext = async () => {
+    if (list.next === null || list.loading || !fetchPage) return;
+    const fetcher = fetchPage;
+    list.loading = true;
+    try {
+      const { items, next } = await fetcher(list.next);
+      // 列表已重置（切换了视图）
+      if (fetcher !== fetchPage) return;
+      list.append(items, next);
+    } finally {
+      list.loading = false;
+    }
+  };
+
+  // 在末尾加入一行（例如刚发表的评论）
+  list.push = (item) => {
+    const page = list.pages[list.pages.length - 1];
+    if (!page || !page.items) return;
+    page.items.push(item);
+    page.count += 1;
+    nextTick(layout);
+  };
+
+  list.clear = () => {
+    fetchPage = null;
+    heights.clear();
+    rendered = [];
+    slots = new Map();
+    list.pages = [];
+    list.next = null;
+    list.visible = [];
+    list.before = 0;
+    list.after = 0;
+  };
+
+  // 保存数据、行高和滚动位置，返回该视图时恢复
+  list.snapshot = () => ({
+    pages: list.pages,
+    next: list.next,
+    fetchPage,
+    heights: new Map(heights),
+    top: listEl ? viewport().top : 0,
+  });
+
+  list.restore = (snapshot) => {
+    fetchPage = snapshot.fetchPage;
+    heights.clear();
+    snapshot.heights.forEach((height, id) => heights.set(id, height));
+    list.pages = snapshot.pages;
+    list.next = snapshot.next;
+    // 先按保存的行高撑开列表，再滚动到原来的位置
+    nextTick(() => {
+      if (!listEl) return;
+      layout();
+      nextTick(() => {
+        scrollBy(snapshot.top - viewport().top);
+        layout();
+      });
+    });
+  };
+
+  // 已加载的行（已释放的页不包括在内）和总行数
+  list.items = computed(() => list.pages.flatMap((page) => page.items || []));
+  list.total = computed(() => list.pages.reduce((sum, page) => sum + page.count, 0));
+  return list;
+};
+
 const TiebaApp = {
   setup() {
     // 状态管理
@@ -27,14 +335,12 @@ const TiebaApp = {
       // 数据
       hotBars: [],
       userBars: [],
-      posts: [],
       currentPost: null,
-      comments: [],
       currentBar: null, // 当前选中的贴吧
-      isLoadingMore: false, // 是否正在加载更多
-      currentPage: 1, // 当前页码
-      hasMorePosts: true, // 是否还有更多帖子
       isHotPostsView: false, // 是否为热门帖子视图
+      activeSearch: null, // 当前搜索词（搜索结果视图）
+      view: null, // 当前视图，切换后旧视图的响应会被丢弃
+      newPosts: {}, // 推送来的新帖子id（按贴吧），刷新列表后清空
       stats: {
         posts: 0,
         users: 0,
@@ -70,9 +376,103 @@ const TiebaApp = {
 
     const searchQuery = ref("");
 
+    // 帖子列表（最新、热门、贴吧、搜索结果）和帖子详情中的评论，都只渲染可见的行
+    const feed = createVirtualList({ estimate: 260 });
+    const thread = createVirtualList({
+      estimate: 120,
+      overscan: 400,
+      scroller: (el) => el.closest(".modal-content"),
+    });
+    // 进入贴吧时保存最新帖子列表和滚动位置，点“最新帖子”返回时恢复
+    let latestSnapshot = null;
+
+    // 帖子卡片用到的字段：列表只返回摘要，正文在打开帖子时获取
+    const FEED_FIELDS = [
+      "title",
+      "excerpt",
+      "snippet",
+      "author_name",
+      "create_time",
+      "likes",
+      "comments_count",
+      "is_liked",
+    ];
+
+    // 各视图按页获取帖子（紧凑格式，decodeRows 还原），返回 { items, next }（next 为下一页的游标或页码）
+    const latestPage = async (cursor) => {
+      const result = await window.pywebview.api.getLatestPostsByCursor(
+        cursor,
+        20,
+        FEED_FIELDS,
+        true
+      );
+      return {
+        items: result ? decodeRows(result.posts) : [],
+        next: result ? result.next_cursor : null,
+      };
+    };
+
+    const barPage = (barId) => async (cursor) => {
+      const result = await window.pywebview.api.getPostsInBarByCursor(
+        barId,
+        cursor,
+        20,
+        FEED_FIELDS,
+        true
+      );
+      return {
+        items: result ? decodeRows(result.posts) : [],
+        next: result ? result.next_cursor : null,
+      };
+    };
+
+    // 热度由后端计算并排序，按页码获取
+    const hotPage = async (page) => {
+      const posts = decodeRows(await window.pywebview.api.getHotPosts(page, 20, FEED_FIELDS, true));
+      return { items: posts, next: posts.length === 20 ? page + 1 : null };
+    };
+
+    // 后端返回匹配总数（truncated 时只搜索了最新的部分帖子，总数为下限）
+    const searchPage = (query) => async (page) => {
+      const result = await window.pywebview.api.searchPosts(query, page, 20, FEED_FIELDS, true);
+      const items = result ? decodeRows(result.posts) : [];
+      const total = result ? result.total : 0;
+      return {
+        items,
+        next: page * 20 < total ? page + 1 : null,
+        total,
+        truncated: result ? result.truncated : false,
+      };
+    };
+
+    // 评论每页条数，与 main.py 的 POST_DETAIL_COMMENTS 相同（已释放的页按游标重新获取）
+    const COMMENTS_PAGE_SIZE = 20;
+    const commentPage = (postId) => async (cursor) => {
+      const result = await window.pywebview.api.getCommentsInPostByCursor(
+        postId,
+        cursor,
+        COMMENTS_PAGE_SIZE,
+        true
+      );
+      return {
+        items: result ? decodeRows(result.comments) : [],
+        next: result ? result.next_cursor : null,
+      };
+    };
+
     // 计算属性
     const isLoggedIn = computed(() => !!state.currentUser);
 
+    // 当前列表之外的新帖子数（最新帖子和贴吧视图）
+    const newPostCount = computed(() => {
+      if (state.activeSearch || state.isHotPostsView) return 0;
+      const ids = state.currentBar
+        ? state.newPosts[state.currentBar.id] || []
+        : Object.values(state.newPosts).flat();
+      const shown = new Set(feed.items.map((p) => p.id));
+      return ids.filter((id) => !shown.has(id)).length;
+    });
+
     // 工具函数
     const escapeHtml = (s) => {
       if (!s) return "";
@@ -162,11 +562,24 @@ const TiebaApp = {
       return state.userBars.some((bar) => bar.id === barId);
     };
 
+    // 切换视图：通知后端取消旧视图中尚未执行的请求
+    const enterView = async (view) => {
+      if (state.view === view) return;
+      state.view = view;
+      try {
+        await window.pywebview.api.enterView(view);
+      } catch (error) {
+        console.error("切换视图失败:", error);
+      }
+    };
+
     // API调用函数
     const loadHotBars = async () => {
       try {
-        const bars = await window.pywebview.api.getHotBars(20);
-        const userBars = await window.pywebview.api.getFollowedBars();
+        const [bars, userBars] = await Promise.all([
+          window.pywebview.api.getHotBars(20),
+          window.pywebview.api.getFollowedBars(),
+        ]);
         state.hotBars = bars;
         state.userBars = userBars;
       } catch (error) {
@@ -185,54 +598,17 @@ const TiebaApp = {
       }
     };
 
-    const loadStats = async () => {
-      try {
-        const stats = await window.pywebview.api.getStats();
-        
-        // 如果已有统计数据，比较新旧值，添加动画效果
-        if (state.stats) {
-          // 添加动画类
-          const statElements = document.querySelectorAll(".stat-value");
-          statElements.forEach(el => el.classList.add("updating"));
-          
-          // 更新数据
-          state.stats = stats || { posts: 0, users: 0, comments: 0 };
-          
-          // 动画结束后移除类
-          setTimeout(() => {
-            statElements.forEach(el => el.classList.remove("updating"));
-          }, 500);
-        } else {
-          // 首次加载
-          state.stats = stats || { posts: 0, users: 0, comments: 0 };
-        }
-      } catch (error) {
-        console.error("加载统计数据失败:", error);
-      }
-    };
-
-    const loadLatestPosts = async (reset = true) => {
+    const loadLatestPosts = async () => {
       try {
-        if (reset) {
-          state.currentPage = 1;
-          state.hasMorePosts = true;
-        }
-
-        const posts = await window.pywebview.api.getLatestPosts(
-          state.currentPage,
-          20
-        );
+        state.activeSearch = null;
+        state.newPosts = {};
+        latestSnapshot = null;
+        await enterView("latest");
 
-        if (reset) {
-          state.posts = posts || [];
-        } else {
-          // 追加新帖子
-          if (posts && posts.length > 0) {
-            state.posts = [...state.posts, ...posts];
-          } else {
-            state.hasMorePosts = false;
-          }
-        }
+        const { items, next } = await latestPage(null);
+        // 已切换到其他视图
+        if (state.view !== "latest") return;
+        feed.reset(items, next, latestPage);
 
         // 更新页面标题
         document.querySelector(".page-title").textContent = "最新帖子";
@@ -251,91 +627,15 @@ const TiebaApp = {
       }
     };
 
-    const loadHotPosts = async (reset = true) => {
+    const loadHotPosts = async () => {
       try {
-        if (reset) {
-          state.currentPage = 1;
-          state.hasMorePosts = true;
-        }
-
-        // 获取所有帖子
-        const allPosts = await window.pywebview.api.getLatestPosts(1, 1000);
-
-        // 确保每个帖子都有正确的属性
-        allPosts.forEach((post) => {
-          post.likes = post.likes || post.like_count || 0;
-          post.comments_count = post.comments_count || post.comment_count || 0;
-          // 确保每个帖子都有is_liked属性
-          post.is_liked = post.is_liked || false;
-          // 确保created_at属性存在，用于热度计算
-          if (!post.created_at && post.create_time) {
-            post.created_at = post.create_time;
-          }
-        });
-
-        // 计算每个帖子的热度（综合点赞数、评论数和时间因素）
-        const postsWithHotness = allPosts.map((post) => {
-          const likes = post.likes || 0;
-          const comments = post.comments_count || 0;
-          // 热度计算：综合考虑点赞数、评论数和时间因素
-          // 发布时间越新，热度越高（按天数衰减）
-          const now = new Date();
-          const postDate = new Date(post.created_at);
-          const hoursDiff = Math.max(
-            1,
-            Math.floor((now - postDate) / (1000 * 60 * 60)) // 以小时为单位
-          );
-          
-          // 时间衰减因子：24小时内发布的帖子时间因子为1，之后按指数衰减
-          let timeFactor;
-          if (hoursDiff <= 24) {
-            timeFactor = 1.0; // 24小时内发布的帖子，时间因子为1
-          } else {
-            // 超过24小时的帖子，按天数对数衰减
-            const daysDiff = Math.floor(hoursDiff / 24);
-            timeFactor = 1 / Math.log(daysDiff + 2); // 使用+2确保衰减不会太快
-          }
-
-          // 综合热度计算：
-          // 1. 基础热度：点赞数 * 1.5 + 评论数 * 1（点赞权重略高）
-          // 2. 应用时间因子：新帖子的热度更高
-          const baseHotness = likes * 1.5 + comments;
-          post.hotness = baseHotness * timeFactor;
-          
-          // 调试输出，确保热度计算正确
-          if (reset && state.currentPage === 1) {
-            console.log(`帖子ID: ${post.id}, 点赞: ${likes}, 评论: ${comments}, 时间因子: ${timeFactor}, 热度: ${post.hotness}`);
-          }
-          
-          return post;
-        });
-
-        // 按热度降序排序
-        postsWithHotness.sort((a, b) => b.hotness - a.hotness);
-        
-        // 调试输出，检查排序是否正确
-        if (reset && state.currentPage === 1) {
-          console.log("排序后的前5个帖子:");
-          for (let i = 0; i < Math.min(5, postsWithHotness.length); i++) {
-            console.log(`#${i+1} 帖子ID: ${postsWithHotness[i].id}, 热度: ${postsWithHotness[i].hotness}`);
-          }
-        }
+        state.activeSearch = null;
+        latestSnapshot = null;
+        await enterView("hot");
 
-        // 获取当前页的帖子
-        const startIndex = (state.currentPage - 1) * 20;
-        const endIndex = startIndex + 20;
-        const posts = postsWithHotness.slice(startIndex, endIndex);
-
-        if (reset) {
-          state.posts = posts || [];
-        } else {
-          // 追加新帖子
-          if (posts && posts.length > 0) {
-            state.posts = [...state.posts, ...posts];
-          } else {
-            state.hasMorePosts = false;
-          }
-        }
+        const { items, next } = await hotPage(1);
+        if (state.view !== "hot") return;
+        feed.reset(items, next, hotPage, 1);
 
         // 更新页面标题
         document.querySelector(".page-title").textContent = "热门帖子";
@@ -349,9 +649,7 @@ const TiebaApp = {
           .querySelector(".filter-btn:nth-child(2)")
           .classList.add("active");
 
-        if (reset) {
-          showNotification("已加载热门帖子", "success");
-        }
+        showNotification("已加载热门帖子", "success");
       } catch (error) {
         console.error("加载热门帖子失败:", error);
         showNotification("加载热门帖子失败", "error");
@@ -392,7 +690,7 @@ const TiebaApp = {
       }
     };
 
-    const loadPostsInBar = async (barId, reset = true) => {
+    const loadPostsInBar = async (barId) => {
       try {
         // 查找贴吧信息
         const bar =
@@ -404,38 +702,38 @@ const TiebaApp = {
           state.currentBar = bar;
         }
 
-        if (reset) {
-          state.currentPage = 1;
-          state.hasMorePosts = true;
-        }
-
-        const posts = await window.pywebview.api.getPostsInBar(
-          barId,
-          state.currentPage,
-          20
-        );
-
-        if (reset) {
-          state.posts = posts || [];
-        } else {
-          // 追加新帖子
-          if (posts && posts.length > 0) {
-            state.posts = [...state.posts, ...posts];
-          } else {
-            state.hasMorePosts = false;
-          }
+        if (state.view === "latest") {
+          latestSnapshot = feed.snapshot();
         }
+        state.activeSearch = null;
+        delete state.newPosts[barId];
+        await enterView(`bar:${barId}`);
+
+        const fetcher = barPage(barId);
+        const { items, next } = await fetcher(null);
+        if (state.view !== `bar:${barId}`) return;
+        feed.reset(items, next, fetcher);
       } catch (error) {
         console.error("加载贴吧帖子失败:", error);
         showNotification("加载贴吧帖子失败", "error");
       }
     };
 
-    const backToLatestPosts = () => {
+    const backToLatestPosts = async () => {
       // 清除当前贴吧
       state.currentBar = null;
-      // 加载最新帖子
-      loadLatestPosts();
+      const snapshot = latestSnapshot;
+      if (!snapshot) {
+        // 加载最新帖子
+        loadLatestPosts();
+        return;
+      }
+      // 恢复进入贴吧前的列表和滚动位置
+      latestSnapshot = null;
+      state.activeSearch = null;
+      state.isHotPostsView = false;
+      await enterView("latest");
+      if (state.view === "latest") feed.restore(snapshot);
     };
 
     const openPost = async (postId) => {
@@ -450,7 +748,8 @@ const TiebaApp = {
         }
 
         state.currentPost = post;
-        state.comments = post.comments || [];
+        thread.reset(post.comments || [], post.next_comment_cursor || null, commentPage(post.id));
+        delete post.comments;
         console.log("Opening post detail modal...");
         showModal("postDetail");
       } catch (error) {
@@ -459,6 +758,16 @@ const TiebaApp = {
       }
     };
 
+    // 加载帖子详情中的下一页评论
+    const loadMoreComments = async () => {
+      try {
+        await thread.loadNext();
+      } catch (error) {
+        console.error("加载评论失败:", error);
+        showNotification("加载评论失败", "error");
+      }
+    };
+
     // 切换点赞状态
     const toggleLike = async (postId) => {
       if (!isLoggedIn.value) {
@@ -468,18 +777,19 @@ const TiebaApp = {
       }
 
       try {
-        // 找到对应的帖子
-        const post = state.posts.find((p) => p.id === postId);
-        if (!post) return;
+        // 找到对应的帖子（所在的页可能已被释放，此时只更新详情）
+        const post = feed.items.find((p) => p.id === postId);
 
         // 调用API切换点赞状态
         const result = await window.pywebview.api.toggleLike(postId);
 
         if (result && result.success) {
           // 更新点赞状态和数量
-          post.is_liked = result.is_liked;
-          // 确保点赞数正确更新，特别是取消点赞时
-          post.likes = result.likes !== undefined ? result.likes : (result.is_liked ? post.likes + 1 : Math.max(0, post.likes - 1));
+          if (post) {
+            post.is_liked = result.is_liked;
+            // 确保点赞数正确更新，特别是取消点赞时
+            post.likes = result.likes !== undefined ? result.likes : (result.is_liked ? post.likes + 1 : Math.max(0, post.likes - 1));
+          }
 
           // 如果是当前查看的帖子，也更新其状态
           if (state.currentPost && state.currentPost.id === postId) {
@@ -720,8 +1030,18 @@ const TiebaApp = {
         );
         if (result.success) {
           showNotification("评论成功", "success");
-          // 重新加载帖子详情以显示新评论
-          openPost(state.currentPost.id);
+          // 评论按时间正序，已加载到最后一页时直接显示新评论；否则翻到最后时会加载到
+          if (thread.next === null) {
+            thread.push({
+              id: result.comment_id,
+              content: commentForm.content,
+              author_id: state.currentUser.id,
+              author_name: state.currentUser.name,
+              create_time: new Date(),
+              likes: 0,
+              liked_by_user: false,
+            });
+          }
 
           // 清空表单
           commentForm.content = "";
@@ -743,7 +1063,7 @@ const TiebaApp = {
 
       try {
         // 找到对应的评论
-        const comment = state.comments.find((c) => c.id === commentId);
+        const comment = thread.items.find((c) => c.id === commentId);
         if (!comment) return;
 
         // 调用API切换点赞状态
@@ -782,23 +1102,23 @@ const TiebaApp = {
           searchBtn.innerHTML = '<i class="fas fa-spinner fa-spin"></i>';
         }
         
-        // 调用API搜索
-        const results = await window.pywebview.api.searchPosts(searchQuery.value);
-        
-        if (results && results.length > 0) {
-          // 更新帖子列表
-          state.posts = results;
-          
-          // 更新页面标题
-          document.querySelector(".page-title").textContent = `搜索结果: "${searchQuery.value}"`;
-          
-          // 隐藏加载更多指示器
-          state.hasMorePosts = false;
-          
-          showNotification(`找到 ${results.length} 个相关帖子`, "success");
+        // 调用API搜索（第一页）
+        const query = searchQuery.value.trim();
+        latestSnapshot = null;
+        await enterView(`search:${query}`);
+        const fetcher = searchPage(query);
+        const { items, next, total, truncated } = await fetcher(1);
+        if (state.view !== `search:${query}`) return;
+
+        state.activeSearch = query;
+        state.currentBar = null;
+        feed.reset(items, next, fetcher, 1);
+        const count = truncated ? `${total}+ 条，只搜索了最新的帖子` : `${total} 条`;
+        document.querySelector(".page-title").textContent = `搜索结果: "${query}"（${count}）`;
+
+        if (items.length > 0) {
+          showNotification(`找到 ${truncated ? `${total}+` : total} 个相关帖子`, "success");
         } else {
-          state.posts = [];
-          document.querySelector(".page-title").textContent = `搜索结果: "${searchQuery.value}"`;
           showNotification("未找到相关帖子", "info");
         }
       } catch (error) {
@@ -821,7 +1141,7 @@ const TiebaApp = {
     // 滚动加载更多
     const handleScroll = () => {
       // 如果正在加载或没有更多帖子，则不处理
-      if (state.isLoadingMore || !state.hasMorePosts) return;
+      if (feed.loading || feed.next === null) return;
 
       // 计算滚动位置
       const scrollTop = window.scrollY || document.documentElement.scrollTop;
@@ -834,44 +1154,91 @@ const TiebaApp = {
       }
     };
 
-    // 加载更多帖子
+    // 加载更多帖子（下一页的游标或页码由列表保存）
     const loadMorePosts = async () => {
-      if (state.isLoadingMore || !state.hasMorePosts) return;
-
-      state.isLoadingMore = true;
-      state.currentPage += 1;
-
       try {
-        // 根据当前状态判断加载哪种类型的帖子
-        if (state.currentBar) {
-          await loadPostsInBar(state.currentBar.id, false);
+        await feed.loadNext();
+      } catch (error) {
+        console.error("加载更多帖子失败:", error);
+        showNotification("加载更多帖子失败", "error");
+      }
+    };
+
+    // 应用后端推送的数据变更（只修改已加载的数据，不重新请求）
+    const applyLiveUpdate = (update) => {
+      if (update.session && "user" in update.session) {
+        state.currentUser = update.session.user;
+        if (state.currentUser) {
+          loadUserBars();
         } else {
-          const pageTitle = document.querySelector(".page-title").textContent;
+          state.userBars = [];
+          showNotification("登录已过期，请重新登录", "warning");
+        }
+      }
 
-          if (pageTitle.includes("最新")) {
-            await loadLatestPosts(false);
-          } else if (pageTitle.includes("热门")) {
-            await loadHotPosts(false);
-          }
+      for (const [barId, postIds] of Object.entries(update.new_posts || {})) {
+        const known = state.newPosts[barId] || [];
+        state.newPosts[barId] = [...new Set([...known, ...postIds])];
+        const bar = state.hotBars.find((b) => b.id === Number(barId));
+        if (bar) bar.post_count = (bar.post_count || 0) + postIds.length;
+      }
+
+      for (const [postId, counts] of Object.entries(update.posts || {})) {
+        const id = Number(postId);
+        const targets = feed.items.filter((p) => p.id === id);
+        if (state.currentPost && state.currentPost.id === id) {
+          targets.push(state.currentPost);
         }
-      } finally {
-        state.isLoadingMore = false;
+        for (const post of targets) {
+          if (counts.likes !== undefined) post.likes = counts.likes;
+          if (counts.comments !== undefined) post.comments_count = counts.comments;
+        }
+      }
+
+      for (const [commentId, likes] of Object.entries(update.comments || {})) {
+        const comment = thread.items.find((c) => c.id === Number(commentId));
+        if (comment) comment.likes = likes;
+      }
+
+      const stats = update.stats;
+      if (stats && state.stats) {
+        const statElements = document.querySelectorAll(".stat-value");
+        statElements.forEach((el) => el.classList.add("updating"));
+        for (const [name, delta] of Object.entries(stats)) {
+          state.stats[name] = (state.stats[name] || 0) + delta;
+          const today = `today_${name}`;
+          if (state.stats[today] !== undefined) state.stats[today] += delta;
+        }
+        setTimeout(() => {
+          statElements.forEach((el) => el.classList.remove("updating"));
+        }, 500);
       }
     };
+    window.applyLiveUpdate = applyLiveUpdate;
 
     // 初始化应用
     const initApp = async () => {
       try {
-        // 加载用户信息
-        state.currentUser = await window.pywebview.api.getCurrentUser();
-
-        // 加载数据
-        await Promise.all([
-          loadHotBars(),
-          loadStats(),
-          loadLatestPosts(),
-          isLoggedIn.value ? loadUserBars() : Promise.resolve(),
-        ]);
+        // 首页数据一次取回（用户信息、贴吧、统计、最新帖子）
+        await enterView("latest");
+        const bundle = await window.pywebview.api.getHomepageBundle(20, FEED_FIELDS, true);
+        state.currentUser = bundle.current_user;
+        state.hotBars = bundle.hot_bars || [];
+        state.userBars = bundle.followed_bars || [];
+        state.stats = bundle.stats || { posts: 0, users: 0, comments: 0 };
+        feed.reset(
+          bundle.latest ? decodeRows(bundle.latest.posts) : [],
+          bundle.latest ? bundle.latest.next_cursor : null,
+          latestPage
+        );
+
+        // 报告启动耗时：收到首页数据、首页渲染完成
+        window.pywebview.api.markStartup("first_api");
+        nextTick(() =>
+          requestAnimationFrame(() =>
+            window.pywebview.api.markStartup("first_paint")
+          )
+        );
 
         // 添加滚动事件监听
         window.addEventListener("scroll", handleScroll);
@@ -890,16 +1257,10 @@ const TiebaApp = {
         // 否则等待pywebview准备好
         window.addEventListener("pywebviewready", initApp);
       }
-      
-      // 设置定时更新统计数据，每30秒更新一次
-      setInterval(() => {
-        if (window.pywebview && window.pywebview.api) {
-          loadStats();
-        }
-      }, 30000);
     });
 
     onUnmounted(() => {
+      window.applyLiveUpdate = null;
       // 移除滚动事件监听
       window.removeEventListener("scroll", handleScroll);
     });
@@ -908,6 +1269,8 @@ const TiebaApp = {
     return {
       // 状态
       state,
+      feed,
+      thread,
 
       // 表单数据
       loginForm,
@@ -919,6 +1282,7 @@ const TiebaApp = {
 
       // 计算属性
       isLoggedIn,
+      newPostCount,
 
       // 工具函数
       escapeHtml,
@@ -940,6 +1304,7 @@ const TiebaApp = {
       loadHotPosts,
       refreshPosts,
       openPost,
+      loadMoreComments,
       openPostInBar,
       backToLatestPosts,
 
@@ -0,0 +1,66 @@
+"""测试在临时目录的 SQLite 数据库上运行，不需要远程 MySQL
+
+环境变量须在导入 db 之前设置；缓存关闭，查询数按 metrics 统计。
+"""
+
+import itertools
+import os
+import shutil
+import tempfile
+
+import pytest
+
+_workdir = tempfile.mkdtemp(prefix="tieba-test-")
+os.environ["DB_ENGINE"] = "sqlite"
+os.environ["DB_SQLITE_PATH"] = os.path.join(_workdir, "test.db")
+os.environ["DB_CACHE"] = "0"
+os.environ["DB_METRICS"] = "1"
+os.environ["DB_SLOW_QUERY_MS"] = "inf"
+os.environ.pop("DB_REPLICA", None)
+
+import db  # noqa: E402
+import metrics  # noqa: E402
+import migrations  # noqa: E402
+
+_names = itertools.count(1)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    migrations.migrate()
+    yield
+    db.db_pool.close_all()
+    shutil.rmtree(_workdir, ignore_errors=True)
+
+
+@pytest.fixture
+def make_user():
+    """注册新用户，返回用户 id"""
+    return lambda: db.register_user(f"user{next(_names)}", "password")
+
+
+@pytest.fixture
+def user(make_user):
+    return make_user()
+
+
+@pytest.fixture
+def bar(user):
+    return db.create_bar(f"bar{next(_names)}", user)
+
+
+@pytest.fixture
+def post(bar, user):
+    return db.create_post(bar, "标题", "正文", user)
+
+
+@pytest.fixture
+def count_queries():
+    """调用 func，返回 (结果, 执行的语句数)"""
+
+    def run(func, *args, **kwargs):
+        before = metrics.total_queries()
+        result = func(*args, **kwargs)
+        return result, metrics.total_queries() - before
+
+    return run
@@ -0,0 +1,54 @@
+"""列式紧凑编码：编码后还原与原列表一致"""
+
+from datetime import datetime
+
+import codec
+import db
+
+
+def test_round_trip():
+    rows = [
+        {"id": 3, "title": "a", "author_name": "张三", "bar_name": "数学吧", "likes": 0},
+        {"id": 2, "title": "b", "author_name": "李四", "bar_name": "数学吧", "likes": 5},
+        {"id": 1, "title": None, "author_name": "张三", "bar_name": "语文吧", "likes": 1},
+    ]
+    data = codec.encode_rows(rows)
+
+    assert data["format"] == codec.FORMAT and data["count"] == 3
+    assert data["columns"] == ["id", "title", "author_name", "bar_name", "likes"]
+    # 名称去重后只出现一次
+    assert sorted(data["names"]) == sorted({"张三", "李四", "数学吧", "语文吧"})
+    assert data["name_columns"] == ["author_name", "bar_name"]
+    assert codec.decode_rows(data) == rows
+
+
+def test_time_columns():
+    created = datetime(2024, 9, 1, 8, 30, 15)
+    rows = [
+        {"id": 1, "create_time": created},
+        {"id": 2, "create_time": "2024-09-01 08:30:15"},
+        {"id": 3, "create_time": None},
+    ]
+    data = codec.encode_rows(rows)
+    assert data["time_columns"] == ["create_time"]
+
+    epoch = int(created.timestamp())
+    assert [row["create_time"] for row in codec.decode_rows(data)] == [epoch, epoch, None]
+
+
+def test_empty_and_plain_lists():
+    assert codec.decode_rows(codec.encode_rows([])) == []
+    rows = [{"id": 1}]
+    assert codec.decode_rows(rows) is rows
+
+
+def test_compact_lists_match_dicts(bar, user, make_user):
+    other = make_user()
+    for i in range(3):
+        db.create_post(bar, f"帖子{i}", "正文" * 200, other if i % 2 else user)
+
+    plain = db.get_posts_in_bar(bar, 1, 20, user)
+    compact = codec.decode_rows(db.get_posts_in_bar(bar, 1, 20, user, compact=True))
+    for row in plain:
+        row["create_time"] = codec.to_epoch(row["create_time"])
+    assert compact == plain
@@ -0,0 +1,61 @@
+"""Api 请求执行层"""
+
+import threading
+
+from dispatch import Dispatcher
+
+
+def _run_in_thread(func, timeout=5):
+    """在线程中执行 func，返回 (是否按时结束, 结果)"""
+    result = []
+    thread = threading.Thread(target=lambda: result.append(func()), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    return not thread.is_alive(), result[0] if result else None
+
+
+def test_immediate_results_do_not_deadlock():
+    dispatcher = Dispatcher(max_workers=2)
+
+    def call_many():
+        # 函数立即返回：future 往往在注册回调之前就已完成
+        return [dispatcher.run(lambda i=i: i, key=("k", i)) for i in range(2000)]
+
+    finished, results = _run_in_thread(call_many)
+    assert finished
+    assert results == list(range(2000))
+    assert dispatcher.stats()["inflight"] == 0
+    assert dispatcher._lock.acquire(timeout=1)
+    dispatcher._lock.release()
+    dispatcher.shutdown()
+
+
+def test_concurrent_requests_share_one_execution():
+    dispatcher = Dispatcher(max_workers=4)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "done"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(dispatcher.run(slow, key="same")))
+        for _ in range(3)
+    ]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    while dispatcher.stats()["coalesced"] < 2:
+        pass
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == ["done"] * 3 and len(calls) == 1
+    assert dispatcher.stats()["inflight"] == 0
+    dispatcher.shutdown()
@@ -0,0 +1,66 @@
+"""推送：轮询高水位发现其他客户端的写操作，本进程的写操作不重复推送"""
+
+import time
+
+import pytest
+
+import db
+import events
+
+
+@pytest.fixture
+def live(monkeypatch):
+    """订阅推送并启动轮询，返回收到的推送列表"""
+    monkeypatch.setattr(events, "DEBOUNCE", 0)
+    updates = []
+    events.subscribe(updates.append)
+    stop = events.watch(db.get_change_marks, db.get_changes_after, interval=0.05)
+    yield updates
+    stop.set()
+    events._sinks.remove(updates.append)
+
+
+def _other_client(func, *args):
+    """模拟共用数据库的其他客户端：写操作不登记到本进程的推送"""
+    sinks, events._sinks = events._sinks, []
+    try:
+        return func(*args)
+    finally:
+        events._sinks = sinks
+
+
+def _wait(updates, predicate, timeout=2):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate(updates):
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def _pushed_posts(updates):
+    return [post_id for u in updates for ids in u.get("new_posts", {}).values() for post_id in ids]
+
+
+def _stat(updates, name):
+    return sum(u.get("stats", {}).get(name, 0) for u in updates)
+
+
+def test_other_clients_writes_are_pushed(bar, user, live):
+    post = _other_client(db.create_post, bar, "其他客户端", "正文", user)
+    _other_client(db.create_comment, post, "评论", user)
+    _other_client(db.register_user, "watched_user", "password")
+
+    assert _wait(live, lambda u: _stat(u, "users") == 1 and _stat(u, "comments") == 1)
+    assert _pushed_posts(live) == [post]
+    assert _stat(live, "posts") == 1
+    assert any(u.get("posts", {}).get(post, {}).get("comments") == 1 for u in live)
+
+
+def test_own_writes_are_pushed_once(bar, user, live):
+    post = db.create_post(bar, "本客户端", "正文", user)
+    assert _wait(live, lambda u: post in _pushed_posts(u))
+    # 再等几轮轮询：轮询读到同一个帖子不会再推送
+    time.sleep(0.3)
+    assert _pushed_posts(live) == [post]
+    assert _stat(live, "posts") == 1
@@ -0,0 +1,45 @@
+"""经验值流水：汇总前后显示的经验值不变，不重复发放"""
+
+import db
+import ledger
+
+
+@db.with_db_connection
+def _stored(cursor, user_id):
+    """users.exp 与未汇总的流水"""
+    cursor.execute("SELECT exp FROM users WHERE id = %s", (user_id,))
+    exp = cursor.fetchone()["exp"]
+    cursor.execute("SELECT COUNT(*) as pending FROM exp_ledger WHERE user_id = %s", (user_id,))
+    return exp, cursor.fetchone()["pending"]
+
+
+def test_fold_keeps_displayed_exp(bar, make_user):
+    author, reader = make_user(), make_user()
+    post = db.create_post(bar, "标题", "正文", author)  # 作者 +10
+    db.create_comment(post, "评论", reader)  # 评论者 +5
+    db.toggle_post_like(reader, post)  # 作者 +2
+
+    assert _stored(author) == (0, 2)
+    assert db.get_user_by_id(author)["exp"] == 12
+    assert db.get_user_by_id(reader)["exp"] == 5
+
+    assert ledger.fold_all() >= 3
+    assert _stored(author) == (12, 0)
+    assert _stored(reader) == (5, 0)
+    assert db.get_user_by_id(author)["exp"] == 12
+
+    # 再次汇总没有流水，不重复发放
+    assert ledger.fold_all() == 0
+    assert _stored(author) == (12, 0)
+
+
+def test_fold_in_batches(bar, make_user):
+    author = make_user()
+    for i in range(7):
+        db.create_post(bar, f"帖子{i}", "正文", author)
+    ledger.fold_all()  # 先汇总其他测试留下的流水
+
+    for i in range(5):
+        db.create_post(bar, f"帖子{i}", "正文", author)
+    assert ledger.fold_all(batch_size=2) == 5
+    assert _stored(author) == (120, 0)
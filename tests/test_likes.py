@@ -0,0 +1,49 @@
+"""点赞切换：返回的状态和计数、冗余计数列与点赞记录一致"""
+
+import db
+import migrations
+
+
+def test_toggle_post_like(post, user, make_user):
+    other = make_user()
+
+    assert db.toggle_post_like(user, post) == {"is_liked": True, "likes": 1, "success": True}
+    assert db.toggle_post_like(other, post) == {"is_liked": True, "likes": 2, "success": True}
+    assert db.toggle_post_like(user, post) == {"is_liked": False, "likes": 1, "success": True}
+
+    assert db.check_post_liked(user, post) is False
+    assert db.check_post_liked(other, post) is True
+    detail = db.get_post_detail(post, other)
+    assert detail["likes"] == 1 and detail["is_liked"] is True
+
+
+@db.with_db_connection
+def _hotness(cursor, post_id):
+    cursor.execute("SELECT hot_score, hot_decay FROM posts WHERE id = %s", (post_id,))
+    return cursor.fetchone()
+
+
+def test_toggle_post_like_updates_hot_score(post, user):
+    db.toggle_post_like(user, post)
+    row = _hotness(post)
+    assert row["hot_score"] == db.HOT_LIKE_WEIGHT * row["hot_decay"]
+    db.toggle_post_like(user, post)
+    assert _hotness(post)["hot_score"] == 0
+
+
+def test_like_comment(post, user, make_user):
+    comment = db.create_comment(post, "评论", user)
+    other = make_user()
+
+    assert db.like_comment(user, comment) == {"is_liked": True, "likes": 1, "success": True}
+    assert db.like_comment(other, comment) == {"is_liked": True, "likes": 2, "success": True}
+    assert db.like_comment(other, comment) == {"is_liked": False, "likes": 1, "success": True}
+
+    comments = db.get_comments_in_post(post, 1, 20, user)
+    assert comments[0]["likes"] == 1 and comments[0]["liked_by_user"] is True
+
+
+def test_explain_like_updates():
+    # EXPLAIN 转换为 RETURNING 的 UPDATE 时不读取 last_insert_id 列
+    for template in (db.UPDATE_POST_LIKE_COUNT_COMMAND, db.UPDATE_COMMENT_LIKES_COMMAND):
+        assert migrations.explain(migrations.fill_template(template))
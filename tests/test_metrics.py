@@ -0,0 +1,38 @@
+"""调用统计：语句文本的归一化与慢查询汇总"""
+
+import metrics
+
+
+def test_normalize_collapses_in_lists():
+    short = "SELECT post_id FROM post_likes\n WHERE user_id = %s AND post_id IN (%s)"
+    long = "SELECT post_id FROM post_likes WHERE user_id = %s AND post_id IN (%s, %s,%s)"
+    expected = "SELECT post_id FROM post_likes WHERE user_id = %s AND post_id IN (...)"
+    assert metrics.normalize_sql(short) == metrics.normalize_sql(long) == expected
+
+    sqlite = "SELECT id FROM posts WHERE id in ( ?, ? ) AND bar_id = ?"
+    assert metrics.normalize_sql(sqlite) == "SELECT id FROM posts WHERE id IN (...) AND bar_id = ?"
+
+
+def test_normalize_keeps_subqueries():
+    statement = (
+        "SELECT id FROM posts WHERE bar_id IN (SELECT bar_id FROM user_bars WHERE user_id = %s)"
+    )
+    assert metrics.normalize_sql(statement) == statement
+
+
+def test_slow_statements_grouped():
+    slow = [
+        {"sql": metrics.normalize_sql("SELECT 1 FROM t WHERE id IN (%s)"), "ms": 120.0},
+        {"sql": metrics.normalize_sql("SELECT 1 FROM t WHERE id IN (%s, %s)"), "ms": 150.0},
+        {"sql": "SELECT 2", "ms": 300.0},
+    ]
+    grouped = metrics._slow_statements(slow)
+    assert grouped == [
+        {"sql": "SELECT 2", "count": 1, "total_ms": 300.0, "max_ms": 300.0},
+        {
+            "sql": "SELECT 1 FROM t WHERE id IN (...)",
+            "count": 2,
+            "total_ms": 270.0,
+            "max_ms": 150.0,
+        },
+    ]
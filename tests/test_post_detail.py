@@ -0,0 +1,31 @@
+"""打开帖子最多三条查询，与评论数无关"""
+
+import db
+
+
+def test_get_post_detail_queries(post, user, make_user, count_queries):
+    commenter = make_user()
+    comments = [db.create_comment(post, f"评论{i}", commenter) for i in range(30)]
+    db.like_comment(user, comments[0])
+    db.toggle_post_like(user, post)
+
+    detail, queries = count_queries(db.get_post_detail, post, user)
+    # 帖子（含是否已点赞）、第一页评论、评论是否已点赞
+    assert queries == 3
+    assert detail["is_liked"] is True
+    assert detail["likes"] == 1 and detail["comments_count"] == 30
+    assert len(detail["comments"]) == 20
+    assert detail["next_comment_cursor"] is not None
+    assert [c["id"] for c in detail["comments"] if c["liked_by_user"]] == [comments[0]]
+
+
+def test_get_post_detail_anonymous(post, count_queries):
+    detail, queries = count_queries(db.get_post_detail, post)
+    assert queries == 2
+    assert detail["is_liked"] is False
+    assert detail["comments"] == [] and detail["next_comment_cursor"] is None
+
+
+def test_get_post_detail_missing(count_queries):
+    detail, queries = count_queries(db.get_post_detail, 10**9)
+    assert detail is None and queries == 1
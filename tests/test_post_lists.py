@@ -0,0 +1,37 @@
+"""帖子列表的查询数与页面大小无关"""
+
+import db
+
+
+def test_enrich_posts_single_query(bar, user, make_user, count_queries):
+    posts = [db.create_post(bar, f"帖子{i}", "正文", user) for i in range(25)]
+    liker = make_user()
+    for post_id in posts[-3:]:
+        db.toggle_post_like(liker, post_id)
+
+    small, small_queries = count_queries(db.get_posts_in_bar, bar, 1, 5, liker)
+    page, page_queries = count_queries(db.get_posts_in_bar, bar, 1, 20, liker)
+
+    # 一条列表查询加一条是否已点赞的批量查询
+    assert small_queries == page_queries == 2
+    assert len(small) == 5 and len(page) == 20
+    assert {p["id"] for p in page if p["is_liked"]} == set(posts[-3:])
+
+
+def test_enrich_posts_skips_likes_query(bar, user, post, count_queries):
+    _, anonymous = count_queries(db.get_posts_in_bar, bar, 1, 20)
+    _, projected = count_queries(db.get_posts_in_bar, bar, 1, 20, user, ["title", "likes"])
+    assert anonymous == projected == 1
+
+
+def test_enrich_posts_by_cursor(bar, user, count_queries):
+    for i in range(25):
+        db.create_post(bar, f"帖子{i}", "正文", user)
+
+    first, queries = count_queries(db.get_posts_in_bar_by_cursor, bar, None, 20, user)
+    rest, more_queries = count_queries(
+        db.get_posts_in_bar_by_cursor, bar, first["next_cursor"], 20, user
+    )
+    assert queries == more_queries == 2
+    assert len(first["posts"]) == 20 and len(rest["posts"]) == 5
+    assert rest["next_cursor"] is None
@@ -0,0 +1,59 @@
+"""搜索：发帖不更新 search_terms，文档频率由定时任务汇总"""
+
+import db
+
+
+@db.with_db_connection
+def _df(cursor, term):
+    cursor.execute("SELECT df FROM search_terms WHERE term = %s", (term,))
+    row = cursor.fetchone()
+    return row["df"] if row else 0
+
+
+def test_create_post_defers_df(bar, user):
+    db.fold_search_terms()
+    before = _df("zebra")
+    post = db.create_post(bar, "zebra 标题", "正文 zebra", user)
+    # 发帖不写 search_terms：汇总前 df 不变，但已经可以搜到
+    assert _df("zebra") == before
+    assert post in [p["id"] for p in db.search_posts("zebra", user)["posts"]]
+
+    assert db.fold_search_terms() >= 1
+    assert _df("zebra") == before + 1
+    # 已汇总的帖子不会重复计数
+    assert db.fold_search_terms() == 0
+    assert _df("zebra") == before + 1
+
+
+def test_unknown_term_returns_nothing(post, count_queries):
+    results, queries = count_queries(db.search_posts, "qwertyuiop")
+    assert results == {"posts": [], "total": 0, "truncated": False}
+    # 帖子总数、词项的 df、驱动词项的候选帖子（为空）
+    assert queries == 3
+
+
+def test_rebuild_counts_each_post_once(bar, user):
+    db.create_post(bar, "rebuild 标题", "正文", user)
+    db.rebuild_search_index()
+    df = _df("rebuild")
+    assert df >= 1
+    # 重建时已直接计数，清空了待汇总记录
+    assert db.fold_search_terms() == 0
+    assert _df("rebuild") == df
+
+
+def test_later_pages_reuse_ranking(bar, user, count_queries):
+    for i in range(5):
+        db.create_post(bar, f"pagination {i}", "正文", user)
+    first, _ = count_queries(db.search_posts, "pagination", user, 1, 2)
+    assert first["total"] == 5 and not first["truncated"]
+
+    second, queries = count_queries(db.search_posts, "pagination", user, 2, 2)
+    # 没有新帖子：排序结果来自缓存，只查最大帖子id、这一页的帖子和点赞状态
+    assert queries <= 3
+    assert second["total"] == 5
+    ids = {p["id"] for p in first["posts"]} | {p["id"] for p in second["posts"]}
+    assert len(ids) == 4
+
+    db.create_post(bar, "pagination 5", "正文", user)
+    assert db.search_posts("pagination", user, 1, 2)["total"] == 6